@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+MICRO-BENCHMARK ESTRAZIONE CAMPI F24
+====================================
+Misura il costo per pagina di extract_data_from_text() su un corpus di
+testi OCR già salvati, senza rieseguire l'OCR.
+
+Il corpus può essere:
+    - la cache OCR della riconciliazione (testi a pagina intera)
+    - una cartella di file .txt, uno per pagina
+
+Uso:
+    python benchmark_estrazione.py --cache-dir /tmp/f24_ocr/ocr_cache
+    python benchmark_estrazione.py --testi ./corpus_ocr/ --ripetizioni 20
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import logging
+from pathlib import Path
+from typing import List
+
+from riconcilia_f24_ocr import configura_logging, extract_data_from_text, logger
+from config import OCR_CACHE_DIR
+
+
+def carica_corpus_cache(cache_dir: str) -> List[str]:
+    """
+    Carica i testi OCR a pagina intera dalla cache SQLite.
+
+    Args:
+        cache_dir: Cartella della cache OCR
+
+    Returns:
+        Lista di testi, uno per pagina
+    """
+    db_path = os.path.join(cache_dir, 'ocr_cache.sqlite')
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Cache OCR non trovata: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # Le voci OCR a riquadri hanno la variante roi-<layout> in fondo alla chiave
+        rows = conn.execute("SELECT testo FROM ocr WHERE chiave NOT LIKE '%:roi-%' ORDER BY chiave").fetchall()
+    finally:
+        conn.close()
+    return [r[0] for r in rows]
+
+
+def carica_corpus_cartella(cartella: str) -> List[str]:
+    """
+    Carica i testi OCR da una cartella di file .txt.
+
+    Args:
+        cartella: Cartella contenente un file .txt per pagina
+
+    Returns:
+        Lista di testi, uno per pagina
+    """
+    return [
+        p.read_text(encoding='utf-8', errors='ignore')
+        for p in sorted(Path(cartella).glob('*.txt'))
+    ]
+
+
+def esegui_benchmark(testi: List[str], ripetizioni: int) -> None:
+    """
+    Esegue l'estrazione sul corpus e stampa costo per pagina e copertura campi.
+
+    Args:
+        testi: Corpus di testi OCR
+        ripetizioni: Numero di passaggi completi sul corpus
+    """
+    # Un passaggio di riscaldamento, che serve anche per contare i campi trovati
+    deleghe = [extract_data_from_text(t, i, 'benchmark.pdf') for i, t in enumerate(testi, 1)]
+
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        for i, t in enumerate(testi, 1):
+            extract_data_from_text(t, i, 'benchmark.pdf')
+        tempi.append(time.perf_counter() - inizio)
+
+    migliore = min(tempi)
+    medio = sum(tempi) / len(tempi)
+    n = len(testi)
+
+    print("\n" + "=" * 70)
+    print("BENCHMARK ESTRAZIONE CAMPI")
+    print("=" * 70)
+    print(f"Pagine nel corpus:     {n}")
+    print(f"Ripetizioni:           {ripetizioni}")
+    print(f"Costo per pagina:      {migliore / n * 1e6:.1f} µs (migliore), "
+          f"{medio / n * 1e6:.1f} µs (medio)")
+    print(f"Throughput:            {n / migliore:,.0f} pagine/s")
+    print("-" * 70)
+    for campo in ('codice_fiscale', 'importo_cent', 'cab', 'filiale', 'data_pagamento'):
+        trovati = sum(1 for d in deleghe if getattr(d, campo))
+        print(f"   {campo:<20} {trovati:>6}/{n}")
+
+
+def main():
+    """Entry point principale."""
+    parser = argparse.ArgumentParser(
+        description='Micro-benchmark di extract_data_from_text su testi OCR salvati'
+    )
+    sorgente = parser.add_mutually_exclusive_group()
+    sorgente.add_argument(
+        '--cache-dir',
+        default=OCR_CACHE_DIR,
+        help=f'Cartella della cache OCR da cui leggere i testi (default: {OCR_CACHE_DIR})'
+    )
+    sorgente.add_argument(
+        '--testi',
+        help='Cartella con un file .txt per pagina'
+    )
+    parser.add_argument(
+        '--ripetizioni', '-r',
+        type=int,
+        default=10,
+        help='Passaggi completi sul corpus (default: 10)'
+    )
+
+    args = parser.parse_args()
+
+    # I log DEBUG/INFO per pagina falserebbero la misura
+    configura_logging()
+    logger.setLevel(logging.WARNING)
+
+    try:
+        testi = carica_corpus_cartella(args.testi) if args.testi else carica_corpus_cache(args.cache_dir)
+    except Exception as e:
+        logger.error(f"Errore caricamento corpus: {e}")
+        sys.exit(1)
+
+    if not testi:
+        logger.error("Corpus vuoto: nessun testo OCR trovato")
+        sys.exit(1)
+
+    esegui_benchmark(testi, max(1, args.ripetizioni))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,624 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK RICONCILIAZIONE F24
+=============================
+Genera un lotto sintetico di deleghe F24 (PDF con testo nativo e scansioni
+rasterizzate con rumore) con il tabulato TXT corrispondente, poi misura
+riconcilia() dall'inizio alla fine: pagine/s, tempi per fase, picco di
+memoria e accuratezza dell'estrazione (recall di CF, importo e CAB).
+
+Il lotto non contiene dati reali ed è riproducibile: con gli stessi
+parametri e lo stesso seme vengono generati gli stessi file. Se la
+cartella contiene già un lotto con gli stessi parametri viene riusato.
+
+Uso:
+    python benchmark_riconciliazione.py --pdf 20 --pagine 10
+    python benchmark_riconciliazione.py --pdf 50 --scansionati 0.5 --workers 4 --salva base.json
+    python benchmark_riconciliazione.py --pdf 50 --scansionati 0.5 --workers 4 --baseline base.json
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import logging
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from riconcilia_f24_ocr import (
+    FILIALE_TO_CAB, MOTORI_OCR, configura_logging, imposta_motore_ocr, logger, motore_ocr, riconcilia
+)
+from config import (
+    CAB_VALID_PREFIXES, OCR_DPI, OCR_MOTORE, PIPELINE_CODA_PAGINE, PREELABORAZIONE_PASSI, TEMP_DIR
+)
+
+BENCHMARK_DIR = os.path.join(TEMP_DIR, 'benchmark')
+
+# Pagina A4 in punti PDF
+LARGHEZZA_PT = 595
+ALTEZZA_PT = 842
+CORPO_PT = 10
+
+# Righe di testo di una pagina: (x, y, testo) con coordinate relative alla pagina
+RighePagina = List[Tuple[float, float, str]]
+
+
+def formatta_importo_it(cent: int) -> str:
+    """Formatta un importo in centesimi come nei modelli F24 (es. 1.234,56)."""
+    euro, centesimi = divmod(cent, 100)
+    return f"{euro:,}".replace(',', '.') + f",{centesimi:02d}"
+
+
+def genera_codice_fiscale(rnd: random.Random) -> str:
+    """Genera un codice fiscale sintetico formalmente valido."""
+    lettere = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    return (
+        ''.join(rnd.choice(lettere) for _ in range(6))
+        + f"{rnd.randrange(100):02d}"
+        + rnd.choice('ABCDEHLMPRST')
+        + f"{rnd.randint(1, 71):02d}"
+        + rnd.choice(lettere)
+        + f"{rnd.randrange(1000):03d}"
+        + rnd.choice(lettere)
+    )
+
+
+def righe_delega(delega: Dict[str, Any]) -> RighePagina:
+    """
+    Compone il testo di una pagina F24 sintetica.
+
+    CF, saldo, ABI/CAB e data sono nelle posizioni di F24_ROI_LAYOUT['ordinario'],
+    con le etichette fuori dai riquadri, così la pagina vale anche per --roi.
+
+    Args:
+        delega: Delega attesa (codice_fiscale, importo_cent, cab, filiale, data_pagamento)
+
+    Returns:
+        Righe di testo della pagina
+    """
+    importo = formatta_importo_it(delega['importo_cent'])
+    return [
+        (0.05, 0.03, 'MODELLO DI PAGAMENTO UNIFICATO F24'),
+        (0.10, 0.075, 'CODICE FISCALE'),
+        (0.10, 0.11, delega['codice_fiscale']),
+        (0.05, 0.30, 'SEZIONE ERARIO'),
+        (0.05, 0.34, f"ERARIO   1001   {delega['data_pagamento'][-4:]}   {importo}"),
+        (0.05, 0.75, f"FILIALE DI {delega['filiale']}"),
+        (0.40, 0.815, 'SALDO FINALE EURO'),
+        (0.70, 0.815, importo),
+        (0.05, 0.86, 'ABI   CAB'),
+        (0.05, 0.90, f"08749   {delega['cab']}"),
+        (0.55, 0.90, delega['data_pagamento']),
+    ]
+
+
+def _testo_pdf(testo: str) -> str:
+    """Protegge i caratteri speciali di una stringa PDF."""
+    return testo.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def scrivi_pdf_nativo(percorso: str, pagine: List[RighePagina]) -> None:
+    """
+    Scrive un PDF con testo nativo (Helvetica), senza dipendenze esterne.
+
+    Args:
+        percorso: File PDF da creare
+        pagine: Righe di testo di ogni pagina
+    """
+    id_pagine = [4 + 2 * i for i in range(len(pagine))]
+    oggetti = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        (f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in id_pagine)}] "
+         f"/Count {len(pagine)} >>").encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    for righe in pagine:
+        contenuto = ''.join(
+            f"BT /F1 {CORPO_PT} Tf {x * LARGHEZZA_PT:.1f} {(1 - y) * ALTEZZA_PT - CORPO_PT:.1f} Td "
+            f"({_testo_pdf(testo)}) Tj ET\n"
+            for x, y, testo in righe
+        ).encode('cp1252')
+        id_contenuto = len(oggetti) + 2
+        oggetti.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {LARGHEZZA_PT} {ALTEZZA_PT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {id_contenuto} 0 R >>".encode()
+        )
+        oggetti.append(b'<< /Length %d >>\nstream\n' % len(contenuto) + contenuto + b'endstream')
+
+    dati = bytearray(b'%PDF-1.4\n')
+    posizioni = []
+    for numero, corpo in enumerate(oggetti, 1):
+        posizioni.append(len(dati))
+        dati += b'%d 0 obj\n' % numero + corpo + b'\nendobj\n'
+    xref = len(dati)
+    dati += b'xref\n0 %d\n0000000000 65535 f \n' % (len(oggetti) + 1)
+    for posizione in posizioni:
+        dati += b'%010d 00000 n \n' % posizione
+    dati += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(oggetti) + 1, xref)
+
+    with open(percorso, 'wb') as f:
+        f.write(dati)
+
+
+def scrivi_pdf_scansionato(
+    percorso: str,
+    pagine: List[RighePagina],
+    dpi: int,
+    rumore: float,
+    rnd: random.Random
+) -> None:
+    """
+    Scrive un PDF di sole immagini che simula una scansione.
+
+    Il rumore (0-1) regola rotazione, sfocatura e puntini sparsi sulla pagina.
+
+    Args:
+        percorso: File PDF da creare
+        pagine: Righe di testo di ogni pagina
+        dpi: Risoluzione della scansione
+        rumore: Intensità del rumore (0 = pagina pulita)
+        rnd: Generatore casuale del lotto
+    """
+    try:
+        from PIL import Image, ImageDraw, ImageFilter, ImageFont
+    except ImportError:
+        raise RuntimeError("Le pagine scansionate richiedono Pillow (pip install Pillow)")
+
+    dimensione = (round(LARGHEZZA_PT / 72 * dpi), round(ALTEZZA_PT / 72 * dpi))
+    corpo_px = round(CORPO_PT / 72 * dpi)
+    try:
+        font = ImageFont.truetype('DejaVuSans.ttf', corpo_px)
+    except OSError:
+        font = ImageFont.load_default()
+
+    immagini = []
+    for righe in pagine:
+        img = Image.new('L', dimensione, 255)
+        draw = ImageDraw.Draw(img)
+        for x, y, testo in righe:
+            draw.text((x * dimensione[0], y * dimensione[1]), testo, fill=0, font=font)
+        if rumore > 0:
+            img = img.rotate(rnd.uniform(-1.5, 1.5) * rumore, resample=Image.BICUBIC, fillcolor=255)
+            draw = ImageDraw.Draw(img)
+            n_punti = int(rumore * dimensione[0] * dimensione[1] / 2000)
+            draw.point(
+                [(rnd.randrange(dimensione[0]), rnd.randrange(dimensione[1])) for _ in range(n_punti)],
+                fill=0
+            )
+            img = img.filter(ImageFilter.GaussianBlur(rumore * dpi / 200))
+        immagini.append(img)
+
+    immagini[0].save(percorso, 'PDF', resolution=dpi, save_all=True, append_images=immagini[1:])
+
+
+def scrivi_tabulato(percorso: str, deleghe: List[Dict[str, Any]], data: str, rnd: random.Random) -> None:
+    """
+    Scrive il tabulato TXT corrispondente alle deleghe del lotto.
+
+    Contiene le righe di dettaglio (una per delega), i totali per CAB e il
+    totale generale; le colonne ministeriali e corporate sono casuali.
+
+    Args:
+        percorso: File TXT da creare
+        deleghe: Deleghe attese
+        data: Data del tabulato (GG/MM/AAAA)
+        rnd: Generatore casuale del lotto
+    """
+    per_cab: Dict[str, List[Dict[str, Any]]] = {}
+    for d in sorted(deleghe, key=lambda d: (d['cab'], d['codice_fiscale'])):
+        per_cab.setdefault(d['cab'], []).append(d)
+
+    righe = [f"DATA: {data.replace('/', ' ')}"]
+    for d in (d for _, lista in sorted(per_cab.items()) for d in lista):
+        righe.append(
+            f"{d['cab']}  {d['codice_fiscale']}  {d['data_pagamento']}  "
+            f"{formatta_importo_it(d['importo_cent']):>12}"
+        )
+
+    totali = [0] * 6
+    for cab, lista in sorted(per_cab.items()):
+        colonne = [
+            rnd.randint(0, 50), rnd.randint(0, 5000000),
+            rnd.randint(0, 100), rnd.randint(0, 20000000),
+            len(lista), sum(d['importo_cent'] for d in lista),
+        ]
+        totali = [t + c for t, c in zip(totali, colonne)]
+        righe.append(
+            f"{cab}  {colonne[0]:>5}  {formatta_importo_it(colonne[1]):>14}  "
+            f"{colonne[2]:>5}  {formatta_importo_it(colonne[3]):>14}  "
+            f"{colonne[4]:>5}  {formatta_importo_it(colonne[5]):>14}"
+        )
+    righe.append(
+        f"TOT.:  {totali[0]:>5}  {formatta_importo_it(totali[1]):>14}  "
+        f"{totali[2]:>5}  {formatta_importo_it(totali[3]):>14}  "
+        f"{totali[4]:>5}  {formatta_importo_it(totali[5]):>14}"
+    )
+
+    with open(percorso, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(righe) + '\n')
+
+
+def genera_lotto(cartella: str, parametri: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Genera PDF, tabulato e verità attesa del lotto sintetico.
+
+    Args:
+        cartella: Cartella del lotto (PDF in pdf/, tabulato.txt, verita.json)
+        parametri: n_pdf, pagine_per_pdf, scansionati, rumore, dpi, data, seme
+
+    Returns:
+        Verità del lotto: parametri e deleghe attese per file e pagina
+    """
+    rnd = random.Random(parametri['seme'])
+    cartella_pdf = Path(cartella) / 'pdf'
+    cartella_pdf.mkdir(parents=True, exist_ok=True)
+    for vecchio in cartella_pdf.glob('*.pdf'):
+        vecchio.unlink()
+
+    filiali = sorted(
+        (cab, nome) for nome, cab in FILIALE_TO_CAB.items() if cab[:2] in CAB_VALID_PREFIXES
+    )
+    if not filiali:
+        raise RuntimeError("Nessuna filiale con CAB valido in filiali_cab.csv")
+
+    n_pdf = parametri['n_pdf']
+    n_scansionati = round(n_pdf * parametri['scansionati'])
+    scansionati = set(rnd.sample(range(n_pdf), n_scansionati))
+
+    deleghe = []
+    for i in range(n_pdf):
+        nome_file = f"f24_{i + 1:05d}.pdf"
+        pagine = []
+        for pagina in range(1, parametri['pagine_per_pdf'] + 1):
+            cab, filiale = rnd.choice(filiali)
+            delega = {
+                'file': nome_file,
+                'pagina': pagina,
+                'codice_fiscale': genera_codice_fiscale(rnd),
+                # Distribuzione log-uniforme tra 10 e 20.000 euro
+                'importo_cent': int(10 ** rnd.uniform(3, 6.3)),
+                'cab': cab,
+                'filiale': filiale,
+                'data_pagamento': parametri['data'],
+                'scansionata': i in scansionati,
+            }
+            deleghe.append(delega)
+            pagine.append(righe_delega(delega))
+
+        percorso = str(cartella_pdf / nome_file)
+        if i in scansionati:
+            scrivi_pdf_scansionato(percorso, pagine, parametri['dpi'], parametri['rumore'], rnd)
+        else:
+            scrivi_pdf_nativo(percorso, pagine)
+
+    scrivi_tabulato(os.path.join(cartella, 'tabulato.txt'), deleghe, parametri['data'], rnd)
+
+    verita = {'parametri': parametri, 'deleghe': deleghe}
+    with open(os.path.join(cartella, 'verita.json'), 'w', encoding='utf-8') as f:
+        json.dump(verita, f, indent=2, ensure_ascii=False)
+    return verita
+
+
+def carica_o_genera_lotto(cartella: str, parametri: Dict[str, Any], rigenera: bool) -> Tuple[Dict[str, Any], bool]:
+    """
+    Riusa il lotto della cartella se generato con gli stessi parametri, altrimenti lo genera.
+
+    Returns:
+        Tupla (verità del lotto, True se è stato generato ora)
+    """
+    percorso_verita = os.path.join(cartella, 'verita.json')
+    if not rigenera and os.path.exists(percorso_verita):
+        try:
+            with open(percorso_verita, 'r', encoding='utf-8') as f:
+                verita = json.load(f)
+            if verita.get('parametri') == parametri:
+                return verita, False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Verità del lotto illeggibile, rigenero: {e}")
+    return genera_lotto(cartella, parametri), True
+
+
+def misura_accuratezza(deleghe_estratte, attese: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Confronta le deleghe estratte con quelle attese, pagina per pagina.
+
+    Args:
+        deleghe_estratte: Deleghe restituite da riconcilia()
+        attese: Deleghe della verità del lotto
+
+    Returns:
+        Campi corretti e recall per CF, importo e CAB, in totale e per tipo di PDF
+    """
+    estratte = {(d.file, d.pagina): d for d in deleghe_estratte}
+    campi = ('codice_fiscale', 'importo_cent', 'cab')
+    gruppi = {'tutte': attese, 'native': [], 'scansionate': []}
+    for a in attese:
+        gruppi['scansionate' if a['scansionata'] else 'native'].append(a)
+
+    risultato: Dict[str, Any] = {'deleghe_attese': len(attese), 'deleghe_estratte': len(estratte)}
+    for gruppo, lista in gruppi.items():
+        if not lista:
+            continue
+        corretti = {campo: 0 for campo in campi}
+        for a in lista:
+            d = estratte.get((a['file'], a['pagina']))
+            if d is None:
+                continue
+            for campo in campi:
+                if getattr(d, campo) == a[campo]:
+                    corretti[campo] += 1
+        risultato[gruppo] = {
+            campo: {'corretti': corretti[campo], 'recall': corretti[campo] / len(lista)}
+            for campo in campi
+        }
+        risultato[gruppo]['n'] = len(lista)
+    return risultato
+
+
+def esegui_benchmark(
+    cartella: str,
+    verita: Dict[str, Any],
+    ripetizioni: int,
+    **kwargs: Any
+) -> Dict[str, Any]:
+    """
+    Esegue riconcilia() sul lotto e raccoglie le metriche della ripetizione più veloce.
+
+    Args:
+        cartella: Cartella del lotto
+        verita: Verità del lotto
+        ripetizioni: Numero di esecuzioni complete
+        **kwargs: Opzioni passate a riconcilia() (workers, dpi, dpi_rapido, roi, preelabora,
+            duplicati, prefiltro, coda_pagine)
+
+    Returns:
+        Metriche del benchmark (durata, throughput, memoria, fasi, accuratezza)
+    """
+    migliore = None
+    for _ in range(ripetizioni):
+        # Il report della riconciliazione non serve: resta solo il riepilogo del benchmark
+        with open(os.devnull, 'w') as nullo, redirect_stdout(nullo):
+            risultati = riconcilia(
+                os.path.join(cartella, 'tabulato.txt'),
+                os.path.join(cartella, 'pdf'),
+                cache_dir=None,
+                profilo=True,
+                **kwargs
+            )
+        if migliore is None or risultati['metriche']['durata_s'] < migliore['metriche']['durata_s']:
+            migliore = risultati
+
+    metriche = migliore['metriche']
+    return {
+        'parametri': verita['parametri'],
+        'opzioni': kwargs,
+        'motore_ocr': motore_ocr().nome,
+        'ripetizioni': ripetizioni,
+        'durata_s': metriche['durata_s'],
+        'pagine': metriche['pagine'],
+        'pagine_al_secondo': metriche['pagine_al_secondo'],
+        'rss_max_mb': metriche['rss_max_mb'],
+        'rss_max_figli_mb': metriche['rss_max_figli_mb'],
+        'fasi': metriche['fasi'],
+        'code': metriche['code'],
+        'cab_ok': migliore['ok_count'],
+        'cab_totali': migliore['statistiche']['n_cab_analizzati'],
+        'accuratezza': misura_accuratezza(migliore['deleghe_pdf'], verita['deleghe']),
+    }
+
+
+def _variazione(valore: Optional[float], riferimento: Optional[float]) -> str:
+    """Variazione percentuale rispetto alla baseline."""
+    if valore is None or not riferimento:
+        return ''
+    return f"{(valore - riferimento) / riferimento * 100:+.1f}%"
+
+
+def stampa_risultati(risultati: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None, generato: bool = False) -> None:
+    """
+    Stampa il riepilogo del benchmark, con le variazioni rispetto alla baseline.
+
+    Args:
+        risultati: Metriche di esegui_benchmark()
+        baseline: Metriche di un benchmark precedente (opzionale)
+        generato: True se il lotto è stato generato in questo processo
+    """
+    base = baseline or {}
+    p = risultati['parametri']
+
+    print("\n" + "=" * 70)
+    print("BENCHMARK RICONCILIAZIONE")
+    print("=" * 70)
+    print(f"Lotto:                 {p['n_pdf']} PDF x {p['pagine_per_pdf']} pagine, "
+          f"{p['scansionati']:.0%} scansionati (rumore {p['rumore']}, {p['dpi']} DPI), seme {p['seme']}")
+    print(f"Opzioni:               {', '.join(f'{k}={v}' for k, v in risultati['opzioni'].items())}")
+    print(f"Motore OCR:            {risultati['motore_ocr']}")
+    print(f"Durata:                {risultati['durata_s']:.2f} s (migliore di {risultati['ripetizioni']}) "
+          f"{_variazione(risultati['durata_s'], base.get('durata_s'))}")
+    if risultati['pagine_al_secondo']:
+        print(f"Throughput:            {risultati['pagine_al_secondo']:.2f} pagine/s "
+              f"{_variazione(risultati['pagine_al_secondo'], base.get('pagine_al_secondo'))}")
+    if risultati['rss_max_mb'] is not None:
+        nota = " (include la generazione del lotto)" if generato else ""
+        print(f"Picco RSS:             {risultati['rss_max_mb']:.0f} MB, processi figli "
+              f"{risultati['rss_max_figli_mb']:.0f} MB{nota}")
+    print(f"CAB OK:                {risultati['cab_ok']}/{risultati['cab_totali']}")
+
+    print("-" * 70)
+    print(f"{'FASE':<20} {'UNITÀ':>8} {'TOTALE s':>10} {'MEDIO ms':>10} {'BASELINE':>10}")
+    fasi_base = base.get('fasi', {})
+    for nome, fase in sorted(risultati['fasi'].items(), key=lambda x: -x[1]['secondi']):
+        riferimento = fasi_base.get(nome, {}).get('secondi')
+        print(f"{nome:<20} {fase['unita']:>8} {fase['secondi']:>10.2f} {fase['medio_ms']:>10.1f} "
+              f"{_variazione(fase['secondi'], riferimento):>10}")
+
+    code = risultati.get('code')
+    if code:
+        print("-" * 70)
+        print(f"{'CODA':<20} {'PROF. MAX':>10} {'PROF. MEDIA':>12} {'ATT. PROD. s':>13} {'ATT. CONS. s':>13}")
+        for nome, coda in code.items():
+            print(f"{nome:<20} {coda['profondita_max']:>10} {coda['profondita_media']:>12.1f} "
+                  f"{coda['attesa_produttori_s']:>13.2f} {coda['attesa_consumatori_s']:>13.2f}")
+
+    print("-" * 70)
+    acc = risultati['accuratezza']
+    acc_base = base.get('accuratezza', {})
+    print(f"Accuratezza estrazione ({acc['deleghe_estratte']} deleghe estratte su {acc['deleghe_attese']})")
+    for gruppo in ('native', 'scansionate', 'tutte'):
+        if gruppo not in acc:
+            continue
+        print(f"   {gruppo} ({acc[gruppo]['n']} pagine)")
+        for campo in ('codice_fiscale', 'importo_cent', 'cab'):
+            valore = acc[gruppo][campo]
+            riferimento = acc_base.get(gruppo, {}).get(campo, {}).get('recall')
+            delta = f" ({(valore['recall'] - riferimento) * 100:+.1f} punti)" if riferimento is not None else ''
+            print(f"      {campo:<18} {valore['corretti']:>6}/{acc[gruppo]['n']:<6} "
+                  f"{valore['recall']:>7.1%}{delta}")
+
+    if baseline and baseline.get('parametri') != risultati['parametri']:
+        print("\n⚠️  La baseline è stata misurata su un lotto con parametri diversi")
+
+
+def main():
+    """Entry point principale."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark di riconcilia() su un lotto sintetico di deleghe F24 e tabulato'
+    )
+    parser.add_argument('--pdf', type=int, default=20, help='Numero di PDF del lotto (default: 20)')
+    parser.add_argument('--pagine', type=int, default=10, help='Pagine (deleghe) per PDF (default: 10)')
+    parser.add_argument(
+        '--scansionati',
+        type=float,
+        default=0.5,
+        help='Quota di PDF scansionati (solo immagini) invece che nativi, 0-1 (default: 0.5)'
+    )
+    parser.add_argument(
+        '--rumore',
+        type=float,
+        default=0.3,
+        help='Rumore delle scansioni: rotazione, sfocatura e puntini, 0-1 (default: 0.3)'
+    )
+    parser.add_argument(
+        '--dpi-scansione',
+        type=int,
+        default=OCR_DPI,
+        help=f'Risoluzione delle pagine scansionate generate (default: {OCR_DPI})'
+    )
+    parser.add_argument('--data', default='15/11/2024', help='Data del tabulato e delle deleghe (default: 15/11/2024)')
+    parser.add_argument('--seme', type=int, default=24, help='Seme del generatore casuale (default: 24)')
+    parser.add_argument(
+        '--cartella',
+        default=BENCHMARK_DIR,
+        help=f'Cartella del lotto sintetico (default: {BENCHMARK_DIR})'
+    )
+    parser.add_argument('--rigenera', action='store_true', help='Rigenera il lotto anche se esiste già')
+    parser.add_argument('--solo-genera', action='store_true', help='Genera il lotto senza eseguire il benchmark')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Processi per l\'OCR parallelo (default: 1)')
+    parser.add_argument(
+        '--coda-pagine',
+        type=int,
+        default=PIPELINE_CODA_PAGINE,
+        help=f'Con --workers 1: pagine rasterizzate in attesa di OCR (default: {PIPELINE_CODA_PAGINE})'
+    )
+    parser.add_argument('--dpi', type=int, default=OCR_DPI, help=f'Risoluzione OCR (default: {OCR_DPI})')
+    parser.add_argument('--dpi-rapido', type=int, default=None, help='Primo passaggio dell\'OCR adattivo')
+    parser.add_argument('--roi', help='Layout F24 per l\'OCR a riquadri (es. ordinario)')
+    parser.add_argument(
+        '--motore-ocr',
+        choices=MOTORI_OCR,
+        default=OCR_MOTORE,
+        help=f'Backend OCR da misurare (default: {OCR_MOTORE})'
+    )
+    parser.add_argument(
+        '--preelabora',
+        metavar='PASSI',
+        nargs='?',
+        const=','.join(PREELABORAZIONE_PASSI),
+        default=None,
+        help='Preelabora le scansioni prima dell\'OCR (passi separati da virgola, senza valore: tutti)'
+    )
+    parser.add_argument(
+        '--no-duplicati',
+        action='store_true',
+        help='Misura senza il controllo dei duplicati (firma delle pagine prima dell\'OCR)'
+    )
+    parser.add_argument(
+        '--no-prefiltro',
+        action='store_true',
+        help='Misura senza il prefiltro delle pagine bianche e dei separatori'
+    )
+    parser.add_argument('--ripetizioni', '-r', type=int, default=1, help='Esecuzioni complete, vale la migliore (default: 1)')
+    parser.add_argument('--salva', metavar='FILE', help='Salva i risultati in JSON (da usare poi come --baseline)')
+    parser.add_argument('--baseline', metavar='FILE', help='Risultati JSON di un benchmark precedente da confrontare')
+
+    args = parser.parse_args()
+
+    # I log INFO per file e pagina falserebbero la misura
+    configura_logging()
+    logger.setLevel(logging.WARNING)
+
+    if args.pdf < 1 or args.pagine < 1 or not 0 <= args.scansionati <= 1 or not 0 <= args.rumore <= 1:
+        logger.error("Parametri del lotto non validi")
+        sys.exit(1)
+
+    preelabora = None
+    if args.preelabora:
+        preelabora = tuple(p.strip() for p in args.preelabora.split(',') if p.strip())
+        if any(p not in PREELABORAZIONE_PASSI for p in preelabora):
+            logger.error(f"Passi di preelaborazione disponibili: {', '.join(PREELABORAZIONE_PASSI)}")
+            sys.exit(1)
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Errore lettura baseline {args.baseline}: {e}")
+            sys.exit(1)
+
+    parametri = {
+        'n_pdf': args.pdf,
+        'pagine_per_pdf': args.pagine,
+        'scansionati': args.scansionati,
+        'rumore': args.rumore,
+        'dpi': args.dpi_scansione,
+        'data': args.data,
+        'seme': args.seme,
+    }
+    try:
+        verita, generato = carica_o_genera_lotto(args.cartella, parametri, args.rigenera)
+    except Exception as e:
+        logger.error(f"Errore generazione lotto: {e}")
+        sys.exit(1)
+    print(f"Lotto {'generato' if generato else 'riusato'}: {args.cartella}")
+
+    if args.solo_genera:
+        return
+
+    imposta_motore_ocr(args.motore_ocr)
+    risultati = esegui_benchmark(
+        args.cartella,
+        verita,
+        max(1, args.ripetizioni),
+        workers=args.workers,
+        dpi=args.dpi,
+        dpi_rapido=args.dpi_rapido,
+        roi=args.roi,
+        preelabora=preelabora,
+        duplicati=not args.no_duplicati,
+        prefiltro=not args.no_prefiltro,
+        coda_pagine=max(1, args.coda_pagine)
+    )
+    stampa_risultati(risultati, baseline, generato)
+
+    if args.salva:
+        with open(args.salva, 'w', encoding='utf-8') as f:
+            json.dump(risultati, f, indent=2, ensure_ascii=False)
+        print(f"\nRisultati salvati: {args.salva}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,34 +4,115 @@ Configurazione per la riconciliazione F24
 File di configurazione centralizzato per parametri e mapping
 """
 
+import os
+
 # Mapping filiali -> CAB
-# Personalizza questo dizionario con le tue filiali
-FILIALE_TO_CAB = {
-    'PESEGGIA': '36320',
-    'SALZANO': '36270',
-    'SCORZE': '36321',
-    'ZERO BRANCO': '36322',
-    'QUINTO': '36330',
-    'MOGLIANO': '61741',
-    'PREGANZIOL': '61742',
-    'MIRANO': '36280',
-    'MARTELLAGO': '36290',
-    'NOALE': '36300',
-}
+# File CSV (colonne: filiale,cab) con l'elenco completo delle filiali della rete.
+# Personalizza il file con le tue filiali
+FILIALI_CAB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'filiali_cab.csv')
 
 # Prefissi CAB validi
 CAB_VALID_PREFIXES = ['02', '12', '36', '61', '62']
 
-# Range importi validi (min, max) in Euro
-IMPORTO_MIN = 10.0
-IMPORTO_MAX = 1000000.0
+# Range importi validi di una delega (min, max) in centesimi: da 10€ a 1M€
+IMPORTO_MIN_CENT = 1000
+IMPORTO_MAX_CENT = 100000000
 
 # Parametri OCR
 OCR_DPI = 200  # Risoluzione per conversione PDF -> immagini
+OCR_DPI_RAPIDO = 150  # Primo passaggio dell'OCR adattivo (--dpi-rapido)
 OCR_LANG = 'ita'  # Lingua per Tesseract
+# Backend OCR (--motore-ocr): 'tesserocr' tiene Tesseract residente in ogni worker
+# (modello caricato una volta, immagini in memoria), 'pytesseract' avvia un processo
+# per pagina, 'auto' usa tesserocr se installato
+OCR_MOTORE = 'auto'
+SOGLIA_TESTO_NATIVO = 50  # Caratteri minimi perché una pagina sia considerata nativa (senza OCR)
+
+# OCR a riquadri (--roi): coordinate relative alla pagina (x0, y0, x1, y1)
+# dei campi di interesse per ciascun layout F24. Da calibrare sulle scansioni reali.
+F24_ROI_LAYOUT = {
+    'ordinario': {
+        'codice_fiscale': (0.08, 0.09, 0.60, 0.14),
+        'importo': (0.62, 0.80, 0.97, 0.85),
+        'abi_cab': (0.03, 0.87, 0.50, 0.97),
+        'data': (0.50, 0.87, 0.97, 0.97),
+    },
+    'semplificato': {
+        'codice_fiscale': (0.08, 0.10, 0.60, 0.15),
+        'importo': (0.62, 0.66, 0.97, 0.72),
+        'abi_cab': (0.03, 0.85, 0.50, 0.96),
+        'data': (0.50, 0.85, 0.97, 0.96),
+    },
+}
+
+# Preelaborazione delle pagine scansionate prima di Tesseract (--preelabora).
+# Passi disponibili, applicati sempre in quest'ordine:
+#   grigi      rasterizzazione direttamente in scala di grigi (un terzo dei dati di RGB)
+#   raddrizza  correzione dell'inclinazione fino a ±PREELABORAZIONE_MAX_GRADI
+#   bordi      ritaglio delle bande scure e dei margini vuoti (solo OCR a pagina intera)
+#   binarizza  soglia adattiva sulla media locale, robusta a ombre e sfondi non uniformi
+#   riduci     riduzione a PREELABORAZIONE_DPI_MAX se la pagina è rasterizzata più fine
+PREELABORAZIONE_PASSI = ('grigi', 'raddrizza', 'bordi', 'binarizza', 'riduci')
+PREELABORAZIONE_MAX_GRADI = 3.0  # Inclinazione massima corretta, in gradi
+PREELABORAZIONE_FINESTRA = 0.02  # Lato della finestra della soglia adattiva (frazione della larghezza)
+PREELABORAZIONE_SCARTO = 12  # Livelli di grigio sotto la media locale perché un pixel sia testo
+PREELABORAZIONE_DPI_MAX = 300  # Oltre questa risoluzione Tesseract non migliora
 
-# Soglia tolleranza per confronto importi (in Euro)
-TOLLERANZA_IMPORTO = 0.01
+# Deleghe duplicate (stesso PDF inviato due volte, stessa scansione con un altro nome).
+# I PDF identici byte per byte non vengono rielaborati; le pagine scansionate sono
+# confrontate prima dell'OCR su una miniatura in scala di grigi: sono la stessa
+# scansione se nessun punto differisce più di DUPLICATI_SOGLIA livelli di grigio
+# (una ricompressione JPEG resta sotto 6, una cifra diversa in un campo supera 40)
+DUPLICATI_LARGHEZZA_FIRMA = 192  # Larghezza della miniatura in pixel
+DUPLICATI_SOGLIA = 16
+# Secondi di attesa del testo di un originale in OCR in un altro processo: scaduti,
+# la copia viene riconosciuta da sola e non è segnata come duplicata
+DUPLICATI_ATTESA_S = 120
+
+# Prefiltro delle pagine scansionate senza delega (retro bianchi, copertine, fogli
+# separatori), scartate prima dell'OCR. Le statistiche si calcolano sulla pagina
+# ridotta a PREFILTRO_DPI, esclusa una cornice del 5%: è inchiostro un pixel più scuro
+# della carta (livello mediano) di almeno PREFILTRO_CONTRASTO livelli, così la
+# trasparenza del retro e i puntini di rumore non contano
+PREFILTRO_DPI = 100
+PREFILTRO_CONTRASTO = 96
+PREFILTRO_INCHIOSTRO_MIN = 0.0005  # Frazione di inchiostro sotto cui pagina o fascia sono vuote
+PREFILTRO_CARTA_MIN = 128  # Livello mediano sotto cui la pagina è un foglio separatore scuro
+
+# Pipeline dell'elaborazione sequenziale: lettura/rasterizzazione, OCR ed estrazione
+# girano in thread distinti collegati da code limitate. Una pagina a 200 DPI a colori
+# occupa circa 11 MB: la coda delle immagini limita la memoria, quella dei testi no
+PIPELINE_CODA_PAGINE = 4  # Pagine rasterizzate in attesa di OCR (--coda-pagine)
+PIPELINE_CODA_TESTI = 64  # Testi OCR in attesa di estrazione
+
+# Elaborazione distribuita (--coordina / --lavora): i PDF sono divisi in shard di pagine
+# consecutive in una coda SQLite su una cartella condivisa. Un worker tiene uno shard per
+# DISTRIBUITO_LEASE_S secondi e rinnova il lease ogni DISTRIBUITO_HEARTBEAT_S: se smette
+# (processo terminato, host spento, rete interrotta) lo shard torna agli altri worker.
+# I lease usano l'orologio di ogni host: gli host vanno sincronizzati (NTP)
+DISTRIBUITO_PAGINE_SHARD = 25  # Pagine consecutive per shard
+DISTRIBUITO_LEASE_S = 300
+DISTRIBUITO_HEARTBEAT_S = 60
+DISTRIBUITO_MAX_TENTATIVI = 3  # Tentativi per shard prima di segnarlo in errore
+DISTRIBUITO_ATTESA_S = 10.0  # Secondi tra due controlli della coda quando non c'è lavoro
+
+# Configurazione Tesseract per campo (--psm 7 = riga singola)
+F24_ROI_TESSERACT_CONFIG = {
+    'codice_fiscale': '--psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    'importo': '--psm 7 -c tessedit_char_whitelist=0123456789.,',
+    'abi_cab': '--psm 6 -c tessedit_char_whitelist=0123456789',
+    'data': '--psm 7',
+}
+
+# Abbinamento delega per delega (se il tabulato contiene le righe di dettaglio)
+# Scarto massimo tra importo PDF e tabulato per abbinare la stessa coppia CAB/CF (in centesimi);
+# gli importi che differiscono per una sola cifra (tipico errore OCR) sono abbinati comunque
+ABBINAMENTO_TOLLERANZA_CENT = 100
+ABBINAMENTO_MAX_DIFF_CF = 2  # Caratteri diversi ammessi nel CF a parità di CAB e importo
+
+# Spiegazione delle discrepanze per CAB (deleghe in più/mancanti, importi letti male)
+SPIEGAZIONE_MAX_VOCI = 4  # Numero massimo di cause combinate in una spiegazione
+SPIEGAZIONE_BUDGET_S = 0.5  # Tempo massimo di ricerca per CAB (secondi)
 
 # Correzioni OCR per caratteri comuni
 # Mapping: carattere_errato -> carattere_corretto
@@ -62,9 +143,12 @@ EURO_PATTERNS = [
     r'EURO\s*\+\s*([\d.,]+)',
     r'(\d{1,3}\.?\d{0,3},\d{2})\s*\]?\s*$',
     r'TOTALE.*?EURO.*?([\d.,]+)',
-    r'SALDO\s*\(A-B\)[^\d]*([\d.,]+)',
 ]
 
+# Importo di ripiego se nessun EURO_PATTERNS trova un importo: il primo SALDO (A-B)
+# del testo, in maiuscolo come stampato sul modello (non l'ultimo come per EURO_PATTERNS)
+SALDO_PATTERN = r'SALDO\s*\(A-B\)[^\d]*([\d.,]+)'
+
 # Pattern CAB
 CAB_PATTERNS = [
     r'08749\s*[|\sO0]*(\d{5})',  # Con ABI
@@ -73,6 +157,14 @@ CAB_PATTERNS = [
     r'ABI[:\s]*08749[^\d]*CAB[:\s]*(\d{5})',
 ]
 
+# Pattern riga di dettaglio del tabulato (una delega per riga).
+# Gruppi con nome: cab (facoltativo), cf, importo
+TABULATO_DELEGA_PATTERN = (
+    r'^\s*(?:(?P<cab>\d{5})\s+)?'
+    r'(?P<cf>[A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z]|\d{11})\s+'
+    r'(?:.*\s)?(?P<importo>\d{1,3}(?:\.\d{3})*,\d{2})\s*$'
+)
+
 # Pattern Data Pagamento
 DATA_PATTERNS = [
     r'(\d{1,2})\s*(GEN|FEB|MAR|APR|MAG|GIU|LUG|AGO|SET|OTT|NOV|DIC)[A-Z]*\.?\s*(\d{4})',
@@ -87,6 +179,17 @@ LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
 # File temporanei
 TEMP_DIR = '/tmp/f24_ocr'
 
+# Cache OCR persistente (testo per pagina, chiave = hash file + pagina + DPI + lingua + versione Tesseract)
+OCR_CACHE_DIR = TEMP_DIR + '/ocr_cache'
+OCR_CACHE_MAX_MB = 512  # Oltre questa dimensione vengono eliminate le pagine usate meno di recente
+
+# Manifest della modalità incrementale (--incrementale senza percorso: nella cartella PDF)
+MANIFEST_FILENAME = '.riconcilia_manifest.json'
+
+# Modalità --watch
+WATCH_INTERVALLO = 5.0  # Secondi tra due controlli della cartella (polling / timeout inotify)
+WATCH_DIMENSIONE_CODA = 32  # PDF in attesa di OCR oltre i quali la sorveglianza si ferma (backpressure)
+
 # Report
 REPORT_DATE_FORMAT = '%d/%m/%Y %H:%M'
 MAX_DETTAGLIO_DISCREPANZE = 10  # Numero massimo di deleghe da mostrare nei dettagli
@@ -12,34 +12,58 @@ Uso:
     python riconcilia_f24_ocr.py --tabulato FILE.txt --pdf-folder CARTELLA_PDF
     python riconcilia_f24_ocr.py --tabulato FILE.txt --pdf-folder CARTELLA_PDF --output report.json
     python riconcilia_f24_ocr.py --help
+
+Uso come libreria (vedi iter_deleghe e Riconciliatore):
+    from riconcilia_f24_ocr import Riconciliatore
+    with Riconciliatore(workers=4) as r:
+        risultati = r.riconcilia('tabulato.txt', 'cartella_pdf')
 """
 
 import re
 import os
 import sys
 import json
+import time
+import queue
+import socket
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import zlib
 import csv
 import argparse
 import logging
+import cProfile
+from array import array
 from pathlib import Path
 from collections import defaultdict
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass, asdict
+from functools import partial
+from itertools import combinations
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Any
+from dataclasses import dataclass, asdict, field, replace
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+
+# Il logging su stdout è configurato solo da riga di comando (configura_logging):
+# importare il modulo come libreria non tocca la configurazione del chiamante
 logger = logging.getLogger(__name__)
 
 
-# Installa dipendenze se necessario
+def configura_logging(level: int = logging.INFO) -> None:
+    """Configura il logging su stdout per gli script da riga di comando."""
+    logging.basicConfig(level=level, format=LOG_FORMAT, handlers=[logging.StreamHandler(sys.stdout)])
+
+
+# Installa dipendenze se necessario (solo da riga di comando, vedi main)
 def check_dependencies() -> None:
     """Verifica e installa le dipendenze necessarie."""
     try:
@@ -58,46 +82,101 @@ def check_dependencies() -> None:
             raise
 
 
-check_dependencies()
+# pdfplumber, pdf2image, Pillow e pytesseract sono importati nelle funzioni che li
+# usano: l'import del modulo resta leggero per chi usa solo tabulato o estrazione
+from config import (
+    ABBINAMENTO_MAX_DIFF_CF, ABBINAMENTO_TOLLERANZA_CENT,
+    CAB_PATTERNS, CAB_VALID_PREFIXES, CF_PATTERNS, DATA_PATTERNS,
+    DISTRIBUITO_ATTESA_S, DISTRIBUITO_HEARTBEAT_S, DISTRIBUITO_LEASE_S, DISTRIBUITO_MAX_TENTATIVI,
+    DISTRIBUITO_PAGINE_SHARD, DUPLICATI_ATTESA_S, DUPLICATI_LARGHEZZA_FIRMA, DUPLICATI_SOGLIA, EURO_PATTERNS,
+    F24_ROI_LAYOUT, F24_ROI_TESSERACT_CONFIG, FILIALI_CAB_FILE, IMPORTO_MAX_CENT, IMPORTO_MIN_CENT,
+    LOG_FORMAT, MANIFEST_FILENAME,
+    OCR_CACHE_DIR, OCR_CACHE_MAX_MB, OCR_DPI, OCR_DPI_RAPIDO, OCR_LANG, OCR_MOTORE, SOGLIA_TESTO_NATIVO,
+    PREELABORAZIONE_DPI_MAX, PREELABORAZIONE_FINESTRA, PREELABORAZIONE_MAX_GRADI,
+    PIPELINE_CODA_PAGINE, PIPELINE_CODA_TESTI, PREELABORAZIONE_PASSI, PREELABORAZIONE_SCARTO,
+    PREFILTRO_CARTA_MIN, PREFILTRO_CONTRASTO, PREFILTRO_DPI, PREFILTRO_INCHIOSTRO_MIN,
+    SALDO_PATTERN, SPIEGAZIONE_BUDGET_S, SPIEGAZIONE_MAX_VOCI,
+    TABULATO_DELEGA_PATTERN, TEMP_DIR, WATCH_DIMENSIONE_CODA, WATCH_INTERVALLO
+)
+
+
+def carica_filiali(filepath: str) -> Dict[str, str]:
+    """
+    Carica il mapping filiali -> CAB da un file CSV (colonne: filiale,cab).
+
+    Args:
+        filepath: Percorso del file CSV
 
-from pdf2image import convert_from_path
-import pytesseract
-import pdfplumber
+    Returns:
+        Dizionario nome filiale (maiuscolo) -> CAB; vuoto se il file non esiste
+    """
+    if not os.path.exists(filepath):
+        logger.warning(f"File filiali non trovato: {filepath}")
+        return {}
 
+    filiali: Dict[str, str] = {}
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        for riga in csv.DictReader(f):
+            nome = (riga.get('filiale') or '').strip().upper()
+            cab = (riga.get('cab') or '').strip()
+            if nome and cab:
+                filiali[nome] = cab
+    return filiali
 
-# Mapping filiali -> CAB (da personalizzare)
-FILIALE_TO_CAB: Dict[str, str] = {
-    'PESEGGIA': '36320',
-    'SALZANO': '36270',
-    'SCORZE': '36321',
-    'ZERO BRANCO': '36322',
-    'QUINTO': '36330',
-    'MOGLIANO': '61741',
-    'PREGANZIOL': '61742',
-}
 
+# Mapping filiali -> CAB (da personalizzare in filiali_cab.csv)
+FILIALE_TO_CAB: Dict[str, str] = carica_filiali(FILIALI_CAB_FILE)
 
-@dataclass
+
+@dataclass(slots=True)
 class DelegaF24:
     """Rappresenta una delega F24 estratta da PDF."""
     file: str
     pagina: int
     codice_fiscale: Optional[str] = None
-    importo: Optional[float] = None
+    importo_cent: Optional[int] = None
     cab: Optional[str] = None
     filiale: Optional[str] = None
     data_pagamento: Optional[str] = None
+    # Pagina di cui la delega è una copia ("file.pdf pag. N"): esclusa da totali e abbinamento
+    duplicato_di: Optional[str] = None
 
     def to_dict(self) -> Dict[str, Any]:
         """Converte in dizionario."""
         return asdict(self)
 
+    def is_completa(self) -> bool:
+        """True se sono stati trovati sia il codice fiscale sia l'importo."""
+        return bool(self.codice_fiscale and self.importo_cent)
+
+    def integra(self, altra: 'DelegaF24') -> 'DelegaF24':
+        """Completa i campi mancanti con quelli di un'altra estrazione della stessa pagina."""
+        return DelegaF24(
+            file=self.file,
+            pagina=self.pagina,
+            codice_fiscale=self.codice_fiscale or altra.codice_fiscale,
+            importo_cent=self.importo_cent or altra.importo_cent,
+            cab=self.cab or altra.cab,
+            filiale=self.filiale or altra.filiale,
+            data_pagamento=self.data_pagamento or altra.data_pagamento,
+            duplicato_di=self.duplicato_di or altra.duplicato_di
+        )
+
 
-@dataclass
+@dataclass(slots=True)
 class DatiCAB:
     """Dati aggregati per CAB dal tabulato."""
     n_deleghe: int
-    totale: float
+    totale_cent: int
+
+
+@dataclass(slots=True)
+class RigaTabulato:
+    """Riga di dettaglio del tabulato (una delega)."""
+    riga: int
+    codice_fiscale: str
+    importo_cent: int
+    cab: Optional[str] = None
 
 
 @dataclass
@@ -106,445 +185,3966 @@ class RisultatoTabulato:
     data: str
     per_cab: Dict[str, DatiCAB]
     totale: Optional[DatiCAB]
+    righe: List[RigaTabulato] = field(default_factory=list)
 
 
-def valida_codice_fiscale(cf: str) -> bool:
+class LottoDeleghe(Sequence):
+    """
+    Deleghe in formato colonnare per le elaborazioni su grandi volumi.
+
+    Ogni campo è una colonna: pagina e importo in array di interi, file,
+    CAB, filiale, data e pagina originale dei duplicati come codici in un
+    dizionario di stringhe internate (pochi valori distinti ripetuti su
+    centinaia di migliaia di righe), il codice fiscale in una lista.
+    Raggruppamento per CAB ed export lavorano direttamente sulle colonne;
+    l'accesso per indice o l'iterazione restituiscono DelegaF24, quindi il
+    lotto si usa come una lista. Le deleghe duplicate restano nel lotto
+    (e nell'export) ma non entrano nei totali.
     """
-    Valida il formato di un codice fiscale italiano.
 
-    Args:
-        cf: Codice fiscale da validare
+    __slots__ = ('pagina', 'importo_cent', 'codice_fiscale',
+                 '_file', '_cab', '_filiale', '_data', '_duplicato_di', '_valori', '_codici')
+
+    # importo_cent assente (gli importi validi sono sempre positivi)
+    IMPORTO_ASSENTE = -1
+
+    def __init__(self, deleghe: Iterable[DelegaF24] = ()):
+        self.pagina = array('l')
+        self.importo_cent = array('q')
+        self.codice_fiscale: List[Optional[str]] = []
+        self._file = array('l')
+        self._cab = array('l')
+        self._filiale = array('l')
+        self._data = array('l')
+        self._duplicato_di = array('l')
+        # Codice 0 = None
+        self._valori: List[Optional[str]] = [None]
+        self._codici: Dict[str, int] = {}
+        self.estendi(deleghe)
+
+    def _codifica(self, valore: Optional[str]) -> int:
+        if valore is None:
+            return 0
+        codice = self._codici.get(valore)
+        if codice is None:
+            codice = self._codici[valore] = len(self._valori)
+            self._valori.append(sys.intern(valore))
+        return codice
+
+    def aggiungi(self, d: DelegaF24) -> None:
+        """Aggiunge una delega in coda al lotto."""
+        self.pagina.append(d.pagina)
+        self.importo_cent.append(self.IMPORTO_ASSENTE if d.importo_cent is None else d.importo_cent)
+        self.codice_fiscale.append(d.codice_fiscale)
+        self._file.append(self._codifica(d.file))
+        self._cab.append(self._codifica(d.cab))
+        self._filiale.append(self._codifica(d.filiale))
+        self._data.append(self._codifica(d.data_pagamento))
+        self._duplicato_di.append(self._codifica(d.duplicato_di))
+
+    def estendi(self, deleghe: Iterable[DelegaF24]) -> None:
+        """Aggiunge più deleghe in coda al lotto."""
+        for d in deleghe:
+            self.aggiungi(d)
+
+    def __len__(self) -> int:
+        return len(self.pagina)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        importo = self.importo_cent[i]
+        return DelegaF24(
+            file=self._valori[self._file[i]],
+            pagina=self.pagina[i],
+            codice_fiscale=self.codice_fiscale[i],
+            importo_cent=None if importo == self.IMPORTO_ASSENTE else importo,
+            cab=self._valori[self._cab[i]],
+            filiale=self._valori[self._filiale[i]],
+            data_pagamento=self._valori[self._data[i]],
+            duplicato_di=self._valori[self._duplicato_di[i]]
+        )
 
-    Returns:
-        True se il formato è valido, False altrimenti
-    """
-    if not cf or len(cf) != 16:
-        return False
+    def duplicati(self) -> List[int]:
+        """Indici delle deleghe duplicate di un'altra pagina."""
+        return [i for i, codice in enumerate(self._duplicato_di) if codice]
 
-    # Pattern: 6 lettere + 2 numeri + 1 lettera + 2 numeri + 1 lettera + 3 numeri + 1 lettera
-    pattern = r'^[A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z]$'
-    return bool(re.match(pattern, cf.upper()))
+    def senza_duplicati(self) -> Iterator[DelegaF24]:
+        """Deleghe escluse le copie, per l'abbinamento con il tabulato."""
+        for i, codice in enumerate(self._duplicato_di):
+            if not codice:
+                yield self[i]
 
+    def totale_cent(self) -> int:
+        """Somma degli importi presenti, in centesimi, escluse le deleghe duplicate."""
+        # Gli importi assenti valgono -1: si compensano con il loro conteggio
+        totale = sum(self.importo_cent) + self.importo_cent.count(self.IMPORTO_ASSENTE)
+        return totale - sum(max(self.importo_cent[i], 0) for i in self.duplicati())
 
-def pulisci_codice_fiscale(cf: str) -> Optional[str]:
-    """
-    Pulisce un codice fiscale da errori OCR comuni.
+    def per_cab(self) -> Dict[str, Tuple[List[int], int]]:
+        """
+        Raggruppa le deleghe per CAB lavorando sulle colonne.
 
-    Args:
-        cf: Codice fiscale grezzo
+        Returns:
+            Dizionario CAB -> (indici delle deleghe, totale in centesimi);
+            le deleghe senza CAB finiscono sotto 'SCONOSCIUTO', le duplicate
+            sono escluse
+        """
+        indici: Dict[int, List[int]] = defaultdict(list)
+        totali: Dict[int, int] = defaultdict(int)
+        for i, (codice, importo, duplicato) in enumerate(
+            zip(self._cab, self.importo_cent, self._duplicato_di)
+        ):
+            if duplicato:
+                continue
+            indici[codice].append(i)
+            if importo != self.IMPORTO_ASSENTE:
+                totali[codice] += importo
+        return {
+            self._valori[codice] or 'SCONOSCIUTO': (idx, totali[codice])
+            for codice, idx in indici.items()
+        }
 
-    Returns:
-        Codice fiscale pulito o None se non valido
+    def righe(self) -> Iterator[Dict[str, Any]]:
+        """Deleghe come dizionari per l'export, senza costruire oggetti DelegaF24."""
+        valori = self._valori
+        for i in range(len(self)):
+            importo = self.importo_cent[i]
+            yield {
+                'file': valori[self._file[i]],
+                'pagina': self.pagina[i],
+                'codice_fiscale': self.codice_fiscale[i],
+                'importo_cent': None if importo == self.IMPORTO_ASSENTE else importo,
+                'cab': valori[self._cab[i]],
+                'filiale': valori[self._filiale[i]],
+                'data_pagamento': valori[self._data[i]],
+                'duplicato_di': valori[self._duplicato_di[i]]
+            }
+
+
+class MetricheFasi:
+    """
+    Tempi di elaborazione per fase (--profile).
+
+    Fasi misurate: testo_nativo (pdfplumber), rasterizzazione (pdftoppm),
+    prefiltro (pagine bianche e separatori), firma_pagina (controllo dei
+    duplicati), ocr (Tesseract), estrazione_campi
+    (regex), aggregazione (confronto per CAB, abbinamento, spiegazioni) ed
+    export. Per ogni fase si registrano
+    numero di unità (pagine o deleghe), tempo totale e unità più lenta; per
+    ogni file pagine e secondi per fase. Disattivate, le misure non hanno
+    costo. Nei processi del pool le metriche vengono raccolte per job e
+    unite nel processo principale (vedi esegui_job).
+
+    I contatori del riepilogo (pagine scartate dal prefiltro, tempo di OCR)
+    sono raccolti anche senza --profile. Con l'elaborazione sequenziale
+    vengono registrate anche profondità e attese delle code tra gli stadi
+    della pipeline (vedi PipelineEstrazione).
     """
-    if not cf:
-        return None
 
-    # Rimuovi spazi e converti in maiuscolo
-    cf = cf.upper().strip().replace(' ', '')
+    def __init__(self):
+        self.attive = False
+        self._lock = threading.Lock()
+        self.azzera()
+
+    def azzera(self) -> None:
+        """Elimina le misure raccolte."""
+        self.fasi: Dict[str, List[float]] = {}  # fase -> [unità, secondi, massimo per unità]
+        self.per_file: Dict[str, Dict[str, float]] = {}
+        self.contatori: Dict[str, float] = defaultdict(float)
+        self.code: Dict[str, Dict[str, float]] = {}  # coda -> misure (CodaMisurata.esporta)
+
+    def fase(self, nome: str, n: int = 1, file: Optional[str] = None):
+        """Context manager che misura una fase di n unità (pagine, deleghe)."""
+        if not self.attive:
+            return nullcontext()
+        return self._misura(nome, n, file)
+
+    @contextmanager
+    def _misura(self, nome: str, n: int, file: Optional[str]) -> Iterator[None]:
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registra(nome, time.perf_counter() - inizio, n, file)
+
+    def registra(self, nome: str, secondi: float, n: int = 1, file: Optional[str] = None) -> None:
+        """Aggiunge una misura alla fase (e al file, se indicato)."""
+        with self._lock:
+            voce = self.fasi.setdefault(nome, [0, 0.0, 0.0])
+            voce[0] += n
+            voce[1] += secondi
+            voce[2] = max(voce[2], secondi / max(n, 1))
+            if file:
+                per_file = self.per_file.setdefault(os.path.basename(file), {'pagine': 0})
+                per_file[nome] = per_file.get(nome, 0.0) + secondi
+
+    def conta(self, nome: str, valore: float = 1) -> None:
+        """Incrementa un contatore del riepilogo (attivo anche senza profilo)."""
+        with self._lock:
+            self.contatori[nome] += valore
+
+    def registra_code(self, code: Dict[str, Dict[str, float]]) -> None:
+        """Registra le misure delle code della pipeline."""
+        if self.attive:
+            with self._lock:
+                self.code.update(code)
+
+    def conta_pagine(self, file: str, n: int) -> None:
+        """Registra le pagine di un file."""
+        if self.attive:
+            with self._lock:
+                self.per_file.setdefault(os.path.basename(file), {'pagine': 0})['pagine'] += n
+
+    def esporta(self) -> Dict[str, Any]:
+        """Misure in forma serializzabile (per i job del pool e il file metriche)."""
+        with self._lock:
+            return {
+                'fasi': {k: list(v) for k, v in self.fasi.items()},
+                'file': {k: dict(v) for k, v in self.per_file.items()},
+                'contatori': dict(self.contatori),
+                'code': {k: dict(v) for k, v in self.code.items()}
+            }
+
+    def unisci(self, dati: Optional[Dict[str, Any]]) -> None:
+        """Somma le misure raccolte in un altro processo."""
+        if not dati:
+            return
+        with self._lock:
+            for nome, (n, secondi, massimo) in dati['fasi'].items():
+                voce = self.fasi.setdefault(nome, [0, 0.0, 0.0])
+                voce[0] += n
+                voce[1] += secondi
+                voce[2] = max(voce[2], massimo)
+            for file, misure in dati['file'].items():
+                per_file = self.per_file.setdefault(file, {'pagine': 0})
+                for k, v in misure.items():
+                    per_file[k] = per_file.get(k, 0) + v
+            for nome, valore in dati['contatori'].items():
+                self.contatori[nome] += valore
+            self.code.update(dati.get('code', {}))
+
+
+METRICHE = MetricheFasi()
+
+
+def esegui_job(profilo: bool, funzione: Callable[..., Any], *args: Any) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    Esegue un job del pool raccogliendo le metriche del processo worker.
 
-    # Correzioni comuni OCR
-    correzioni = {
-        'O': '0', 'I': '1', 'S': '5', 'Z': '2',
-        'B': '8', 'G': '6', 'Q': '0'
-    }
+    Args:
+        profilo: True se le metriche sono attive nel processo principale
+        funzione: Funzione del job
+        *args: Argomenti della funzione
 
-    # Applica correzioni solo alle posizioni numeriche
-    cf_pulito = list(cf)
-    posizioni_numeriche = [6, 7, 9, 10, 12, 13, 14]
+    Returns:
+        Tuple (risultato della funzione, metriche del job: solo i contatori
+        se il profilo non è attivo)
+    """
+    METRICHE.attive = profilo
+    METRICHE.azzera()
+    risultato = funzione(*args)
+    return risultato, METRICHE.esporta()
 
-    for pos in posizioni_numeriche:
-        if pos < len(cf_pulito) and cf_pulito[pos] in correzioni:
-            cf_pulito[pos] = correzioni[cf_pulito[pos]]
 
-    cf_result = ''.join(cf_pulito)
+def memoria_massima_mb() -> Tuple[Optional[float], Optional[float]]:
+    """
+    Picco di memoria residente (RSS) del processo e dei processi figli terminati.
 
-    return cf_result if valida_codice_fiscale(cf_result) else None
+    Returns:
+        Tuple (MB del processo, MB dei figli: pool, tesseract, pdftoppm);
+        None dove il modulo resource non è disponibile (Windows)
+    """
+    if resource is None:
+        return None, None
+    # ru_maxrss è in KB su Linux, in byte su macOS
+    divisore = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisore,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisore
+    )
 
 
-def parse_importo(importo_str: str) -> Optional[float]:
+def report_metriche(durata: float, metriche_file: Optional[str] = None) -> Dict[str, Any]:
     """
-    Parsa una stringa importo in float.
+    Stampa la tabella dei tempi per fase e scrive il file metriche.
 
     Args:
-        importo_str: Stringa contenente l'importo
+        durata: Durata complessiva della riconciliazione in secondi
+        metriche_file: File JSON delle metriche (opzionale)
 
     Returns:
-        Importo come float o None se non valido
+        Metriche complete (fasi, file, throughput, memoria)
     """
-    try:
-        # Rimuovi punti come separatori delle migliaia e sostituisci virgola con punto
-        importo_clean = importo_str.replace('.', '').replace(',', '.').strip()
-        importo = float(importo_clean)
-
-        # Validazione range ragionevole (da 10€ a 1M€)
-        if 10 <= importo <= 1000000:
-            return importo
-        else:
-            logger.debug(f"Importo fuori range: {importo}")
-            return None
-    except (ValueError, AttributeError) as e:
-        logger.debug(f"Errore parsing importo '{importo_str}': {e}")
-        return None
+    dati = METRICHE.esporta()
+    pagine = sum(f['pagine'] for f in dati['file'].values())
+    rss, rss_figli = memoria_massima_mb()
 
+    metriche = {
+        'timestamp': datetime.now().isoformat(),
+        'durata_s': durata,
+        'pagine': pagine,
+        'pagine_al_secondo': pagine / durata if durata > 0 else None,
+        'rss_max_mb': rss,
+        'rss_max_figli_mb': rss_figli,
+        'fasi': {
+            nome: {'unita': n, 'secondi': secondi, 'medio_ms': secondi / n * 1000 if n else 0,
+                   'max_ms': massimo * 1000}
+            for nome, (n, secondi, massimo) in dati['fasi'].items()
+        },
+        'file': dati['file'],
+        'code': dati['code']
+    }
 
-def parse_tabulato_txt(filepath: str) -> RisultatoTabulato:
-    """
-    Parsa il file TXT del tabulato e restituisce i dati per CAB.
+    print("\n" + "=" * 70)
+    print("PROFILO TEMPI PER FASE")
+    print("=" * 70)
+    print(f"\n{'FASE':<20} {'UNITÀ':>8} {'TOTALE s':>10} {'MEDIO ms':>10} {'MAX ms':>10} {'%':>6}")
+    print("-" * 70)
+    for nome, fase in sorted(metriche['fasi'].items(), key=lambda x: -x[1]['secondi']):
+        # Con il pool le fasi si sovrappongono: la percentuale può superare 100
+        perc = fase['secondi'] / durata * 100 if durata > 0 else 0
+        print(f"{nome:<20} {fase['unita']:>8} {fase['secondi']:>10.2f} "
+              f"{fase['medio_ms']:>10.1f} {fase['max_ms']:>10.1f} {perc:>6.1f}")
+    print("-" * 70)
+    print(f"Durata totale:        {durata:.2f} s")
+    if pagine:
+        print(f"Pagine:               {pagine} ({metriche['pagine_al_secondo']:.2f} pagine/s)")
+    if rss is not None:
+        print(f"Picco RSS:            {rss:.0f} MB (processi figli: {rss_figli:.0f} MB)")
+
+    if metriche['code']:
+        # Produttori in attesa: lo stadio a valle è il collo di bottiglia; consumatori: quello a monte
+        print(f"\n{'CODA':<12} {'CAPACITÀ':>8} {'ELEMENTI':>9} {'PROF. MAX':>10} {'PROF. MEDIA':>12} "
+              f"{'ATT. PROD. s':>13} {'ATT. CONS. s':>13}")
+        print("-" * 82)
+        for nome, coda in metriche['code'].items():
+            print(f"{nome:<12} {coda['capacita']:>8} {coda['elementi']:>9} {coda['profondita_max']:>10} "
+                  f"{coda['profondita_media']:>12.1f} {coda['attesa_produttori_s']:>13.2f} "
+                  f"{coda['attesa_consumatori_s']:>13.2f}")
+
+    if metriche_file:
+        try:
+            with open(metriche_file, 'w', encoding='utf-8') as f:
+                json.dump(metriche, f, indent=2, ensure_ascii=False)
+            logger.info(f"Metriche salvate: {metriche_file}")
+        except OSError as e:
+            logger.error(f"Errore salvataggio metriche {metriche_file}: {e}")
 
-    Args:
-        filepath: Percorso del file tabulato
+    return metriche
 
-    Returns:
-        RisultatoTabulato con i dati estratti
 
-    Raises:
-        FileNotFoundError: Se il file non esiste
-        ValueError: Se il formato non è valido
+class CacheOCR:
+    """
+    Cache persistente (SQLite) del testo OCR per pagina.
+
+    La chiave combina hash del contenuto del file, numero pagina, DPI,
+    lingua e versione di Tesseract: rinominare o spostare un PDF non
+    invalida la cache, cambiare motore o parametri sì. Accanto al testo
+    è salvata la firma della pagina (firma_pagina), così anche le pagine
+    lette dalla cache partecipano al controllo dei duplicati. Quando la
+    dimensione totale supera il limite vengono eliminate le voci usate
+    meno di recente (LRU).
     """
-    logger.info(f"Parsing tabulato: {filepath}")
-
-    if not os.path.exists(filepath):
-        raise FileNotFoundError(f"File tabulato non trovato: {filepath}")
 
-    try:
-        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-    except Exception as e:
-        raise ValueError(f"Errore lettura file: {e}")
+    def __init__(self, cache_dir: str, max_mb: int = OCR_CACHE_MAX_MB):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, 'ocr_cache.sqlite')
+        self.max_bytes = max_mb * 1024 * 1024
+        self._scritture = 0
+
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS ocr ('
+            ' chiave TEXT PRIMARY KEY,'
+            ' testo TEXT NOT NULL,'
+            ' dimensione INTEGER NOT NULL,'
+            ' ultimo_accesso REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_accesso ON ocr (ultimo_accesso)')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS firme ('
+            ' chiave TEXT PRIMARY KEY,'
+            ' larghezza INTEGER NOT NULL,'
+            ' altezza INTEGER NOT NULL,'
+            ' firma BLOB NOT NULL,'
+            ' ultimo_accesso REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def chiave(file_hash: str, page_num: int, dpi: int, lang: str = 'ita', variante: str = '') -> str:
+        """Costruisce la chiave di cache per una pagina (variante: es. layout ROI)."""
+        return f"{file_hash}:{page_num}:{dpi}:{lang}:{versione_tesseract()}:{variante}"
+
+    @staticmethod
+    def chiave_firma(file_hash: str, page_num: int, dpi: int) -> str:
+        """Costruisce la chiave della firma di una pagina (non dipende dal motore OCR)."""
+        return f"{file_hash}:{page_num}:{dpi}"
+
+    def get(self, chiave: str) -> Optional[str]:
+        """Restituisce il testo OCR in cache o None."""
+        row = self.conn.execute('SELECT testo FROM ocr WHERE chiave = ?', (chiave,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute('UPDATE ocr SET ultimo_accesso = ? WHERE chiave = ?', (time.time(), chiave))
+        self.conn.commit()
+        return row[0]
+
+    def put(self, chiave: str, testo: str) -> None:
+        """Salva il testo OCR di una pagina."""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO ocr (chiave, testo, dimensione, ultimo_accesso) VALUES (?, ?, ?, ?)',
+            (chiave, testo, len(testo.encode('utf-8')), time.time())
+        )
+        self.conn.commit()
+
+        self._scritture += 1
+        if self._scritture % 100 == 0:
+            self.evict()
+
+    def get_firma(self, chiave: str) -> Optional[Any]:
+        """Restituisce la firma della pagina in cache (immagine L) o None."""
+        row = self.conn.execute(
+            'SELECT larghezza, altezza, firma FROM firme WHERE chiave = ?', (chiave,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.conn.execute('UPDATE firme SET ultimo_accesso = ? WHERE chiave = ?', (time.time(), chiave))
+        self.conn.commit()
+        from PIL import Image
+        return Image.frombytes('L', (row[0], row[1]), zlib.decompress(row[2]))
+
+    def put_firma(self, chiave: str, firma: Any) -> None:
+        """Salva la firma di una pagina."""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO firme (chiave, larghezza, altezza, firma, ultimo_accesso) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (chiave, firma.width, firma.height, zlib.compress(firma.tobytes()), time.time())
+        )
+        self.conn.commit()
 
-    # Trova la data del tabulato
-    data_match = re.search(r'DATA:\s*(\d{2}\s+\d{2}\s+\d{4})', content)
-    data_tabulato = data_match.group(1).replace(' ', '/') if data_match else "N/D"
+    def evict(self) -> int:
+        """
+        Elimina le voci meno recenti finché la cache rientra nel limite.
 
-    # Pattern per le righe con i dati per filiale (DIP/CAB)
-    pattern = re.compile(
-        r'^\s*(\d{5})\s+'  # CAB (5 cifre)
-        r'(\d+)\s+([\d.,]+)\s+'  # ministeriali: n.tot, saldo
-        r'(\d+)\s+([\d.,]+)\s+'  # corporate: n.tot, saldo
-        r'(\d+)\s+([\d.,]+)',    # cartacee: n.tot, saldo
-        re.MULTILINE
-    )
+        Testi OCR e firme sono ordinati insieme per ultimo accesso e ogni
+        voce eliminata sottrae dal totale la propria dimensione.
 
-    risultati: Dict[str, DatiCAB] = {}
+        Returns:
+            Numero di voci eliminate
+        """
+        totale = (
+            self.conn.execute('SELECT COALESCE(SUM(dimensione), 0) FROM ocr').fetchone()[0]
+            + self.conn.execute('SELECT COALESCE(SUM(LENGTH(firma)), 0) FROM firme').fetchone()[0]
+        )
+        if totale <= self.max_bytes:
+            return 0
+
+        eliminate: Dict[str, List[Tuple[str]]] = {'ocr': [], 'firme': []}
+        for tabella, chiave, dimensione, _ in self.conn.execute(
+            "SELECT 'ocr', chiave, dimensione, ultimo_accesso FROM ocr"
+            " UNION ALL SELECT 'firme', chiave, LENGTH(firma), ultimo_accesso FROM firme"
+            " ORDER BY ultimo_accesso"
+        ).fetchall():
+            if totale <= self.max_bytes:
+                break
+            eliminate[tabella].append((chiave,))
+            totale -= dimensione
 
-    for match in pattern.finditer(content):
-        cab = match.group(1)
-        n_cartacee = int(match.group(6))
-        saldo_str = match.group(7)
+        self.conn.executemany('DELETE FROM ocr WHERE chiave = ?', eliminate['ocr'])
+        self.conn.executemany('DELETE FROM firme WHERE chiave = ?', eliminate['firme'])
+        self.conn.commit()
+        n = len(eliminate['ocr']) + len(eliminate['firme'])
+        logger.debug(f"Cache OCR: eliminate {len(eliminate['ocr'])} voci e {len(eliminate['firme'])} firme")
+        return n
 
-        importo = parse_importo(saldo_str)
-        if importo is None:
-            logger.warning(f"Impossibile parsare importo per CAB {cab}: {saldo_str}")
-            importo = 0.0
+    def close(self) -> None:
+        """Applica l'eviction e chiude la connessione."""
+        self.evict()
+        self.conn.close()
 
-        risultati[cab] = DatiCAB(n_deleghe=n_cartacee, totale=importo)
-        logger.debug(f"CAB {cab}: {n_cartacee} deleghe, €{importo:,.2f}")
 
-    # Estrai totali generali
-    tot_match = re.search(
-        r'TOT\.:\s+\d+\s+[\d.,]+\s+\d+\s+[\d.,]+\s+(\d+)\s+([\d.,]+)',
-        content
-    )
+_CACHE_PER_PROCESSO: Dict[Tuple[int, int, str], CacheOCR] = {}
 
-    totale_generale = None
-    if tot_match:
-        n_tot = int(tot_match.group(1))
-        saldo_tot = parse_importo(tot_match.group(2))
-        if saldo_tot:
-            totale_generale = DatiCAB(n_deleghe=n_tot, totale=saldo_tot)
 
-    logger.info(f"Estratti dati per {len(risultati)} CAB")
+def apri_cache_ocr(cache_dir: str) -> CacheOCR:
+    """
+    Restituisce la cache OCR del processo (e thread) corrente.
 
-    return RisultatoTabulato(
-        data=data_tabulato,
-        per_cab=risultati,
-        totale=totale_generale
-    )
+    Le connessioni SQLite non vanno condivise tra processi o thread: ogni
+    worker apre la propria, riutilizzata per tutti i job che esegue.
+    """
+    chiave = (os.getpid(), threading.get_ident(), cache_dir)
+    if chiave not in _CACHE_PER_PROCESSO:
+        _CACHE_PER_PROCESSO[chiave] = CacheOCR(cache_dir)
+    return _CACHE_PER_PROCESSO[chiave]
 
 
-def is_scanned_pdf(pdf_path: str) -> bool:
+def firma_pagina(img: Any, larghezza: int = DUPLICATI_LARGHEZZA_FIRMA) -> Any:
     """
-    Verifica se un PDF è scansionato (immagine) o nativo (testo).
+    Calcola la firma percettiva di una pagina rasterizzata.
+
+    La firma è una miniatura in scala di grigi (media per blocchi): non
+    risente di ricompressione e rumore di conversione, ma conserva
+    abbastanza dettaglio perché una cifra diversa in un campo la cambi.
 
     Args:
-        pdf_path: Percorso del PDF
+        img: Immagine PIL della pagina
+        larghezza: Larghezza della miniatura in pixel
 
     Returns:
-        True se il PDF è scansionato, False se è nativo
+        Immagine PIL in modo L
     """
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Controlla le prime 2 pagine
-            for page in pdf.pages[:2]:
-                text = page.extract_text()
-                if text and len(text.strip()) > 50:
-                    logger.debug(f"{pdf_path}: PDF nativo (testo estratto)")
-                    return False
-        logger.debug(f"{pdf_path}: PDF scansionato")
-        return True
-    except Exception as e:
-        logger.warning(f"Errore verifica tipo PDF {pdf_path}: {e}")
-        return True  # Assume scansionato in caso di errore
+    from PIL import Image
+
+    grigia = img if img.mode == 'L' else img.convert('L')
+    altezza = max(1, round(grigia.height * larghezza / grigia.width))
+    return grigia.resize((larghezza, altezza), Image.BOX)
 
 
-def extract_from_native_pdf(pdf_path: str) -> List[DelegaF24]:
+class IndiceDuplicati:
+    """
+    Indice delle pagine scansionate di una riconciliazione, per riconoscere
+    i duplicati prima dell'OCR.
+
+    Due pagine sono la stessa scansione se le firme hanno la stessa
+    dimensione e nessun punto differisce più della soglia. I candidati
+    sono filtrati per luminosità media e su una miniatura ridotta 4 volte
+    (se le firme sono entro la soglia lo sono anche le loro medie), poi
+    confrontati sulla firma intera. La prima pagina registrata è
+    l'originale: il suo testo OCR viene riusato per le copie. Una copia il
+    cui originale è ancora in OCR ne attende il testo; se l'OCR
+    dell'originale fallisce la sua voce viene tolta (annulla) e la copia
+    diventa l'originale. Con più processi l'originale dipende dall'ordine
+    di elaborazione: ordina_duplicati lo riporta alla prima pagina in
+    ordine di file e pagina.
+
+    L'indice è un database SQLite condiviso dai worker, con una
+    connessione per processo e thread (vedi apri_indice_duplicati); ricerca
+    e registrazione avvengono nella stessa transazione, così due copie
+    elaborate in parallelo non risultano entrambe originali. Con
+    `condiviso` il database sta su una cartella di rete usata da più host
+    (vedi CodaLavori) e non usa il WAL, che funziona solo sullo stesso host.
     """
-    Estrae dati da PDF con testo nativo (selezionabile).
 
-    Args:
-        pdf_path: Percorso del PDF
+    RIDUZIONE = 4
+
+    def __init__(
+        self,
+        db_path: str,
+        soglia: int = DUPLICATI_SOGLIA,
+        condiviso: bool = False,
+        attesa_s: float = DUPLICATI_ATTESA_S
+    ):
+        self.db_path = db_path
+        self.soglia = soglia
+        self.attesa_s = attesa_s
+
+        # Transazioni esplicite (BEGIN IMMEDIATE) per serializzare ricerca e inserimento
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute(f"PRAGMA journal_mode={'DELETE' if condiviso else 'WAL'}")
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS pagine ('
+            ' variante TEXT NOT NULL,'
+            ' origine TEXT NOT NULL,'
+            ' media REAL NOT NULL,'
+            ' larghezza INTEGER NOT NULL,'
+            ' altezza INTEGER NOT NULL,'
+            ' ridotta BLOB NOT NULL,'
+            ' firma BLOB NOT NULL,'
+            ' testo TEXT,'
+            ' PRIMARY KEY (variante, origine))'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_pagine_media ON pagine (variante, media)')
 
-    Returns:
-        Lista di deleghe estratte
-    """
-    deleghe = []
+    def _simili(self, a: Any, dimensione: Tuple[int, int], b: bytes, soglia: int) -> bool:
+        from PIL import Image, ImageChops
 
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                text = page.extract_text() or ""
-                delega = extract_data_from_text(text, page_num, pdf_path)
-                if delega.codice_fiscale or delega.importo:
-                    deleghe.append(delega)
-    except Exception as e:
-        logger.error(f"Errore estrazione da PDF nativo {pdf_path}: {e}")
+        altra = Image.frombytes('L', dimensione, b)
+        return ImageChops.difference(a, altra).getextrema()[1] <= soglia
 
-    return deleghe
+    def registra(
+        self,
+        variante: str,
+        firma: Any,
+        origine: str,
+        testo: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Cerca la pagina tra quelle registrate e, se è nuova, la aggiunge.
+
+        Args:
+            variante: Parametri di OCR della pagina (DPI, riquadri,
+                preelaborazione): il testo si riusa solo a parità di variante
+            firma: Firma della pagina (firma_pagina)
+            origine: Identificativo della pagina ("file.pdf pag. N")
+            testo: Testo OCR della pagina, se già noto (es. dalla cache)
+
+        Returns:
+            Tuple (pagina originale, suo testo OCR) se la pagina è una copia;
+            (None, None) se la pagina è nuova o se l'originale è ancora senza
+            testo dopo attesa_s secondi (la pagina va riconosciuta da sola)
+        """
+        from PIL import ImageStat
+
+        ridotta = firma.reduce(self.RIDUZIONE)
+        media = ImageStat.Stat(ridotta).mean[0]
+        scadenza = time.monotonic() + self.attesa_s
+        while True:
+            originale, testo_originale = self._cerca_o_aggiungi(variante, firma, ridotta, media, origine, testo)
+            if originale is None or testo_originale is not None:
+                return originale, testo_originale
+            # Originale in OCR in un altro processo o thread: si attende il suo testo
+            if time.monotonic() >= scadenza:
+                logger.warning(f"{origine}: testo di {originale} non disponibile, pagina riconosciuta da sola")
+                return None, None
+            time.sleep(0.1)
+
+    def _cerca_o_aggiungi(
+        self,
+        variante: str,
+        firma: Any,
+        ridotta: Any,
+        media: float,
+        origine: str,
+        testo: Optional[str]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            candidati = self.conn.execute(
+                'SELECT origine, ridotta, firma, testo FROM pagine'
+                ' WHERE variante = ? AND media BETWEEN ? AND ?'
+                ' AND larghezza = ? AND altezza = ? AND origine != ?'
+                ' ORDER BY rowid',
+                (variante, media - self.soglia, media + self.soglia,
+                 firma.width, firma.height, origine)
+            ).fetchall()
+            for originale, ridotta_b, firma_b, testo_originale in candidati:
+                # Arrotondamento della media per blocchi: un livello di margine
+                if (self._simili(ridotta, ridotta.size, ridotta_b, self.soglia + 1)
+                        and self._simili(firma, firma.size, zlib.decompress(firma_b), self.soglia)):
+                    return originale, testo_originale
+
+            self.conn.execute(
+                'INSERT OR REPLACE INTO pagine'
+                ' (variante, origine, media, larghezza, altezza, ridotta, firma, testo)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (variante, origine, media, firma.width, firma.height,
+                 ridotta.tobytes(), zlib.compress(firma.tobytes()), testo)
+            )
+            return None, None
+        finally:
+            self.conn.execute('COMMIT')
+
+    def completa(self, variante: str, origine: str, testo: str) -> None:
+        """Salva il testo OCR di una pagina originale, riusato per le sue copie."""
+        self.conn.execute(
+            'UPDATE pagine SET testo = ? WHERE variante = ? AND origine = ?', (testo, variante, origine)
+        )
 
+    def annulla(self, variante: str, origine: str) -> None:
+        """Toglie una pagina originale il cui OCR è fallito: le sue copie non restano senza testo."""
+        self.conn.execute(
+            'DELETE FROM pagine WHERE variante = ? AND origine = ? AND testo IS NULL', (variante, origine)
+        )
 
-def extract_from_scanned_pdf(pdf_path: str, dpi: int = 200) -> List[DelegaF24]:
-    """
-    Estrae dati da PDF scansionato usando OCR.
+    def rimuovi(self, nome: str) -> int:
+        """
+        Toglie dall'indice le pagine di un file (es. eliminato o rinominato).
 
-    Args:
-        pdf_path: Percorso del PDF
-        dpi: Risoluzione per la conversione (default: 200)
+        Args:
+            nome: Nome del file, come nell'origine delle pagine ("file.pdf")
 
-    Returns:
-        Lista di deleghe estratte
-    """
-    deleghe = []
+        Returns:
+            Numero di pagine rimosse
+        """
+        prefisso = f"{nome} pag. "
+        return self.conn.execute(
+            'DELETE FROM pagine WHERE substr(origine, 1, ?) = ?', (len(prefisso), prefisso)
+        ).rowcount
 
-    try:
-        logger.debug(f"Conversione PDF in immagini: {pdf_path}")
-        images = convert_from_path(pdf_path, dpi=dpi)
-    except Exception as e:
-        logger.error(f"Errore conversione PDF {pdf_path}: {e}")
-        return deleghe
+    def close(self) -> None:
+        """Chiude la connessione."""
+        self.conn.close()
 
-    for page_num, img in enumerate(images, 1):
-        try:
-            logger.debug(f"OCR pagina {page_num}/{len(images)}")
-            text = pytesseract.image_to_string(img, lang='ita')
-            delega = extract_data_from_text(text, page_num, pdf_path)
-            if delega.codice_fiscale or delega.importo:
-                deleghe.append(delega)
-        except Exception as e:
-            logger.error(f"Errore OCR pagina {page_num} di {pdf_path}: {e}")
 
-    return deleghe
+_INDICI_PER_PROCESSO: Dict[Tuple[int, int, str], IndiceDuplicati] = {}
 
 
-def extract_data_from_text(text: str, page_num: int, pdf_path: str) -> DelegaF24:
-    """
-    Estrae i dati F24 dal testo (sia OCR che nativo).
+def apri_indice_duplicati(db_path: str) -> IndiceDuplicati:
+    """Restituisce la connessione all'indice dei duplicati del processo (e thread) corrente."""
+    chiave = (os.getpid(), threading.get_ident(), db_path)
+    if chiave not in _INDICI_PER_PROCESSO:
+        _INDICI_PER_PROCESSO[chiave] = IndiceDuplicati(db_path)
+    return _INDICI_PER_PROCESSO[chiave]
 
-    Args:
-        text: Testo estratto
-        page_num: Numero pagina
-        pdf_path: Percorso del PDF
 
-    Returns:
-        DelegaF24 con i dati estratti
+def crea_indice_duplicati() -> str:
     """
+    Crea il database dell'indice dei duplicati per una riconciliazione.
 
-    # Codice Fiscale
-    cf = None
-    cf_patterns = [
-        r'CODICE\s+FISCALE\s+([A-Z0-9]{16})',
-        r'COD(?:ICE)?\s*(?:FISC(?:ALE)?)?[:\s]+([A-Z0-9]{16})',
-        r'\b([A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z])\b',
-    ]
+    Returns:
+        Percorso del database, da passare ai worker e a elimina_indice_duplicati
+    """
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    fd, db_path = tempfile.mkstemp(prefix='duplicati_', suffix='.sqlite', dir=TEMP_DIR)
+    os.close(fd)
+    return db_path
 
-    for pattern in cf_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            cf_raw = match.group(1).upper()
-            cf = pulisci_codice_fiscale(cf_raw)
-            if cf:
-                logger.debug(f"CF trovato: {cf}")
-                break
 
-    # Importo EURO
-    importo = None
-    euro_patterns = [
-        r'EURO\s*[|:+\s]*?([\d]+[.,][\d]+[.,]?\d*)',
-        r'EURO\s*\+\s*([\d.,]+)',
-        r'(\d{1,3}\.?\d{0,3},\d{2})\s*\]?\s*$',
-        r'TOTALE.*?EURO.*?([\d.,]+)',
-    ]
+def elimina_indice_duplicati(db_path: str) -> None:
+    """Chiude le connessioni del processo all'indice dei duplicati e ne cancella i file."""
+    for chiave in [k for k in _INDICI_PER_PROCESSO if k[0] == os.getpid() and k[2] == db_path]:
+        _INDICI_PER_PROCESSO.pop(chiave).close()
+    for suffisso in ('', '-wal', '-shm'):
+        try:
+            os.remove(db_path + suffisso)
+        except FileNotFoundError:
+            pass
 
-    for pattern in euro_patterns:
-        matches = re.findall(pattern, text, re.MULTILINE | re.IGNORECASE)
-        if matches:
-            for m in reversed(matches):
-                val = parse_importo(m)
-                if val:
-                    importo = val
-                    logger.debug(f"Importo trovato: €{importo:,.2f}")
-                    break
-            if importo:
-                break
 
-    # Fallback: cerca SALDO (A-B)
-    if not importo:
-        saldo_match = re.search(r'SALDO\s*\(A-B\)[^\d]*([\d.,]+)', text)
-        if saldo_match:
-            importo = parse_importo(saldo_match.group(1))
-            if importo:
-                logger.debug(f"Importo da SALDO: €{importo:,.2f}")
+class MotoreOCR:
+    """
+    Backend OCR: riconosce il testo di un'immagine PIL.
 
-    # CAB
-    cab = None
-    cab_patterns = [
-        r'08749\s*[|\sO0]*(\d{5})',
-        r'CAB[/\s]*SPORTELLO\s*[:\s]*(\d{5})',
-        r'(\d{5})\s+[Tt]ratto',
-        r'ABI[:\s]*08749[^\d]*CAB[:\s]*(\d{5})',
-    ]
+    Un motore appartiene a un solo processo e thread (vedi motore_ocr) e
+    resta vivo per tutti i job che questi eseguono.
+    """
 
-    for pattern in cab_patterns:
-        match = re.search(pattern, text)
-        if match:
-            potential_cab = match.group(1)
-            # Valida che il CAB inizi con prefissi comuni
-            if potential_cab[:2] in ['02', '12', '36', '61', '62']:
-                cab = potential_cab
-                logger.debug(f"CAB trovato: {cab}")
-                break
+    nome = ''
 
-    # Filiale (dal timbro o intestazione)
-    filiale = None
-    for f_name, f_cab in FILIALE_TO_CAB.items():
-        if f_name.lower() in text.lower():
-            filiale = f_name
-            if not cab:
-                cab = f_cab
-                logger.debug(f"CAB derivato da filiale {filiale}: {cab}")
-            break
+    def riconosci(self, img: Any, config: str = '') -> str:
+        """
+        Restituisce il testo riconosciuto nell'immagine.
 
-    # Data pagamento
-    data_pag = None
-    data_patterns = [
-        r'(\d{1,2})\s*(GEN|FEB|MAR|APR|MAG|GIU|LUG|AGO|SET|OTT|NOV|DIC)[A-Z]*\.?\s*(\d{4})',
-        r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})',
-        r'DATA\s+PAG(?:AMENTO)?[:\s]+(\d{1,2}[/-]\d{1,2}[/-]\d{4})',
-    ]
+        Args:
+            img: Immagine PIL
+            config: Opzioni Tesseract in formato riga di comando (es. '--psm 7 -c var=valore')
+        """
+        raise NotImplementedError
 
-    for pattern in data_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            data_pag = match.group(0)
-            logger.debug(f"Data pagamento trovata: {data_pag}")
-            break
+    def versione(self) -> str:
+        """Versione di Tesseract usata dal motore (es. '5.3.0')."""
+        raise NotImplementedError
 
-    return DelegaF24(
-        file=os.path.basename(pdf_path),
-        pagina=page_num,
-        codice_fiscale=cf,
-        importo=importo,
-        cab=cab,
-        filiale=filiale,
-        data_pagamento=data_pag
-    )
+    def close(self) -> None:
+        """Libera le risorse del motore."""
 
 
-def estrai_deleghe_da_pdf(pdf_path: str) -> List[DelegaF24]:
+class MotorePytesseract(MotoreOCR):
     """
-    Estrae le deleghe da un PDF, scegliendo automaticamente il metodo.
+    Motore basato su pytesseract: un processo `tesseract` per ogni chiamata.
 
-    Args:
-        pdf_path: Percorso del PDF
-
-    Returns:
-        Lista di deleghe estratte
+    Ogni pagina paga l'avvio del processo, il caricamento del modello
+    linguistico e il passaggio dell'immagine tramite file temporaneo.
     """
-    logger.info(f"Elaborazione PDF: {os.path.basename(pdf_path)}")
 
-    if is_scanned_pdf(pdf_path):
-        logger.debug("Usando OCR per PDF scansionato")
-        return extract_from_scanned_pdf(pdf_path)
-    else:
-        logger.debug("Estrazione testo da PDF nativo")
-        return extract_from_native_pdf(pdf_path)
+    nome = 'pytesseract'
 
+    def __init__(self, lang: str = OCR_LANG):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.lang = lang
 
-def genera_report_console(
-    tabulato: RisultatoTabulato,
-    tutte_deleghe: List[DelegaF24],
-    discrepanze: List[Dict],
-    ok_count: int,
-    per_cab_pdf: Dict
-) -> None:
-    """Genera il report su console."""
+    def riconosci(self, img: Any, config: str = '') -> str:
+        return self._pytesseract.image_to_string(img, lang=self.lang, config=config)
 
-    print("\n" + "=" * 70)
-    print("RICONCILIAZIONE F24 CARTACEE")
-    print("=" * 70)
-    print(f"Eseguito: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-    print(f"Data tabulato: {tabulato.data}")
+    def versione(self) -> str:
+        return str(self._pytesseract.get_tesseract_version())
 
-    if tabulato.totale:
-        print(f"Totale atteso: {tabulato.totale.n_deleghe} deleghe, "
-              f"€{tabulato.totale.totale:,.2f}")
 
-    print(f"Totale estratto: {len(tutte_deleghe)} deleghe")
+class MotoreTesserocr(MotoreOCR):
+    """
+    Motore Tesseract residente tramite tesserocr (binding dell'API C).
 
-    # Confronto per CAB
-    print("\n" + "=" * 70)
-    print("CONFRONTO PER CAB")
-    print("=" * 70)
+    Il modello linguistico viene caricato una sola volta e le immagini
+    passano in memoria, senza processi né file temporanei. Le opzioni di
+    ogni chiamata (--psm, -c variabile=valore) sono applicate all'API
+    prima del riconoscimento; le variabili impostate da una chiamata
+    precedente e assenti in quella corrente tornano al valore iniziale.
+    """
 
-    print(f"\n{'CAB':<8} {'TXT N.':<8} {'TXT €':>12} {'PDF N.':<8} {'PDF €':>12} {'ESITO':<8}")
-    print("-" * 70)
+    nome = 'tesserocr'
+    PSM_RE = re.compile(r'--psm\s+(\d+)')
+    VARIABILE_RE = re.compile(r'-c\s+(\w+)=(\S*)')
 
-    tutti_cab = set(tabulato.per_cab.keys()) | set(per_cab_pdf.keys())
+    def __init__(self, lang: str = OCR_LANG):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.api = tesserocr.PyTessBaseAPI(lang=lang)
+        self._iniziali: Dict[str, str] = {}
 
-    for cab in sorted(tutti_cab):
-        txt_data = tabulato.per_cab.get(cab, DatiCAB(n_deleghe=0, totale=0.0))
-        pdf_data = per_cab_pdf.get(cab, {'deleghe': [], 'totale': 0.0})
+    def _applica_config(self, config: str) -> None:
+        """Imposta modalità di segmentazione e variabili della chiamata."""
+        match = self.PSM_RE.search(config)
+        # Come la riga di comando: senza --psm segmentazione automatica (3)
+        self.api.SetPageSegMode(int(match.group(1)) if match else self._tesserocr.PSM.AUTO)
 
-        n_txt = txt_data.n_deleghe
-        tot_txt = txt_data.totale
-        n_pdf = len(pdf_data['deleghe'])
-        tot_pdf = pdf_data['totale']
+        variabili = dict(self.VARIABILE_RE.findall(config))
+        for nome, iniziale in self._iniziali.items():
+            if nome not in variabili:
+                self.api.SetVariable(nome, iniziale)
+        for nome, valore in variabili.items():
+            if nome not in self._iniziali:
+                self._iniziali[nome] = self.api.GetVariableAsString(nome) or ''
+            self.api.SetVariable(nome, valore)
 
-        if n_txt == 0 and n_pdf == 0:
-            continue
+    def riconosci(self, img: Any, config: str = '') -> str:
+        self._applica_config(config)
+        self.api.SetImage(img)
+        return self.api.GetUTF8Text()
 
-        n_ok = n_txt == n_pdf
-        tot_ok = abs(tot_txt - tot_pdf) < 0.01
+    def versione(self) -> str:
+        return self._tesserocr.tesseract_version()
 
-        esito = "✅ OK" if (n_ok and tot_ok) else "❌ DIFF"
+    def close(self) -> None:
+        """Libera il motore e il modello caricato."""
+        self.api.End()
 
-        print(f"{cab:<8} {n_txt:<8} {tot_txt:>12,.2f} {n_pdf:<8} {tot_pdf:>12,.2f} {esito:<8}")
 
-    # Totali
-    tot_n_pdf = len(tutte_deleghe)
-    tot_importo_pdf = sum(d.importo or 0 for d in tutte_deleghe)
+MOTORI_OCR = ('auto', 'tesserocr', 'pytesseract')
 
-    print("-" * 70)
-    if tabulato.totale:
-        print(f"{'TOTALE':<8} {tabulato.totale.n_deleghe:<8} "
-              f"{tabulato.totale.totale:>12,.2f} "
-              f"{tot_n_pdf:<8} {tot_importo_pdf:>12,.2f}")
+# Motore scelto per il processo (--motore-ocr); passato ai worker dall'initializer del pool
+_MOTORE_OCR_SCELTO = OCR_MOTORE
+_MOTORI_PER_THREAD: Dict[Tuple[int, int], MotoreOCR] = {}
+# Motori di thread terminati, pronti per il prossimo thread (vedi rilascia_risorse_thread)
+_MOTORI_LIBERI: List[MotoreOCR] = []
 
-    # Riepilogo
-    print("\n" + "=" * 70)
+
+def imposta_motore_ocr(nome: str) -> None:
+    """
+    Sceglie il backend OCR del processo: 'tesserocr', 'pytesseract' o
+    'auto' (tesserocr se installato, altrimenti pytesseract).
+    """
+    global _MOTORE_OCR_SCELTO, _VERSIONE_TESSERACT
+    if nome not in MOTORI_OCR:
+        raise ValueError(f"Motore OCR sconosciuto: {nome} (disponibili: {', '.join(MOTORI_OCR)})")
+    if nome != _MOTORE_OCR_SCELTO:
+        _MOTORE_OCR_SCELTO = nome
+        for motore in list(_MOTORI_PER_THREAD.values()) + _MOTORI_LIBERI:
+            motore.close()
+        _MOTORI_PER_THREAD.clear()
+        _MOTORI_LIBERI.clear()
+        _VERSIONE_TESSERACT = None
+
+
+def _crea_motore_ocr() -> MotoreOCR:
+    """Crea un motore del backend scelto (con 'auto', tesserocr se installato)."""
+    if _MOTORE_OCR_SCELTO == 'pytesseract':
+        return MotorePytesseract()
+    try:
+        return MotoreTesserocr()
+    except ImportError:
+        if _MOTORE_OCR_SCELTO == 'tesserocr':
+            raise RuntimeError("Il motore OCR tesserocr richiede tesserocr (pip install tesserocr)")
+        return MotorePytesseract()
+
+
+def motore_ocr() -> MotoreOCR:
+    """
+    Restituisce il motore OCR del processo (e thread) corrente.
+
+    Come la cache, un motore tesserocr non va condiviso tra thread: ogni
+    worker crea il proprio alla prima pagina e lo riusa per le successive.
+    Un thread nuovo riprende, se c'è, il motore lasciato da un thread
+    terminato, senza ricaricare il modello.
+    """
+    chiave = (os.getpid(), threading.get_ident())
+    motore = _MOTORI_PER_THREAD.get(chiave)
+    if motore is None:
+        try:
+            motore = _MOTORI_LIBERI.pop()
+        except IndexError:
+            motore = _crea_motore_ocr()
+        logger.debug(f"Motore OCR: {motore.nome}")
+        _MOTORI_PER_THREAD[chiave] = motore
+    return motore
+
+
+def rilascia_risorse_thread() -> None:
+    """
+    Libera le risorse del thread corrente prima che termini.
+
+    Le connessioni alla cache OCR e all'indice dei duplicati vengono
+    chiuse, il motore OCR passa al prossimo thread che ne chiede uno. In
+    un processo di lunga durata (vedi Riconciliatore) ogni lotto avvia
+    nuovi thread: così non restano connessioni aperte e il modello di
+    Tesseract non viene ricaricato.
+    """
+    thread = (os.getpid(), threading.get_ident())
+    motore = _MOTORI_PER_THREAD.pop(thread, None)
+    if motore is not None:
+        _MOTORI_LIBERI.append(motore)
+    for registro in (_CACHE_PER_PROCESSO, _INDICI_PER_PROCESSO):
+        for chiave in [k for k in registro if k[:2] == thread]:
+            registro.pop(chiave).close()
+
+
+_VERSIONE_TESSERACT: Optional[str] = None
+
+
+def versione_tesseract() -> str:
+    """
+    Restituisce (e memorizza) la versione di Tesseract del motore OCR.
+
+    La versione è normalizzata (es. '5.3.0'): a parità di Tesseract le
+    voci della cache valgono per entrambi i motori.
+    """
+    global _VERSIONE_TESSERACT
+    if _VERSIONE_TESSERACT is None:
+        try:
+            match = re.search(r'\d+\.\d+(?:\.\d+)?', motore_ocr().versione())
+            _VERSIONE_TESSERACT = match.group(0) if match else 'sconosciuta'
+        except Exception:
+            _VERSIONE_TESSERACT = 'sconosciuta'
+    return _VERSIONE_TESSERACT
+
+
+def calcola_hash_file(path: str) -> str:
+    """
+    Calcola lo SHA-256 del contenuto di un file leggendolo a blocchi.
+
+    Args:
+        path: Percorso del file
+
+    Returns:
+        Digest esadecimale
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for blocco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(blocco)
+    return h.hexdigest()
+
+
+class ManifestPDF:
+    """
+    Manifest dei PDF già elaborati per la riconciliazione incrementale.
+
+    Per ogni file registra dimensione, mtime, hash del contenuto e deleghe
+    estratte. Un file si considera invariato se dimensione e mtime
+    coincidono, oppure se cambia solo l'mtime ma l'hash è lo stesso (ad
+    esempio dopo una copia). Se cambiano i parametri di estrazione (DPI,
+    OCR adattivo, riquadri) il manifest viene azzerato.
+    """
+
+    VERSIONE = 2
+
+    def __init__(self, path: str, parametri: Dict[str, Any]):
+        self.path = path
+        self.parametri = parametri
+        self.file: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    dati = json.load(f)
+                if dati.get('versione') == self.VERSIONE and dati.get('parametri') == parametri:
+                    self.file = dati.get('file', {})
+                else:
+                    logger.info("Manifest con parametri diversi: rielaborazione completa")
+            except Exception as e:
+                logger.warning(f"Manifest illeggibile {path}, verrà ricreato: {e}")
+
+    @staticmethod
+    def _chiave(pdf_path: str) -> str:
+        return os.path.abspath(pdf_path)
+
+    def get(self, pdf_path: str) -> Optional[List[DelegaF24]]:
+        """
+        Restituisce le deleghe registrate se il file non è cambiato.
+
+        Args:
+            pdf_path: Percorso del PDF
+
+        Returns:
+            Deleghe già estratte o None se il file è nuovo o modificato
+        """
+        voce = self.file.get(self._chiave(pdf_path))
+        if voce is None:
+            return None
+
+        stat = os.stat(pdf_path)
+        if stat.st_size != voce['size']:
+            return None
+        if stat.st_mtime != voce['mtime']:
+            if calcola_hash_file(pdf_path) != voce['sha256']:
+                return None
+            voce['mtime'] = stat.st_mtime
+
+        return [DelegaF24(**d) for d in voce['deleghe']]
+
+    def sha256(self, pdf_path: str) -> Optional[str]:
+        """Hash del contenuto registrato per un file (None se assente dal manifest)."""
+        voce = self.file.get(self._chiave(pdf_path))
+        return voce['sha256'] if voce else None
+
+    def aggiorna(self, pdf_path: str, deleghe: List[DelegaF24]) -> None:
+        """Registra le deleghe estratte da un file."""
+        stat = os.stat(pdf_path)
+        self.file[self._chiave(pdf_path)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': calcola_hash_file(pdf_path),
+            'deleghe': [d.to_dict() for d in deleghe]
+        }
+
+    def rimuovi_assenti(self, pdf_paths: List[str]) -> int:
+        """
+        Elimina le voci dei file non più presenti nella cartella.
+
+        Returns:
+            Numero di voci eliminate
+        """
+        presenti = {self._chiave(p) for p in pdf_paths}
+        assenti = [k for k in self.file if k not in presenti]
+        for k in assenti:
+            del self.file[k]
+        return len(assenti)
+
+    def salva(self) -> None:
+        """Scrive il manifest in modo atomico (file temporaneo + rename)."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(
+                {'versione': self.VERSIONE, 'parametri': self.parametri, 'file': self.file},
+                f, ensure_ascii=False
+            )
+        os.replace(tmp_path, self.path)
+
+
+def valida_codice_fiscale(cf: str) -> bool:
+    """
+    Valida il formato di un codice fiscale italiano.
+
+    Args:
+        cf: Codice fiscale da validare
+
+    Returns:
+        True se il formato è valido, False altrimenti
+    """
+    if not cf or len(cf) != 16:
+        return False
+
+    # Pattern: 6 lettere + 2 numeri + 1 lettera + 2 numeri + 1 lettera + 3 numeri + 1 lettera
+    pattern = r'^[A-Z]{6}\d{2}[A-Z]\d{2}[A-Z]\d{3}[A-Z]$'
+    return bool(re.match(pattern, cf.upper()))
+
+
+def pulisci_codice_fiscale(cf: str) -> Optional[str]:
+    """
+    Pulisce un codice fiscale da errori OCR comuni.
+
+    Args:
+        cf: Codice fiscale grezzo
+
+    Returns:
+        Codice fiscale pulito o None se non valido
+    """
+    if not cf:
+        return None
+
+    # Rimuovi spazi e converti in maiuscolo
+    cf = cf.upper().strip().replace(' ', '')
+
+    # Correzioni comuni OCR
+    correzioni = {
+        'O': '0', 'I': '1', 'S': '5', 'Z': '2',
+        'B': '8', 'G': '6', 'Q': '0'
+    }
+
+    # Applica correzioni solo alle posizioni numeriche
+    cf_pulito = list(cf)
+    posizioni_numeriche = [6, 7, 9, 10, 12, 13, 14]
+
+    for pos in posizioni_numeriche:
+        if pos < len(cf_pulito) and cf_pulito[pos] in correzioni:
+            cf_pulito[pos] = correzioni[cf_pulito[pos]]
+
+    cf_result = ''.join(cf_pulito)
+
+    return cf_result if valida_codice_fiscale(cf_result) else None
+
+
+def parse_importo(importo_str: str) -> Optional[int]:
+    """
+    Parsa una stringa importo in centesimi interi.
+
+    Gli importi non passano mai da float: somme e confronti restano esatti
+    anche su migliaia di deleghe.
+
+    Args:
+        importo_str: Stringa contenente l'importo (es. "1.234,56")
+
+    Returns:
+        Importo in centesimi o None se non valido
+    """
+    try:
+        # Rimuovi punti come separatori delle migliaia; la virgola separa i decimali
+        intero, _, decimali = importo_str.replace('.', '').strip().partition(',')
+        if not (intero or decimali) or not (intero + decimali).isdigit():
+            raise ValueError("caratteri non numerici")
+        importo = int(intero or 0) * 100 + int(decimali[:2].ljust(2, '0'))
+        if decimali[2:3] >= '5':
+            importo += 1
+
+        # Validazione range ragionevole (config.py)
+        if IMPORTO_MIN_CENT <= importo <= IMPORTO_MAX_CENT:
+            return importo
+        else:
+            logger.debug(f"Importo fuori range: {formatta_importo(importo)}")
+            return None
+    except (ValueError, AttributeError) as e:
+        logger.debug(f"Errore parsing importo '{importo_str}': {e}")
+        return None
+
+
+def formatta_importo(cent: int) -> str:
+    """Importo in centesimi come stringa decimale esatta (es. 123456 -> "1234.56")."""
+    segno = '-' if cent < 0 else ''
+    euro, resto = divmod(abs(cent), 100)
+    return f"{segno}{euro}.{resto:02d}"
+
+
+# Righe del tabulato (una per riga del file)
+TABULATO_DATA_RE = re.compile(r'DATA:\s*(\d{2}\s+\d{2}\s+\d{4})')
+TABULATO_CAB_RE = re.compile(
+    r'^\s*(\d{5})\s+'  # CAB (5 cifre)
+    r'(\d+)\s+([\d.,]+)\s+'  # ministeriali: n.tot, saldo
+    r'(\d+)\s+([\d.,]+)\s+'  # corporate: n.tot, saldo
+    r'(\d+)\s+([\d.,]+)'     # cartacee: n.tot, saldo
+)
+TABULATO_TOT_RE = re.compile(r'TOT\.:\s+\d+\s+[\d.,]+\s+\d+\s+[\d.,]+\s+(\d+)\s+([\d.,]+)')
+TABULATO_DELEGA_RE = re.compile(TABULATO_DELEGA_PATTERN)
+
+
+def iter_tabulati_txt(filepath: str) -> Iterator[RisultatoTabulato]:
+    """
+    Legge il tabulato riga per riga e restituisce un RisultatoTabulato per
+    ogni sezione DATA.
+
+    Il file non viene mai caricato per intero: in memoria resta solo la
+    sezione corrente, quindi anche un export trimestrale di centinaia di
+    MB si elabora a memoria costante. Intestazioni DATA ripetute con la
+    stessa data (es. a ogni pagina della stampa) non aprono una nuova
+    sezione. Le righe che precedono il primo DATA finiscono in una sezione
+    con data "N/D". Le eventuali righe di dettaglio per delega
+    (TABULATO_DELEGA_PATTERN) vengono raccolte in RisultatoTabulato.righe.
+
+    Args:
+        filepath: Percorso del file tabulato
+
+    Yields:
+        RisultatoTabulato per ciascuna data, nell'ordine del file
+
+    Raises:
+        FileNotFoundError: Se il file non esiste
+        ValueError: Se il file non è leggibile
+    """
+    logger.info(f"Parsing tabulato: {filepath}")
+
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"File tabulato non trovato: {filepath}")
+
+    data_tabulato = "N/D"
+    risultati: Dict[str, DatiCAB] = {}
+    totale_generale: Optional[DatiCAB] = None
+    righe: List[RigaTabulato] = []
+
+    def chiudi_sezione() -> RisultatoTabulato:
+        logger.info(
+            f"Tabulato {data_tabulato}: estratti dati per {len(risultati)} CAB"
+            + (f", {len(righe)} righe di dettaglio" if righe else "")
+        )
+        return RisultatoTabulato(
+            data=data_tabulato, per_cab=risultati, totale=totale_generale, righe=righe
+        )
+
+    try:
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            for n_riga, line in enumerate(f, 1):
+                data_match = TABULATO_DATA_RE.search(line)
+                if data_match:
+                    nuova_data = data_match.group(1).replace(' ', '/')
+                    if nuova_data != data_tabulato:
+                        if risultati or totale_generale or righe:
+                            yield chiudi_sezione()
+                        data_tabulato = nuova_data
+                        risultati = {}
+                        totale_generale = None
+                        righe = []
+                    continue
+
+                match = TABULATO_CAB_RE.match(line)
+                if match:
+                    cab = match.group(1)
+                    n_cartacee = int(match.group(6))
+                    saldo_str = match.group(7)
+
+                    importo = parse_importo(saldo_str)
+                    if importo is None:
+                        logger.warning(f"Impossibile parsare importo per CAB {cab}: {saldo_str}")
+                        importo = 0
+
+                    risultati[cab] = DatiCAB(n_deleghe=n_cartacee, totale_cent=importo)
+                    logger.debug(f"CAB {cab}: {n_cartacee} deleghe, €{importo / 100:,.2f}")
+                    continue
+
+                delega_match = TABULATO_DELEGA_RE.match(line)
+                if delega_match:
+                    importo = parse_importo(delega_match.group('importo'))
+                    if importo is not None:
+                        righe.append(RigaTabulato(
+                            riga=n_riga,
+                            codice_fiscale=delega_match.group('cf'),
+                            importo_cent=importo,
+                            cab=delega_match.groupdict().get('cab')
+                        ))
+                    continue
+
+                # Totali generali (il primo della sezione)
+                tot_match = TABULATO_TOT_RE.search(line)
+                if tot_match and totale_generale is None:
+                    n_tot = int(tot_match.group(1))
+                    saldo_tot = parse_importo(tot_match.group(2))
+                    if saldo_tot:
+                        totale_generale = DatiCAB(n_deleghe=n_tot, totale_cent=saldo_tot)
+    except OSError as e:
+        raise ValueError(f"Errore lettura file: {e}")
+
+    if risultati or totale_generale or righe or data_tabulato != "N/D":
+        yield chiudi_sezione()
+
+
+def parse_tabulato_txt(filepath: str) -> RisultatoTabulato:
+    """
+    Parsa il file TXT del tabulato e restituisce i dati per CAB.
+
+    Per i tabulati con più date restituisce la prima sezione; per
+    elaborarle tutte usare iter_tabulati_txt (o --multi-giorno).
+
+    Args:
+        filepath: Percorso del file tabulato
+
+    Returns:
+        RisultatoTabulato con i dati estratti
+
+    Raises:
+        FileNotFoundError: Se il file non esiste
+        ValueError: Se il formato non è valido
+    """
+    sezioni = iter_tabulati_txt(filepath)
+    try:
+        tabulato = next(sezioni, None)
+        if tabulato is None:
+            return RisultatoTabulato(data="N/D", per_cab={}, totale=None)
+        if next(sezioni, None) is not None:
+            logger.warning(
+                f"Il tabulato contiene più date: uso solo {tabulato.data} "
+                f"(usa --multi-giorno per riconciliarle tutte)"
+            )
+        return tabulato
+    finally:
+        sezioni.close()
+
+
+def extract_from_native_pdf(
+    pdf_path: str,
+    pagine: Optional[List[int]] = None
+) -> Tuple[List[DelegaF24], List[int]]:
+    """
+    Estrae dati dalle pagine con testo nativo e individua quelle da OCR.
+
+    Il documento viene aperto una sola volta e classificato pagina per
+    pagina: le pagine con testo selezionabile sono estratte subito, le
+    altre (scansioni, anche dentro PDF misti) vengono restituite per
+    l'OCR. Se il PDF non si apre con pdfplumber tutte le pagine vanno
+    all'OCR.
+
+    Args:
+        pdf_path: Percorso del PDF
+        pagine: Pagine da elaborare (default: tutte)
+
+    Returns:
+        Tuple (deleghe dalle pagine native, numeri delle pagine senza testo)
+    """
+    import pdfplumber
+
+    deleghe = []
+    da_ocr = []
+
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            if pagine is None:
+                pagine = list(range(1, len(pdf.pages) + 1))
+            n_pagine = len(pagine)
+            METRICHE.conta_pagine(pdf_path, n_pagine)
+            for page_num in pagine:
+                page = pdf.pages[page_num - 1]
+                with METRICHE.fase('testo_nativo', file=pdf_path):
+                    text = page.extract_text() or ""
+                if len(text.strip()) <= SOGLIA_TESTO_NATIVO:
+                    da_ocr.append(page_num)
+                    continue
+                delega = extract_data_from_text(text, page_num, pdf_path)
+                if delega.codice_fiscale or delega.importo_cent:
+                    deleghe.append(delega)
+    except Exception as e:
+        logger.warning(f"Errore lettura testo PDF {pdf_path}, uso OCR: {e}")
+        if pagine is None:
+            pagine = list(range(1, conta_pagine_pdf(pdf_path) + 1))
+        METRICHE.conta_pagine(pdf_path, len(pagine))
+        return [], list(pagine)
+
+    logger.debug(f"{pdf_path}: {n_pagine - len(da_ocr)} pagine native, {len(da_ocr)} da OCR")
+    return deleghe, da_ocr
+
+
+def conta_pagine_pdf(pdf_path: str) -> int:
+    """
+    Restituisce il numero di pagine di un PDF (via pdfinfo, senza rasterizzare).
+
+    Args:
+        pdf_path: Percorso del PDF
+
+    Returns:
+        Numero di pagine
+    """
+    from pdf2image import pdfinfo_from_path
+
+    return int(pdfinfo_from_path(pdf_path)['Pages'])
+
+
+def rasterizza_pagine(
+    pdf_path: str,
+    dpi: int = 200,
+    finestra: int = 1,
+    pagine: Optional[List[int]] = None,
+    grigi: bool = False
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Rasterizza un PDF a finestre di poche pagine alla volta.
+
+    A differenza di convert_from_path sull'intero documento, in memoria
+    restano al massimo `finestra` immagini: il picco di memoria non dipende
+    dalla lunghezza del PDF.
+
+    Args:
+        pdf_path: Percorso del PDF
+        dpi: Risoluzione per la conversione (default: 200)
+        finestra: Numero di pagine rasterizzate per ogni chiamata a pdftoppm
+        pagine: Pagine da rasterizzare (default: tutte)
+        grigi: Rasterizza in scala di grigi invece che a colori
+
+    Yields:
+        Tuple (numero pagina 1-based, immagine PIL)
+    """
+    from pdf2image import convert_from_path
+
+    if pagine is None:
+        pagine = list(range(1, conta_pagine_pdf(pdf_path) + 1))
+    finestra = max(1, finestra)
+
+    i = 0
+    while i < len(pagine):
+        # Una finestra copre solo pagine consecutive
+        inizio = pagine[i]
+        j = i + 1
+        while j < len(pagine) and j - i < finestra and pagine[j] == pagine[j - 1] + 1:
+            j += 1
+        fine = pagine[j - 1]
+
+        logger.debug(f"Conversione pagine {inizio}-{fine}: {pdf_path}")
+        with METRICHE.fase('rasterizzazione', n=fine - inizio + 1, file=pdf_path):
+            images = convert_from_path(
+                pdf_path, dpi=dpi, first_page=inizio, last_page=fine, grayscale=grigi
+            )
+        for offset, img in enumerate(images):
+            yield inizio + offset, img
+        del images
+        i = j
+
+
+def stima_inclinazione(grigia: Any, max_gradi: float = PREELABORAZIONE_MAX_GRADI) -> float:
+    """
+    Stima la rotazione che raddrizza il testo di una pagina.
+
+    La pagina, ridotta e invertita (testo chiaro su fondo nero), viene
+    ruotata per ogni angolo candidato e ridotta a una colonna larga un
+    pixel, cioè al suo profilo di proiezione orizzontale: con il testo
+    dritto righe e interlinee si alternano nettamente e la varianza del
+    profilo è massima. Ogni prova è eseguita da Pillow in C (rotazione
+    nearest sull'immagine ridotta, ~3 ms); la ricerca procede a passi di
+    0,5° e poi di 0,1° attorno al migliore.
+
+    Args:
+        grigia: Immagine PIL in scala di grigi
+        max_gradi: Inclinazione massima cercata, in gradi
+
+    Returns:
+        Angolo in gradi da passare a Image.rotate (0 se la pagina è dritta)
+    """
+    from PIL import Image, ImageOps, ImageStat
+
+    scala = min(1.0, 1000 / max(grigia.size))
+    ridotta = ImageOps.invert(grigia.resize(
+        (max(1, round(grigia.width * scala)), max(1, round(grigia.height * scala))), Image.BOX
+    ))
+
+    def varianza_profilo(angolo: float) -> float:
+        ruotata = ridotta.rotate(angolo, resample=Image.NEAREST)
+        return ImageStat.Stat(ruotata.resize((1, ruotata.height), Image.BOX)).var[0]
+
+    # A parità di punteggio (es. pagina vuota) vince l'angolo più vicino a zero
+    n = int(max_gradi / 0.5)
+    migliore = max(sorted((i * 0.5 for i in range(-n, n + 1)), key=abs), key=varianza_profilo)
+    migliore = max(sorted((migliore + i * 0.1 for i in range(-4, 5)), key=abs), key=varianza_profilo)
+    return round(migliore, 1)
+
+
+def ritaglia_bande_scure(grigia: Any) -> Any:
+    """
+    Elimina le bande scure ai bordi della scansione (fuori dal foglio).
+
+    Dai profili medi di righe e colonne vengono scartate, da ciascun lato,
+    le righe e le colonne mediamente più scure che chiare.
+    """
+    from PIL import Image
+
+    def interno(profilo: bytes) -> Tuple[int, int]:
+        inizio, fine = 0, len(profilo)
+        while inizio < fine and profilo[inizio] < 128:
+            inizio += 1
+        while fine > inizio and profilo[fine - 1] < 128:
+            fine -= 1
+        return inizio, fine
+
+    top, bottom = interno(grigia.resize((1, grigia.height), Image.BOX).tobytes())
+    left, right = interno(grigia.resize((grigia.width, 1), Image.BOX).tobytes())
+    if right - left < grigia.width // 2 or bottom - top < grigia.height // 2:
+        # Pagina quasi tutta scura: meglio non ritagliare
+        return grigia
+    return grigia.crop((left, top, right, bottom))
+
+
+def ritaglia_margini(binaria: Any) -> Any:
+    """Ritaglia i margini vuoti attorno al testo, ignorando i puntini isolati."""
+    from PIL import Image, ImageOps
+
+    # Blocchi 8x8: è testo solo un blocco con almeno un quinto di pixel neri
+    ridotta = ImageOps.invert(binaria).resize(
+        (max(1, binaria.width // 8), max(1, binaria.height // 8)), Image.BOX
+    )
+    box = ridotta.point(lambda v: 255 if v >= 48 else 0).getbbox()
+    if box is None:
+        return binaria
+    margine = max(1, binaria.width // 100)
+    return binaria.crop((
+        max(0, box[0] * 8 - margine), max(0, box[1] * 8 - margine),
+        min(binaria.width, box[2] * 8 + margine), min(binaria.height, box[3] * 8 + margine)
+    ))
+
+
+def preelabora_immagine(img: Any, passi: Tuple[str, ...], dpi: int, ritaglio: bool = True) -> Any:
+    """
+    Prepara una pagina scansionata per Tesseract.
+
+    I passi (vedi PREELABORAZIONE_PASSI in config.py) sono applicati
+    sempre nello stesso ordine, indipendentemente da come sono elencati.
+    Ogni operazione lavora sull'intera immagine in C (filtri, LUT e
+    ricampionamenti di Pillow), senza cicli Python sui pixel.
+
+    Args:
+        img: Immagine PIL della pagina
+        passi: Passi da applicare
+        dpi: Risoluzione di rasterizzazione della pagina
+        ritaglio: False con l'OCR a riquadri, le cui coordinate sono
+            relative alla pagina intera
+
+    Returns:
+        Immagine in scala di grigi pronta per l'OCR
+    """
+    from PIL import Image, ImageChops, ImageFilter
+
+    out = img if img.mode == 'L' else img.convert('L')
+    angolo = stima_inclinazione(out) if 'raddrizza' in passi else 0
+
+    if 'bordi' in passi and ritaglio:
+        out = ritaglia_bande_scure(out)
+
+    if 'binarizza' in passi:
+        raggio = max(1, round(out.width * PREELABORAZIONE_FINESTRA / 2))
+        media = out.filter(ImageFilter.BoxBlur(raggio))
+        # Testo = pixel più scuri della media dei vicini di almeno PREELABORAZIONE_SCARTO
+        out = ImageChops.subtract(media, out).point(
+            lambda v: 0 if v > PREELABORAZIONE_SCARTO else 255
+        )
+        # Sull'immagine binaria basta la rotazione nearest, 5 volte più veloce
+        if angolo:
+            out = out.rotate(angolo, resample=Image.NEAREST, fillcolor=255)
+        if 'bordi' in passi and ritaglio:
+            out = ritaglia_margini(out)
+    elif angolo:
+        out = out.rotate(angolo, resample=Image.BILINEAR, fillcolor=255)
+
+    if 'riduci' in passi and dpi > PREELABORAZIONE_DPI_MAX:
+        scala = PREELABORAZIONE_DPI_MAX / dpi
+        out = out.resize((round(out.width * scala), round(out.height * scala)), Image.LANCZOS)
+
+    return out
+
+
+def classifica_pagina(img: Any, dpi: int) -> Optional[str]:
+    """
+    Riconosce le pagine scansionate che non possono contenere una delega.
+
+    Sulla pagina ridotta a PREFILTRO_DPI, senza la cornice esterna, conta
+    i pixel d'inchiostro (più scuri della carta di PREFILTRO_CONTRASTO
+    livelli). Una pagina quasi senza inchiostro è bianca; un foglio
+    scuro, o una pagina senza inchiostro nel terzo superiore (codice
+    fiscale) o in quello inferiore (saldo, ABI/CAB), è un separatore o
+    una copertina. Nel dubbio la pagina passa all'OCR.
+
+    Args:
+        img: Immagine PIL della pagina
+        dpi: Risoluzione di rasterizzazione
+
+    Returns:
+        'bianca', 'separatore' o None se la pagina va riconosciuta
+    """
+    fattore = max(1, dpi // PREFILTRO_DPI)
+    ridotta = img.reduce(fattore) if fattore > 1 else img
+    grigia = ridotta if ridotta.mode == 'L' else ridotta.convert('L')
+    mx, my = grigia.width // 20, grigia.height // 20
+    grigia = grigia.crop((mx, my, grigia.width - mx, grigia.height - my))
+
+    istogramma = grigia.histogram()
+    totale = sum(istogramma)
+    cumulata = 0
+    for carta, n in enumerate(istogramma):
+        cumulata += n
+        if cumulata * 2 >= totale:
+            break
+    if carta < PREFILTRO_CARTA_MIN:
+        return 'separatore'
+
+    soglia = max(carta - PREFILTRO_CONTRASTO, 0)
+    if sum(istogramma[:soglia]) < PREFILTRO_INCHIOSTRO_MIN * totale:
+        return 'bianca'
+
+    terzo = grigia.height // 3
+    for y0 in (0, grigia.height - terzo):
+        fascia = grigia.crop((0, y0, grigia.width, y0 + terzo)).histogram()
+        if sum(fascia[:soglia]) < PREFILTRO_INCHIOSTRO_MIN * sum(fascia):
+            return 'separatore'
+    return None
+
+
+def ocr_roi_immagine(img: Any, layout: str) -> Dict[str, str]:
+    """
+    Esegue l'OCR dei soli riquadri di interesse di una pagina F24.
+
+    Ogni campo del layout viene ritagliato (coordinate relative alla
+    pagina) e riconosciuto con la configurazione Tesseract specifica del
+    campo, ad esempio whitelist di sole cifre per importo e CAB.
+
+    Args:
+        img: Immagine PIL della pagina
+        layout: Nome del layout in F24_ROI_LAYOUT (es. 'ordinario')
+
+    Returns:
+        Dizionario campo -> testo OCR del riquadro
+    """
+    larghezza, altezza = img.size
+    campi = {}
+
+    for campo, (x0, y0, x1, y1) in F24_ROI_LAYOUT[layout].items():
+        box = (int(x0 * larghezza), int(y0 * altezza), int(x1 * larghezza), int(y1 * altezza))
+        ritaglio = img.crop(box)
+        try:
+            campi[campo] = motore_ocr().riconosci(ritaglio, F24_ROI_TESSERACT_CONFIG.get(campo, ''))
+        finally:
+            ritaglio.close()
+
+    return campi
+
+
+def estrai_dati_da_roi(campi: Dict[str, str], page_num: int, pdf_path: str) -> DelegaF24:
+    """
+    Estrae i dati F24 dai testi OCR dei singoli riquadri.
+
+    Ogni riquadro contiene un solo campo, quindi non servono i pattern con
+    etichetta usati sul testo a pagina intera.
+
+    Args:
+        campi: Dizionario campo -> testo OCR (da ocr_roi_immagine)
+        page_num: Numero pagina
+        pdf_path: Percorso del PDF
+
+    Returns:
+        DelegaF24 con i dati estratti
+    """
+    cf = None
+    testo_cf = re.sub(r'[^A-Z0-9]', '', campi.get('codice_fiscale', '').upper())
+    for i in range(len(testo_cf) - 15):
+        cf = pulisci_codice_fiscale(testo_cf[i:i + 16])
+        if cf:
+            break
+
+    importo = None
+    for m in reversed(re.findall(r'\d[\d.,]*[.,]\d{2}', campi.get('importo', ''))):
+        importo = parse_importo(m)
+        if importo:
+            break
+
+    cab = None
+    testo_cab = re.sub(r'\s', '', campi.get('abi_cab', ''))
+    candidati = re.findall(r'08749(\d{5})', testo_cab) or re.findall(r'\d{5}', testo_cab)
+    for potential_cab in candidati:
+        if potential_cab[:2] in CAB_VALID_PREFIXES and potential_cab != '08749':
+            cab = potential_cab
+            break
+
+    data_pag = None
+    match = re.search(
+        r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})|(\d{1,2})\s*(GEN|FEB|MAR|APR|MAG|GIU|LUG|AGO|SET|OTT|NOV|DIC)[A-Z]*\.?\s*(\d{4})',
+        campi.get('data', ''),
+        re.IGNORECASE
+    )
+    if match:
+        data_pag = match.group(0)
+
+    return DelegaF24(
+        file=os.path.basename(pdf_path),
+        pagina=page_num,
+        codice_fiscale=cf,
+        importo_cent=importo,
+        cab=cab,
+        data_pagamento=data_pag
+    )
+
+
+def variante_ocr(roi: Optional[str] = None, preelabora: Optional[Tuple[str, ...]] = None) -> str:
+    """
+    Restituisce la variante OCR usata nelle chiavi di cache e nell'indice dei duplicati.
+
+    Il testo OCR dipende da layout e preelaborazione: varianti distinte in cache.
+
+    Args:
+        roi: Layout F24 per l'OCR a riquadri (opzionale)
+        preelabora: Passi di preelaborazione delle immagini (opzionale)
+
+    Returns:
+        Variante (stringa vuota per l'OCR a pagina intera senza preelaborazione)
+    """
+    varianti = []
+    if roi:
+        varianti.append(f"roi-{roi}")
+    if preelabora:
+        varianti.append("pre-" + '+'.join(p for p in PREELABORAZIONE_PASSI if p in preelabora))
+    return ','.join(varianti)
+
+
+def testo_in_cache(
+    pdf_path: str,
+    page_num: int,
+    dpi: int,
+    variante: str,
+    cache: CacheOCR,
+    file_hash: str,
+    indice: Optional[IndiceDuplicati] = None
+) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Cerca in cache il testo OCR di una pagina.
+
+    Con `indice` la pagina trovata viene registrata tra quelle già viste,
+    usando la firma salvata in cache se presente.
+
+    Args:
+        pdf_path: Percorso del PDF
+        page_num: Numero pagina (1-based)
+        dpi: Risoluzione dell'OCR
+        variante: Variante OCR (vedi variante_ocr)
+        cache: Cache OCR
+        file_hash: Hash del contenuto del PDF
+        indice: Indice dei duplicati della riconciliazione (opzionale)
+
+    Returns:
+        Tuple (testo OCR, pagina originale se duplicato altrimenti None),
+        None se la pagina non è in cache
+    """
+    testo = cache.get(CacheOCR.chiave(file_hash, page_num, dpi, variante=variante))
+    if testo is None:
+        return None
+    duplicato_di = None
+    if indice is not None:
+        firma = cache.get_firma(CacheOCR.chiave_firma(file_hash, page_num, dpi))
+        if firma is not None:
+            duplicato_di, _ = indice.registra(
+                f"{dpi}:{variante}", firma, f"{os.path.basename(pdf_path)} pag. {page_num}", testo
+            )
+    return testo, duplicato_di
+
+
+def ocr_immagine_pagina(
+    img: Any,
+    pdf_path: str,
+    page_num: int,
+    dpi: int,
+    variante: str = '',
+    cache: Optional[CacheOCR] = None,
+    file_hash: Optional[str] = None,
+    roi: Optional[str] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    indice: Optional[IndiceDuplicati] = None,
+    prefiltro: bool = True
+) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Riconosce una pagina già rasterizzata e ne salva il testo in cache.
+
+    Passi nell'ordine: prefiltro (pagine bianche e separatori), controllo
+    dei duplicati, preelaborazione, OCR. L'immagine non viene chiusa e un
+    errore OCR si propaga al chiamante.
+
+    Args:
+        img: Immagine PIL della pagina
+        pdf_path: Percorso del PDF
+        page_num: Numero pagina (1-based)
+        dpi: Risoluzione di rasterizzazione
+        variante: Variante OCR (vedi variante_ocr)
+        cache: Cache OCR (opzionale)
+        file_hash: Hash del contenuto del PDF, richiesto con cache
+        roi: Layout F24 per l'OCR a riquadri (opzionale)
+        preelabora: Passi di preelaborazione delle immagini (opzionale)
+        indice: Indice dei duplicati della riconciliazione (opzionale)
+        prefiltro: Scarta la pagina prima dell'OCR se bianca o separatore
+
+    Returns:
+        Tuple (testo OCR, pagina originale se duplicato altrimenti None),
+        None se la pagina è stata scartata dal prefiltro
+    """
+    nome = os.path.basename(pdf_path)
+    origine = f"{nome} pag. {page_num}"
+    variante_indice = f"{dpi}:{variante}"
+
+    if prefiltro:
+        inizio = time.perf_counter()
+        with METRICHE.fase('prefiltro', file=pdf_path):
+            tipo = classifica_pagina(img, dpi)
+        METRICHE.conta('secondi_prefiltro', time.perf_counter() - inizio)
+        if tipo is not None:
+            METRICHE.conta(f'scartate_{tipo}')
+            logger.debug(f"Pagina {page_num} di {nome} {tipo}: OCR saltato")
+            return None
+
+    duplicato_di = testo = None
+    if indice is not None:
+        with METRICHE.fase('firma_pagina', file=pdf_path):
+            firma = firma_pagina(img)
+            if cache is not None:
+                cache.put_firma(CacheOCR.chiave_firma(file_hash, page_num, dpi), firma)
+            duplicato_di, testo = indice.registra(variante_indice, firma, origine)
+
+    if testo is not None:
+        logger.debug(f"Pagina {page_num} di {nome} duplicata di {duplicato_di}: OCR saltato")
+    else:
+        try:
+            if preelabora:
+                with METRICHE.fase('preelaborazione', file=pdf_path):
+                    pronta = preelabora_immagine(img, preelabora, dpi, ritaglio=not roi)
+            else:
+                pronta = img
+            logger.debug(f"OCR pagina {page_num} @ {dpi} DPI")
+            inizio = time.perf_counter()
+            with METRICHE.fase('ocr', file=pdf_path):
+                if roi:
+                    testo = json.dumps(ocr_roi_immagine(pronta, roi), ensure_ascii=False)
+                else:
+                    testo = motore_ocr().riconosci(pronta)
+        except BaseException:
+            # Un originale senza testo non resta nell'indice: le copie non vengono scartate
+            if indice is not None:
+                indice.annulla(variante_indice, origine)
+            raise
+        # Tempo medio di OCR per pagina: stima del tempo risparmiato dal prefiltro
+        METRICHE.conta('pagine_ocr')
+        METRICHE.conta('secondi_ocr', time.perf_counter() - inizio)
+        if indice is not None and duplicato_di is None:
+            indice.completa(variante_indice, origine, testo)
+
+    if cache is not None:
+        cache.put(CacheOCR.chiave(file_hash, page_num, dpi, variante=variante), testo)
+    return testo, duplicato_di
+
+
+def estrai_delega_ocr(
+    testo: str,
+    page_num: int,
+    pdf_path: str,
+    roi: Optional[str] = None,
+    duplicato_di: Optional[str] = None
+) -> DelegaF24:
+    """
+    Estrae la delega dal risultato OCR di una pagina.
+
+    Args:
+        testo: Testo OCR, o JSON campo -> testo con l'OCR a riquadri
+        page_num: Numero pagina (1-based)
+        pdf_path: Percorso del PDF
+        roi: Layout F24 se il testo viene dall'OCR a riquadri (opzionale)
+        duplicato_di: Pagina originale se la pagina è un duplicato
+
+    Returns:
+        DelegaF24 estratta
+    """
+    if roi:
+        with METRICHE.fase('estrazione_campi', file=pdf_path):
+            delega = estrai_dati_da_roi(json.loads(testo), page_num, pdf_path)
+    else:
+        delega = extract_data_from_text(testo, page_num, pdf_path)
+    delega.duplicato_di = duplicato_di
+    return delega
+
+
+def ocr_pagine_pdf(
+    pdf_path: str,
+    dpi: int = 200,
+    cache: Optional[CacheOCR] = None,
+    file_hash: Optional[str] = None,
+    pagine: Optional[List[int]] = None,
+    roi: Optional[str] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    indice: Optional[IndiceDuplicati] = None,
+    prefiltro: bool = True
+) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """
+    Restituisce il testo OCR delle pagine di un PDF scansionato.
+
+    Le pagine presenti in cache vengono restituite senza rasterizzarle; le
+    altre passano dal rasterizzatore a finestre e il testo viene salvato in
+    cache. Un errore OCR su una pagina viene registrato e la pagina saltata,
+    mentre un errore di conversione si propaga al chiamante.
+
+    Con `roi` impostato viene eseguito l'OCR dei soli riquadri del layout
+    e il "testo" restituito è il JSON campo -> testo (vedi ocr_roi_immagine).
+    Con `preelabora` ogni pagina passa da preelabora_immagine prima dell'OCR.
+
+    Con `indice` ogni pagina rasterizzata viene cercata tra quelle già
+    viste nella riconciliazione: se è una copia di una pagina già
+    riconosciuta l'OCR viene saltato e si riusa il testo dell'originale.
+    Le pagine lette dalla cache vengono registrate con la firma salvata
+    in cache, se presente.
+
+    Con `prefiltro` le pagine rasterizzate bianche o senza delega
+    (copertine, separatori, vedi classifica_pagina) vengono scartate prima
+    dell'OCR e conteggiate nei contatori di METRICHE; non vanno in cache,
+    così disattivare il prefiltro le fa riconoscere di nuovo.
+
+    Args:
+        pdf_path: Percorso del PDF
+        dpi: Risoluzione per la conversione (default: 200)
+        cache: Cache OCR (opzionale)
+        file_hash: Hash del contenuto del PDF (calcolato se assente e cache attiva)
+        pagine: Pagine da elaborare (default: tutte)
+        roi: Layout F24 per l'OCR a riquadri (opzionale)
+        preelabora: Passi di preelaborazione delle immagini (opzionale)
+        indice: Indice dei duplicati della riconciliazione (opzionale)
+        prefiltro: Scarta le pagine bianche e i separatori prima dell'OCR
+
+    Yields:
+        Tuple (numero pagina 1-based, testo OCR, pagina originale se la
+        pagina è un duplicato altrimenti None)
+    """
+    variante = variante_ocr(roi, preelabora)
+
+    if pagine is None:
+        pagine = list(range(1, conta_pagine_pdf(pdf_path) + 1))
+
+    da_rasterizzare = pagine
+    if cache is not None:
+        file_hash = file_hash or calcola_hash_file(pdf_path)
+        da_rasterizzare = []
+        for page_num in pagine:
+            dalla_cache = testo_in_cache(pdf_path, page_num, dpi, variante, cache, file_hash, indice)
+            if dalla_cache is None:
+                da_rasterizzare.append(page_num)
+                continue
+            yield (page_num, *dalla_cache)
+        logger.debug(
+            f"Cache OCR {os.path.basename(pdf_path)} @ {dpi} DPI: "
+            f"{len(pagine) - len(da_rasterizzare)}/{len(pagine)} pagine"
+        )
+
+    if not da_rasterizzare:
+        return
+
+    grigi = bool(preelabora) and 'grigi' in preelabora
+    for page_num, img in rasterizza_pagine(pdf_path, dpi=dpi, pagine=da_rasterizzare, grigi=grigi):
+        try:
+            risultato = ocr_immagine_pagina(
+                img, pdf_path, page_num, dpi, variante, cache, file_hash, roi, preelabora, indice, prefiltro
+            )
+        except Exception as e:
+            logger.error(f"Errore OCR pagina {page_num} di {pdf_path}: {e}")
+            continue
+        finally:
+            img.close()
+
+        if risultato is not None:
+            yield (page_num, *risultato)
+
+
+def extract_from_scanned_pdf(
+    pdf_path: str,
+    dpi: int = 200,
+    cache: Optional[CacheOCR] = None,
+    dpi_rapido: Optional[int] = None,
+    pagine: Optional[List[int]] = None,
+    file_hash: Optional[str] = None,
+    roi: Optional[str] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    indice: Optional[IndiceDuplicati] = None,
+    prefiltro: bool = True
+) -> List[DelegaF24]:
+    """
+    Estrae dati da PDF scansionato usando OCR.
+
+    Le pagine vengono rasterizzate e riconosciute una alla volta e ogni
+    immagine è rilasciata subito dopo l'OCR. Con la cache attiva le pagine
+    già riconosciute non vengono nemmeno rasterizzate.
+
+    In modalità adattiva (dpi_rapido impostato) il primo passaggio avviene
+    a bassa risoluzione; solo le pagine in cui mancano codice fiscale o
+    importo vengono rasterizzate di nuovo a `dpi` e i campi mancanti
+    integrati con il secondo risultato. Con `roi` il primo passaggio legge
+    solo i riquadri del layout F24 e il secondo, sulle pagine incomplete,
+    è un OCR a pagina intera.
+
+    Con `indice` le pagine che sono copie di pagine già viste nella
+    riconciliazione non passano dall'OCR e le deleghe estratte hanno
+    duplicato_di impostato.
+
+    Args:
+        pdf_path: Percorso del PDF
+        dpi: Risoluzione per la conversione (default: 200)
+        cache: Cache OCR (opzionale)
+        dpi_rapido: Risoluzione del primo passaggio adattivo (opzionale)
+        pagine: Pagine da elaborare (default: tutte)
+        file_hash: Hash del contenuto del PDF, se già calcolato
+        roi: Layout F24 per l'OCR a riquadri (opzionale)
+        preelabora: Passi di preelaborazione delle immagini (opzionale)
+        indice: Indice dei duplicati della riconciliazione (opzionale)
+        prefiltro: Scarta le pagine bianche e i separatori prima dell'OCR
+
+    Returns:
+        Lista di deleghe estratte
+    """
+    per_pagina: Dict[int, DelegaF24] = {}
+
+    try:
+        if cache is not None and file_hash is None:
+            file_hash = calcola_hash_file(pdf_path)
+
+        for page_num, text, duplicato_di in ocr_pagine_pdf(
+            pdf_path, dpi_rapido or dpi, cache, file_hash, pagine, roi, preelabora, indice, prefiltro
+        ):
+            per_pagina[page_num] = estrai_delega_ocr(text, page_num, pdf_path, roi, duplicato_di)
+
+        if dpi_rapido or roi:
+            incomplete = sorted(p for p, d in per_pagina.items() if not d.is_completa())
+            if incomplete:
+                logger.debug(
+                    f"OCR adattivo: {len(incomplete)}/{len(per_pagina)} pagine "
+                    f"rielaborate a pagina intera, {dpi} DPI"
+                )
+                for page_num, text, duplicato_di in ocr_pagine_pdf(
+                    pdf_path, dpi, cache, file_hash, incomplete, preelabora=preelabora, indice=indice,
+                    prefiltro=prefiltro
+                ):
+                    delega = estrai_delega_ocr(text, page_num, pdf_path, duplicato_di=duplicato_di)
+                    per_pagina[page_num] = delega.integra(per_pagina[page_num])
+    except Exception as e:
+        logger.error(f"Errore conversione PDF {pdf_path}: {e}")
+
+    return [
+        d for _, d in sorted(per_pagina.items())
+        if d.codice_fiscale or d.importo_cent
+    ]
+
+
+def ocr_pagina_pdf(
+    pdf_path: str,
+    page_num: int,
+    dpi: int = 200,
+    cache_dir: Optional[str] = None,
+    file_hash: Optional[str] = None,
+    dpi_rapido: Optional[int] = None,
+    roi: Optional[str] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    indice_path: Optional[str] = None,
+    prefiltro: bool = True
+) -> Optional[DelegaF24]:
+    """
+    Esegue l'OCR di una singola pagina di un PDF scansionato.
+
+    Usata come unità di lavoro del pool di processi: ogni job converte solo
+    la propria pagina, quindi le pagine di uno stesso file vengono
+    elaborate in parallelo. Ogni worker apre la propria connessione alla
+    cache OCR e all'indice dei duplicati.
+
+    Args:
+        pdf_path: Percorso del PDF
+        page_num: Numero pagina (1-based)
+        dpi: Risoluzione per la conversione (default: 200)
+        cache_dir: Cartella della cache OCR (opzionale)
+        file_hash: Hash del contenuto del PDF, richiesto con cache_dir
+        dpi_rapido: Risoluzione del primo passaggio adattivo (opzionale)
+        roi: Layout F24 per l'OCR a riquadri (opzionale)
+        preelabora: Passi di preelaborazione delle immagini (opzionale)
+        indice_path: Database dell'indice dei duplicati (opzionale)
+        prefiltro: Scarta la pagina prima dell'OCR se bianca o separatore
+
+    Returns:
+        DelegaF24 estratta o None se la pagina non contiene dati utili
+    """
+    cache = apri_cache_ocr(cache_dir) if cache_dir else None
+    indice = apri_indice_duplicati(indice_path) if indice_path else None
+    deleghe = extract_from_scanned_pdf(
+        pdf_path, dpi, cache, dpi_rapido, pagine=[page_num], file_hash=file_hash, roi=roi,
+        preelabora=preelabora, indice=indice, prefiltro=prefiltro
+    )
+    return deleghe[0] if deleghe else None
+
+
+def crea_pool_ocr(workers: int) -> ProcessPoolExecutor:
+    """
+    Avvia il pool di processi per l'OCR parallelo.
+
+    I worker ereditano il motore OCR scelto anche quando il pool non usa fork.
+
+    Args:
+        workers: Numero di processi
+
+    Returns:
+        Pool da passare a iter_deleghe_parallelo (e da chiudere con shutdown)
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=imposta_motore_ocr, initargs=(_MOTORE_OCR_SCELTO,)
+    )
+
+
+def iter_deleghe_parallelo(
+    pdf_paths: List[str],
+    workers: int,
+    dpi: int = 200,
+    cache_dir: Optional[str] = None,
+    dpi_rapido: Optional[int] = None,
+    roi: Optional[str] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    indice_path: Optional[str] = None,
+    prefiltro: bool = True,
+    pool: Optional[ProcessPoolExecutor] = None
+) -> Iterator[Tuple[int, List[DelegaF24]]]:
+    """
+    Estrae le deleghe da più PDF distribuendo il lavoro su un pool di processi.
+
+    Ogni file parte con un job che legge il testo nativo (un'unica apertura
+    del PDF); le pagine senza testo generano poi un job OCR ciascuna. Le
+    deleghe di un file sono ordinate per pagina, così l'output non dipende
+    dall'ordine di completamento dei job. Un errore su una pagina o su un
+    file non interrompe l'elaborazione degli altri, ma il file in errore
+    non viene restituito: così non entra nel manifest e viene ritentato.
+
+    Args:
+        pdf_paths: Percorsi dei PDF
+        workers: Numero di processi del pool (se pool non è indicato)
+        dpi: Risoluzione per la conversione (default: 200)
+        cache_dir: Cartella della cache OCR (None = cache disattivata)
+        dpi_rapido: Risoluzione del primo passaggio adattivo (opzionale)
+        roi: Layout F24 per l'OCR a riquadri (opzionale)
+        preelabora: Passi di preelaborazione delle immagini (opzionale)
+        indice_path: Database dell'indice dei duplicati (None = nessun controllo)
+        prefiltro: Scarta le pagine bianche e i separatori prima dell'OCR
+        pool: Pool già avviato da riusare (crea_pool_ocr); se assente ne
+            viene avviato uno per la chiamata
+
+    Yields:
+        Tuple (indice del file in pdf_paths, deleghe del file), appena
+        tutti i job del file sono terminati senza errori
+    """
+    if pool is None:
+        with crea_pool_ocr(workers) as pool:
+            yield from iter_deleghe_parallelo(
+                pdf_paths, workers, dpi, cache_dir, dpi_rapido, roi, preelabora, indice_path,
+                prefiltro, pool
+            )
+        return
+
+    risultati: List[List[DelegaF24]] = [[] for _ in pdf_paths]
+    # Job ancora in corso per file: il job del testo nativo più le pagine OCR
+    pendenti = [1] * len(pdf_paths)
+    falliti = set()
+    profilo = METRICHE.attive
+
+    futures = {
+        pool.submit(esegui_job, profilo, extract_from_native_pdf, pdf_path): (idx, None)
+        for idx, pdf_path in enumerate(pdf_paths)
+    }
+
+    try:
+        while futures:
+            completati, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in completati:
+                idx, page_num = futures.pop(future)
+                pdf_path = pdf_paths[idx]
+                pendenti[idx] -= 1
+                try:
+                    res, metriche = future.result()
+                    METRICHE.unisci(metriche)
+                except Exception as e:
+                    if page_num is None:
+                        logger.error(f"Errore elaborazione {pdf_path}: {e}")
+                    else:
+                        logger.error(f"Errore OCR pagina {page_num} di {pdf_path}: {e}")
+                    falliti.add(idx)
+                    res = None
+
+                if page_num is not None:
+                    if res is not None:
+                        risultati[idx].append(res)
+                elif res is not None:
+                    deleghe_native, da_ocr = res
+                    risultati[idx].extend(deleghe_native)
+                    try:
+                        # L'hash si calcola una sola volta qui, non in ogni job di pagina
+                        file_hash = calcola_hash_file(pdf_path) if cache_dir and da_ocr else None
+                    except Exception as e:
+                        logger.error(f"Errore preparazione {os.path.basename(pdf_path)}: {e}")
+                        falliti.add(idx)
+                        da_ocr = []
+                    if da_ocr:
+                        logger.debug(f"{pdf_path}: {len(da_ocr)} pagine in coda per OCR")
+                    pendenti[idx] += len(da_ocr)
+                    for p in da_ocr:
+                        future = pool.submit(
+                            esegui_job, profilo, ocr_pagina_pdf, pdf_path, p, dpi,
+                            cache_dir, file_hash, dpi_rapido, roi, preelabora, indice_path, prefiltro
+                        )
+                        futures[future] = (idx, p)
+
+                if pendenti[idx] == 0:
+                    if idx in falliti:
+                        logger.error(f"   {os.path.basename(pdf_path)}: pagine non elaborate, file escluso")
+                        risultati[idx] = []
+                        continue
+                    risultati[idx].sort(key=lambda d: d.pagina)
+                    yield idx, risultati[idx]
+    finally:
+        # Se il chiamante smette di iterare i job non ancora avviati vengono annullati
+        for future in futures:
+            future.cancel()
+
+
+def estrai_deleghe_parallelo(
+    pdf_paths: List[str],
+    workers: int,
+    dpi: int = 200,
+    cache_dir: Optional[str] = None,
+    dpi_rapido: Optional[int] = None,
+    roi: Optional[str] = None,
+    al_completamento: Optional[Callable[[int, List[DelegaF24]], None]] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    indice_path: Optional[str] = None,
+    prefiltro: bool = True,
+    pool: Optional[ProcessPoolExecutor] = None
+) -> List[List[DelegaF24]]:
+    """
+    Estrae le deleghe da più PDF su un pool di processi (vedi iter_deleghe_parallelo).
+
+    Args:
+        pdf_paths: Percorsi dei PDF
+        workers: Numero di processi del pool
+        dpi: Risoluzione per la conversione (default: 200)
+        cache_dir: Cartella della cache OCR (None = cache disattivata)
+        dpi_rapido: Risoluzione del primo passaggio adattivo (opzionale)
+        roi: Layout F24 per l'OCR a riquadri (opzionale)
+        al_completamento: Chiamata con (indice del file, deleghe) appena
+            tutti i job di un file sono terminati (es. export in streaming),
+            non per i file in errore
+        preelabora: Passi di preelaborazione delle immagini (opzionale)
+        indice_path: Database dell'indice dei duplicati (None = nessun controllo)
+        prefiltro: Scarta le pagine bianche e i separatori prima dell'OCR
+        pool: Pool già avviato da riusare (opzionale)
+
+    Returns:
+        Lista, nello stesso ordine di pdf_paths, delle deleghe di ciascun file
+    """
+    risultati: List[List[DelegaF24]] = [[] for _ in pdf_paths]
+    for idx, deleghe in iter_deleghe_parallelo(
+        pdf_paths, workers, dpi, cache_dir, dpi_rapido, roi, preelabora, indice_path, prefiltro, pool
+    ):
+        risultati[idx] = deleghe
+        if al_completamento is not None:
+            al_completamento(idx, deleghe)
+    return risultati
+
+
+class CodaMisurata(queue.Queue):
+    """
+    Coda limitata tra due stadi della pipeline, con le misure per --profile.
+
+    Oltre alla profondità (massima e media, rilevata a ogni prelievo)
+    registra quanto hanno atteso i produttori con la coda piena e i
+    consumatori con la coda vuota: produttori che attendono a lungo
+    indicano che il collo di bottiglia è lo stadio a valle, consumatori
+    che attendono a lungo che è quello a monte.
+    """
+
+    def __init__(self, nome: str, maxsize: int):
+        super().__init__(maxsize=maxsize)
+        self.nome = nome
+        self.attesa_produttori = 0.0
+        self.attesa_consumatori = 0.0
+        self.profondita_max = 0
+        self._somma_profondita = 0
+        self._prelievi = 0
+
+    def put(self, item: Any, block: bool = True, timeout: Optional[float] = None) -> None:
+        inizio = time.perf_counter()
+        try:
+            super().put(item, block, timeout)
+        finally:
+            with self.mutex:
+                self.attesa_produttori += time.perf_counter() - inizio
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        inizio = time.perf_counter()
+        try:
+            item = super().get(block, timeout)
+        finally:
+            with self.mutex:
+                self.attesa_consumatori += time.perf_counter() - inizio
+        if item is None:
+            # Segnale di fine dello stadio a monte, non un elemento
+            return item
+        with self.mutex:
+            # Profondità prima del prelievo
+            profondita = self._qsize() + 1
+            self.profondita_max = max(self.profondita_max, profondita)
+            self._somma_profondita += profondita
+            self._prelievi += 1
+        return item
+
+    def esporta(self) -> Dict[str, float]:
+        """Misure della coda in forma serializzabile."""
+        with self.mutex:
+            return {
+                'capacita': self.maxsize,
+                'elementi': self._prelievi,
+                'profondita_max': self.profondita_max,
+                'profondita_media': self._somma_profondita / self._prelievi if self._prelievi else 0.0,
+                'attesa_produttori_s': self.attesa_produttori,
+                'attesa_consumatori_s': self.attesa_consumatori
+            }
+
+
+class PipelineEstrazione:
+    """
+    Estrazione delle deleghe a stadi sovrapposti (elaborazione sequenziale).
+
+    Tre stadi collegati da code limitate:
+
+        lettura     testo nativo, cache OCR e rasterizzazione delle pagine
+                    scansionate (thread 'lettura')
+        ocr         prefiltro, duplicati, preelaborazione e OCR (thread 'ocr')
+        estrazione  campi delle deleghe e chiusura dei file (thread chiamante)
+
+    pdftoppm e tesseract girano in processi esterni, quindi mentre una
+    pagina è in OCR la successiva viene già rasterizzata e la precedente
+    estratta. Se una coda è piena lo stadio a monte attende (backpressure):
+    in memoria restano al massimo `coda_pagine` pagine rasterizzate, per
+    quanto lungo sia il lotto. Nella modalità adattiva e a riquadri le
+    pagine incomplete tornano allo stadio di lettura per il secondo
+    passaggio, con precedenza sui file non ancora iniziati.
+
+    I risultati sono gli stessi di estrai_deleghe_da_pdf file per file; i
+    file sono restituiti da file_completati nell'ordine in cui terminano.
+    """
+
+    # Priorità delle richieste allo stadio di lettura
+    _SECONDO_PASSAGGIO, _NUOVO_FILE, _FINE = 0, 1, 2
+
+    def __init__(
+        self,
+        pdf_paths: List[str],
+        dpi: int = 200,
+        cache_dir: Optional[str] = None,
+        dpi_rapido: Optional[int] = None,
+        roi: Optional[str] = None,
+        preelabora: Optional[Tuple[str, ...]] = None,
+        indice_path: Optional[str] = None,
+        prefiltro: bool = True,
+        coda_pagine: int = PIPELINE_CODA_PAGINE
+    ):
+        self.pdf_paths = pdf_paths
+        self.dpi = dpi
+        self.cache_dir = cache_dir
+        self.dpi_rapido = dpi_rapido
+        self.roi = roi
+        self.preelabora = preelabora
+        self.indice_path = indice_path
+        self.prefiltro = prefiltro
+
+        self.richieste: 'queue.PriorityQueue[Tuple[int, int, Optional[List[int]]]]' = queue.PriorityQueue()
+        self.coda_pagine = CodaMisurata('pagine', max(1, coda_pagine))
+        self.coda_testi = CodaMisurata('testi', PIPELINE_CODA_TESTI)
+        self.stop = threading.Event()
+
+        self._hash: Dict[int, str] = {}
+        self._in_corso: Dict[int, Dict[str, Any]] = {}
+        self._completati = 0
+
+    def _metti(self, coda: 'queue.Queue[Any]', elemento: Any) -> bool:
+        """Inserisce attendendo se la coda è piena; False se la pipeline è stata fermata."""
+        while not self.stop.is_set():
+            try:
+                coda.put(elemento, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _prendi(self, coda: 'queue.Queue[Any]') -> Any:
+        """Preleva attendendo se la coda è vuota; None se la pipeline è stata fermata."""
+        while not self.stop.is_set():
+            try:
+                return coda.get(timeout=1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _leggi(self) -> None:
+        """Stadio di lettura: un file (o un secondo passaggio) alla volta."""
+        # Ogni thread usa la propria connessione alla cache OCR e all'indice dei duplicati
+        cache = apri_cache_ocr(self.cache_dir) if self.cache_dir else None
+        indice = apri_indice_duplicati(self.indice_path) if self.indice_path else None
+        try:
+            while True:
+                richiesta = self._prendi(self.richieste)
+                if richiesta is None or richiesta[0] == self._FINE:
+                    return
+                _, idx, pagine = richiesta
+                pdf_path = self.pdf_paths[idx]
+                if pagine is not None:
+                    self._leggi_pagine(idx, pdf_path, pagine, self.dpi, None, cache, indice)
+                    continue
+                logger.info(f"[{idx + 1}/{len(self.pdf_paths)}] Elaborazione {os.path.basename(pdf_path)}")
+                try:
+                    deleghe, da_ocr = extract_from_native_pdf(pdf_path)
+                except Exception as e:
+                    self._metti(self.coda_testi, ('errore', idx, e))
+                    continue
+                self._metti(self.coda_testi, ('inizio', idx, deleghe, len(da_ocr)))
+                if da_ocr:
+                    logger.debug(f"Usando OCR per {len(da_ocr)} pagine scansionate")
+                    self._leggi_pagine(idx, pdf_path, da_ocr, self.dpi_rapido or self.dpi, self.roi, cache, indice)
+        finally:
+            self._metti(self.coda_pagine, None)
+            rilascia_risorse_thread()
+
+    def _leggi_pagine(
+        self,
+        idx: int,
+        pdf_path: str,
+        pagine: List[int],
+        dpi: int,
+        roi: Optional[str],
+        cache: Optional[CacheOCR],
+        indice: Optional[IndiceDuplicati]
+    ) -> None:
+        """Manda allo stadio OCR le pagine da rasterizzare e a quello di estrazione quelle in cache."""
+        variante = variante_ocr(roi, self.preelabora)
+        inviate = 0
+        try:
+            da_rasterizzare = pagine
+            if cache is not None:
+                if idx not in self._hash:
+                    self._hash[idx] = calcola_hash_file(pdf_path)
+                da_rasterizzare = []
+                for page_num in pagine:
+                    dalla_cache = testo_in_cache(pdf_path, page_num, dpi, variante, cache, self._hash[idx], indice)
+                    if dalla_cache is None:
+                        da_rasterizzare.append(page_num)
+                        continue
+                    self._metti(self.coda_testi, ('pagina', idx, page_num, *dalla_cache))
+                    inviate += 1
+
+            grigi = bool(self.preelabora) and 'grigi' in self.preelabora
+            for page_num, img in rasterizza_pagine(pdf_path, dpi=dpi, pagine=da_rasterizzare, grigi=grigi):
+                if not self._metti(
+                    self.coda_pagine, (idx, page_num, img, dpi, variante, roi, self._hash.get(idx))
+                ):
+                    img.close()
+                    return
+                inviate += 1
+        except Exception as e:
+            logger.error(f"Errore conversione PDF {pdf_path}: {e}")
+            # Le pagine non lette arrivano all'estrazione come errori, così il file si chiude
+            for _ in range(len(pagine) - inviate):
+                self._metti(self.coda_testi, ('pagina_errore', idx, None, None, None))
+
+    def _riconosci(self) -> None:
+        """Stadio OCR: una pagina rasterizzata alla volta."""
+        cache = apri_cache_ocr(self.cache_dir) if self.cache_dir else None
+        indice = apri_indice_duplicati(self.indice_path) if self.indice_path else None
+        try:
+            while True:
+                elemento = self._prendi(self.coda_pagine)
+                if elemento is None:
+                    return
+                idx, page_num, img, dpi, variante, roi, file_hash = elemento
+                pdf_path = self.pdf_paths[idx]
+                tipo, risultato = 'pagina', None
+                try:
+                    risultato = ocr_immagine_pagina(
+                        img, pdf_path, page_num, dpi, variante, cache, file_hash, roi,
+                        self.preelabora, indice, self.prefiltro
+                    )
+                except Exception as e:
+                    logger.error(f"Errore OCR pagina {page_num} di {pdf_path}: {e}")
+                    tipo = 'pagina_errore'
+                finally:
+                    img.close()
+                testo, duplicato_di = risultato or (None, None)
+                if not self._metti(self.coda_testi, (tipo, idx, page_num, testo, duplicato_di)):
+                    return
+        finally:
+            rilascia_risorse_thread()
+
+    def _estrai(self, messaggio: Tuple[Any, ...]) -> Optional[List[DelegaF24]]:
+        """
+        Stadio di estrazione: elabora un messaggio.
+
+        Returns:
+            Deleghe del file se il messaggio lo completa, altrimenti None
+        """
+        tipo, idx = messaggio[0], messaggio[1]
+        pdf_path = self.pdf_paths[idx]
+
+        if tipo == 'errore':
+            logger.error(f"   Errore elaborazione {os.path.basename(pdf_path)}: {messaggio[2]}")
+            self._in_corso.pop(idx, None)
+            self._completati += 1
+            return None
+
+        if tipo == 'inizio':
+            stato = {'deleghe': messaggio[2], 'per_pagina': {}, 'attese': messaggio[3], 'secondo': False}
+            self._in_corso[idx] = stato
+        else:
+            _, _, page_num, testo, duplicato_di = messaggio
+            stato = self._in_corso[idx]
+            stato['attese'] -= 1
+            per_pagina = stato['per_pagina']
+            if tipo == 'pagina_errore':
+                stato['errore'] = True
+            elif testo is not None:
+                if stato['secondo']:
+                    delega = estrai_delega_ocr(testo, page_num, pdf_path, duplicato_di=duplicato_di)
+                    per_pagina[page_num] = delega.integra(per_pagina[page_num])
+                else:
+                    per_pagina[page_num] = estrai_delega_ocr(testo, page_num, pdf_path, self.roi, duplicato_di)
+
+        if stato['attese'] > 0:
+            return None
+
+        if stato.get('errore'):
+            # Un file con pagine non lette non è completo: resta fuori dal manifest e viene ritentato
+            logger.error(f"   {os.path.basename(pdf_path)}: pagine non elaborate, file escluso")
+            del self._in_corso[idx]
+            self._completati += 1
+            return None
+
+        per_pagina = stato['per_pagina']
+        if not stato['secondo'] and (self.dpi_rapido or self.roi):
+            incomplete = sorted(p for p, d in per_pagina.items() if not d.is_completa())
+            if incomplete:
+                logger.debug(
+                    f"OCR adattivo: {len(incomplete)}/{len(per_pagina)} pagine "
+                    f"rielaborate a pagina intera, {self.dpi} DPI"
+                )
+                stato['secondo'] = True
+                stato['attese'] = len(incomplete)
+                self.richieste.put((self._SECONDO_PASSAGGIO, idx, incomplete))
+                return None
+
+        deleghe = stato['deleghe'] + [
+            d for _, d in sorted(per_pagina.items())
+            if d.codice_fiscale or d.importo_cent
+        ]
+        deleghe.sort(key=lambda d: d.pagina)
+        del self._in_corso[idx]
+        self._completati += 1
+        return deleghe
+
+    def file_completati(self) -> Iterator[Tuple[int, List[DelegaF24]]]:
+        """
+        Avvia gli stadi e restituisce i file man mano che sono completi.
+
+        I file in errore, anche su una sola pagina, non vengono restituiti.
+        Se il chiamante smette di iterare, gli stadi vengono fermati.
+
+        Yields:
+            Tuple (indice del file in pdf_paths, deleghe del file)
+        """
+        for idx in range(len(self.pdf_paths)):
+            self.richieste.put((self._NUOVO_FILE, idx, None))
+
+        stadi = [
+            threading.Thread(target=self._leggi, name='lettura', daemon=True),
+            threading.Thread(target=self._riconosci, name='ocr', daemon=True)
+        ]
+        for t in stadi:
+            t.start()
+
+        try:
+            while self._completati < len(self.pdf_paths):
+                try:
+                    messaggio = self.coda_testi.get(timeout=1)
+                except queue.Empty:
+                    if not all(t.is_alive() for t in stadi):
+                        raise RuntimeError("Pipeline interrotta: uno stadio è terminato in modo inatteso")
+                    continue
+                deleghe = self._estrai(messaggio)
+                if deleghe is not None:
+                    yield messaggio[1], deleghe
+            self.richieste.put((self._FINE, -1, None))
+        finally:
+            if self._completati < len(self.pdf_paths):
+                self.stop.set()
+            for t in stadi:
+                t.join()
+            # Dopo un'interruzione possono restare immagini in coda
+            while True:
+                try:
+                    elemento = self.coda_pagine.get_nowait()
+                except queue.Empty:
+                    break
+                if elemento is not None:
+                    elemento[2].close()
+            METRICHE.registra_code({c.nome: c.esporta() for c in (self.coda_pagine, self.coda_testi)})
+
+
+def estrai_deleghe_pipeline(
+    pdf_paths: List[str],
+    dpi: int = 200,
+    cache_dir: Optional[str] = None,
+    dpi_rapido: Optional[int] = None,
+    roi: Optional[str] = None,
+    al_completamento: Optional[Callable[[int, List[DelegaF24]], None]] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    indice_path: Optional[str] = None,
+    prefiltro: bool = True,
+    coda_pagine: int = PIPELINE_CODA_PAGINE
+) -> List[List[DelegaF24]]:
+    """
+    Estrae le deleghe da più PDF in un solo processo, a stadi sovrapposti.
+
+    Rasterizzazione, OCR ed estrazione dei campi lavorano in contemporanea
+    su pagine diverse (vedi PipelineEstrazione). Un errore su una pagina o
+    su un file non interrompe l'elaborazione degli altri.
+
+    Args:
+        pdf_paths: Percorsi dei PDF
+        dpi: Risoluzione per la conversione (default: 200)
+        cache_dir: Cartella della cache OCR (None = cache disattivata)
+        dpi_rapido: Risoluzione del primo passaggio adattivo (opzionale)
+        roi: Layout F24 per l'OCR a riquadri (opzionale)
+        al_completamento: Chiamata con (indice del file, deleghe) appena un
+            file è completo (es. export in streaming); non per i file in errore
+        preelabora: Passi di preelaborazione delle immagini (opzionale)
+        indice_path: Database dell'indice dei duplicati (None = nessun controllo)
+        prefiltro: Scarta le pagine bianche e i separatori prima dell'OCR
+        coda_pagine: Pagine rasterizzate in attesa di OCR oltre le quali la
+            rasterizzazione si ferma
+
+    Returns:
+        Lista, nello stesso ordine di pdf_paths, delle deleghe di ciascun file
+    """
+    risultati: List[List[DelegaF24]] = [[] for _ in pdf_paths]
+    pipeline = PipelineEstrazione(
+        pdf_paths, dpi=dpi, cache_dir=cache_dir, dpi_rapido=dpi_rapido, roi=roi,
+        preelabora=preelabora, indice_path=indice_path, prefiltro=prefiltro, coda_pagine=coda_pagine
+    )
+    for idx, deleghe in pipeline.file_completati():
+        risultati[idx] = deleghe
+        if al_completamento is not None:
+            al_completamento(idx, deleghe)
+    return risultati
+
+
+@dataclass(slots=True)
+class ShardLavoro:
+    """Shard della coda di lavoro preso in carico da un worker."""
+    id: int
+    file: str  # Percorso del PDF relativo alla cartella della coda
+    sha256: str
+    dimensione: int
+    pagina_inizio: int
+    pagina_fine: int
+    parametri: Dict[str, Any]  # Parametri di estrazione del lotto
+    profilo: bool
+
+
+class CodaLavori:
+    """
+    Coda di lavoro condivisa (SQLite) dell'elaborazione distribuita su più host.
+
+    Il coordinatore (riconcilia con coda_lavori) registra un lotto: i
+    parametri di estrazione e i PDF divisi in shard di pagine consecutive.
+    I worker, su questo e su altri host, prendono uno shard alla volta con
+    un lease che rinnovano mentre lo elaborano (heartbeat) e vi salvano le
+    deleghe estratte e le metriche. Uno shard il cui lease scade (worker
+    terminato, host spento, rete interrotta) torna disponibile; dopo
+    DISTRIBUITO_MAX_TENTATIVI tentativi viene segnato in errore e le sue
+    pagine mancano dal confronto, come le pagine illeggibili
+    nell'elaborazione locale.
+
+    Il database sta su una cartella condivisa, insieme ai PDF: i file sono
+    registrati con il percorso relativo alla cartella della coda, così ogni
+    host li trova anche se monta la condivisione altrove. Niente WAL (la
+    memoria condivisa funziona solo sullo stesso host): ogni operazione è
+    una transazione breve con BEGIN IMMEDIATE e bastano i lock di file del
+    filesystem di rete.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        # Connessione usata anche dal thread dell'heartbeat, serializzata da _lock
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS lotto ('
+            ' parametri TEXT NOT NULL,'
+            ' profilo INTEGER NOT NULL,'
+            ' creato REAL NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS shard ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' file TEXT NOT NULL,'
+            ' sha256 TEXT NOT NULL,'
+            ' dimensione INTEGER NOT NULL,'
+            ' pagina_inizio INTEGER NOT NULL,'
+            ' pagina_fine INTEGER NOT NULL,'
+            " stato TEXT NOT NULL DEFAULT 'in_attesa',"
+            ' worker TEXT,'
+            ' scadenza REAL,'
+            ' tentativi INTEGER NOT NULL DEFAULT 0,'
+            ' deleghe TEXT,'
+            ' metriche TEXT,'
+            ' errore TEXT)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_shard_stato ON shard (stato)')
+
+    @property
+    def indice_path(self) -> str:
+        """Database dell'indice dei duplicati del lotto, accanto alla coda."""
+        return os.path.splitext(self.db_path)[0] + '_duplicati.sqlite'
+
+    @contextmanager
+    def _transazione(self) -> Iterator[None]:
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def prepara(
+        self,
+        parametri: Dict[str, Any],
+        profilo: bool,
+        voci: List[Tuple[str, str, int, int]],
+        pagine_shard: int = DISTRIBUITO_PAGINE_SHARD
+    ) -> int:
+        """
+        Registra il lotto e i suoi shard, o riprende quello già presente.
+
+        Se la coda contiene già lo stesso lotto (stessi parametri, stessi
+        file con lo stesso contenuto) gli shard completati vengono tenuti e
+        quelli in errore ritentati: rilanciare il coordinatore dopo
+        un'interruzione riprende da dove era arrivato. Altrimenti la coda
+        viene svuotata, purché nessun worker stia elaborando shard di un
+        altro lotto.
+
+        Args:
+            parametri: Parametri di estrazione, uguali per tutti i worker
+            profilo: Raccoglie negli shard le metriche per fase
+            voci: Per ogni PDF (percorso relativo alla coda, SHA-256, byte, pagine)
+            pagine_shard: Pagine consecutive per shard
+
+        Returns:
+            Numero di shard da elaborare
+
+        Raises:
+            RuntimeError: Se la coda è in uso per un altro lotto
+        """
+        parametri_json = json.dumps(parametri, sort_keys=True)
+        file_lotto = {(file, sha256) for file, sha256, _, n_pagine in voci if n_pagine}
+        adesso = time.time()
+
+        with self._transazione():
+            riga = self.conn.execute('SELECT parametri FROM lotto').fetchone()
+            presenti = set(self.conn.execute('SELECT DISTINCT file, sha256 FROM shard').fetchall())
+            ripresa = riga is not None and riga[0] == parametri_json and presenti == file_lotto
+
+            if ripresa:
+                self.conn.execute('UPDATE lotto SET profilo = ?', (int(profilo),))
+                self.conn.execute(
+                    "UPDATE shard SET stato = 'in_attesa', tentativi = 0 WHERE stato = 'errore'"
+                )
+            else:
+                occupati = self.conn.execute(
+                    "SELECT COUNT(*) FROM shard WHERE stato = 'in_corso' AND scadenza >= ?", (adesso,)
+                ).fetchone()[0]
+                if occupati:
+                    raise RuntimeError(
+                        f"Coda di lavoro {self.db_path} in uso da un altro lotto "
+                        f"({occupati} shard in elaborazione)"
+                    )
+                self.conn.execute('DELETE FROM shard')
+                self.conn.execute('DELETE FROM lotto')
+                self.conn.execute(
+                    'INSERT INTO lotto (parametri, profilo, creato) VALUES (?, ?, ?)',
+                    (parametri_json, int(profilo), adesso)
+                )
+                self.conn.executemany(
+                    'INSERT INTO shard (file, sha256, dimensione, pagina_inizio, pagina_fine)'
+                    ' VALUES (?, ?, ?, ?, ?)',
+                    [
+                        (file, sha256, dimensione, inizio, min(inizio + pagine_shard - 1, n_pagine))
+                        for file, sha256, dimensione, n_pagine in voci
+                        for inizio in range(1, n_pagine + 1, pagine_shard)
+                    ]
+                )
+
+            da_elaborare, completati = self.conn.execute(
+                "SELECT COUNT(*), SUM(stato = 'completato') FROM shard"
+            ).fetchone()
+
+        if ripresa:
+            logger.info(
+                f"Coda di lavoro: ripreso il lotto, {completati or 0}/{da_elaborare} shard già completati"
+            )
+        else:
+            # L'indice dei duplicati del lotto precedente non vale per il nuovo
+            elimina_indice_duplicati(self.indice_path)
+        return da_elaborare - (completati or 0)
+
+    def prendi(self, worker: str, lease: float = DISTRIBUITO_LEASE_S) -> Optional[ShardLavoro]:
+        """
+        Prende in carico il primo shard libero o con il lease scaduto.
+
+        Args:
+            worker: Identificativo del worker (host:pid)
+            lease: Secondi entro cui il worker deve rinnovare il lease
+
+        Returns:
+            Shard da elaborare o None se non ce ne sono di disponibili
+        """
+        adesso = time.time()
+        with self._transazione():
+            self.conn.execute(
+                "UPDATE shard SET stato = 'errore', worker = NULL, scadenza = NULL,"
+                " errore = COALESCE(errore, 'lease scaduto: worker terminato o irraggiungibile')"
+                " WHERE stato = 'in_corso' AND scadenza < ? AND tentativi >= ?",
+                (adesso, DISTRIBUITO_MAX_TENTATIVI)
+            )
+            riga = self.conn.execute(
+                'SELECT s.id, s.file, s.sha256, s.dimensione, s.pagina_inizio, s.pagina_fine,'
+                ' s.stato, s.worker, l.parametri, l.profilo FROM shard s, lotto l'
+                " WHERE s.stato = 'in_attesa' OR (s.stato = 'in_corso' AND s.scadenza < ?)"
+                ' ORDER BY s.id LIMIT 1',
+                (adesso,)
+            ).fetchone()
+            if riga is None:
+                return None
+            self.conn.execute(
+                "UPDATE shard SET stato = 'in_corso', worker = ?, scadenza = ?, tentativi = tentativi + 1"
+                ' WHERE id = ?',
+                (worker, adesso + lease, riga[0])
+            )
+
+        if riga[6] == 'in_corso':
+            logger.warning(f"Shard {riga[0]}: lease di {riga[7]} scaduto, shard ripreso")
+        return ShardLavoro(
+            id=riga[0], file=riga[1], sha256=riga[2], dimensione=riga[3],
+            pagina_inizio=riga[4], pagina_fine=riga[5], parametri=json.loads(riga[8]),
+            profilo=bool(riga[9])
+        )
+
+    def rinnova(self, shard_id: int, worker: str, lease: float = DISTRIBUITO_LEASE_S) -> bool:
+        """Rinnova il lease di uno shard (False se non è più del worker)."""
+        with self._lock:
+            cursore = self.conn.execute(
+                "UPDATE shard SET scadenza = ? WHERE id = ? AND worker = ? AND stato = 'in_corso'",
+                (time.time() + lease, shard_id, worker)
+            )
+        return cursore.rowcount > 0
+
+    def completa(
+        self,
+        shard_id: int,
+        worker: str,
+        deleghe: List[DelegaF24],
+        metriche: Optional[Dict[str, Any]]
+    ) -> bool:
+        """
+        Salva il risultato di uno shard.
+
+        Returns:
+            False se lo shard è passato a un altro worker (lease scaduto):
+            il risultato viene scartato
+        """
+        with self._lock:
+            cursore = self.conn.execute(
+                "UPDATE shard SET stato = 'completato', scadenza = NULL, errore = NULL,"
+                ' deleghe = ?, metriche = ?'
+                " WHERE id = ? AND worker = ? AND stato = 'in_corso'",
+                (json.dumps([d.to_dict() for d in deleghe]), json.dumps(metriche), shard_id, worker)
+            )
+        return cursore.rowcount > 0
+
+    def rilascia(self, shard_id: int, worker: str, errore: str) -> None:
+        """Restituisce uno shard non elaborato: torna in attesa, o in errore dopo troppi tentativi."""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE shard SET stato = CASE WHEN tentativi >= ? THEN 'errore' ELSE 'in_attesa' END,"
+                ' worker = NULL, scadenza = NULL, errore = ?'
+                " WHERE id = ? AND worker = ? AND stato = 'in_corso'",
+                (DISTRIBUITO_MAX_TENTATIVI, errore, shard_id, worker)
+            )
+
+    def concluso(self) -> bool:
+        """True se c'è un lotto e nessuno shard è in attesa o in elaborazione."""
+        with self._lock:
+            if self.conn.execute('SELECT 1 FROM lotto').fetchone() is None:
+                return False
+            return self.conn.execute(
+                "SELECT 1 FROM shard WHERE stato IN ('in_attesa', 'in_corso') LIMIT 1"
+            ).fetchone() is None
+
+    def risultati(self) -> List[Tuple[str, int, int, str, Optional[str], Optional[str], Optional[str]]]:
+        """
+        Restituisce gli shard del lotto in ordine di file e pagina.
+
+        Returns:
+            Lista di (file, pagina iniziale, pagina finale, stato, deleghe
+            JSON, metriche JSON, errore)
+        """
+        with self._lock:
+            return self.conn.execute(
+                'SELECT file, pagina_inizio, pagina_fine, stato, deleghe, metriche, errore'
+                ' FROM shard ORDER BY file, pagina_inizio'
+            ).fetchall()
+
+    def close(self) -> None:
+        """Chiude la connessione."""
+        self.conn.close()
+
+
+# Hash dei PDF già verificati dal processo: (percorso, byte, mtime) -> SHA-256
+_HASH_VERIFICATI: Dict[Tuple[str, int, float], str] = {}
+
+
+def hash_verificato(pdf_path: str) -> str:
+    """
+    SHA-256 di un PDF, calcolato una volta per processo finché dimensione e
+    mtime non cambiano (un file diviso in molti shard non viene riletto
+    per ognuno).
+    """
+    stat = os.stat(pdf_path)
+    chiave = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime)
+    if chiave not in _HASH_VERIFICATI:
+        _HASH_VERIFICATI[chiave] = calcola_hash_file(pdf_path)
+    return _HASH_VERIFICATI[chiave]
+
+
+def elabora_shard(
+    shard: ShardLavoro,
+    pdf_path: str,
+    cache_dir: Optional[str] = None,
+    indice_path: Optional[str] = None
+) -> List[DelegaF24]:
+    """
+    Estrae le deleghe dalle pagine di uno shard.
+
+    Come per un file intero: testo nativo dove c'è, OCR (con i parametri
+    del lotto) sulle altre pagine.
+
+    Args:
+        shard: Shard da elaborare
+        pdf_path: Percorso del PDF su questo host
+        cache_dir: Cartella della cache OCR locale (None = cache disattivata)
+        indice_path: Indice dei duplicati condiviso del lotto (None = nessun controllo)
+
+    Returns:
+        Deleghe estratte, in ordine di pagina
+
+    Raises:
+        ValueError: Se il PDF non è quello registrato dal coordinatore
+    """
+    # L'hash registrato entra nelle chiavi della cache OCR: il file deve essere proprio quello
+    if os.path.getsize(pdf_path) != shard.dimensione or hash_verificato(pdf_path) != shard.sha256:
+        raise ValueError(f"{pdf_path} diverso dal file registrato nella coda di lavoro")
+
+    parametri = shard.parametri
+    pagine = list(range(shard.pagina_inizio, shard.pagina_fine + 1))
+    deleghe, da_ocr = extract_from_native_pdf(pdf_path, pagine)
+
+    if da_ocr:
+        cache = apri_cache_ocr(cache_dir) if cache_dir else None
+        indice = IndiceDuplicati(indice_path, condiviso=True) if indice_path else None
+        try:
+            deleghe.extend(extract_from_scanned_pdf(
+                pdf_path, parametri['dpi'], cache, parametri['dpi_rapido'], pagine=da_ocr,
+                file_hash=shard.sha256, roi=parametri['roi'],
+                preelabora=tuple(parametri['preelabora']) if parametri['preelabora'] else None,
+                indice=indice, prefiltro=parametri['prefiltro']
+            ))
+        finally:
+            if indice is not None:
+                indice.close()
+
+    deleghe.sort(key=lambda d: d.pagina)
+    return deleghe
+
+
+def _lavora_coda_processo(coda_lavori: str, cache_dir: Optional[str], fine_lotto: bool) -> int:
+    """Ciclo di un processo worker della coda di lavoro (vedi lavora_coda)."""
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    cartella = os.path.dirname(os.path.abspath(coda_lavori))
+    coda = CodaLavori(coda_lavori)
+    completati = 0
+    in_attesa = False
+
+    try:
+        while True:
+            shard = coda.prendi(worker)
+            if shard is None:
+                if fine_lotto and coda.concluso():
+                    break
+                if not in_attesa:
+                    logger.info(f"Worker {worker}: in attesa di shard da elaborare")
+                    in_attesa = True
+                time.sleep(DISTRIBUITO_ATTESA_S)
+                continue
+            in_attesa = False
+
+            descrizione = f"{shard.file} pag. {shard.pagina_inizio}-{shard.pagina_fine}"
+            fermo = threading.Event()
+
+            def heartbeat(shard_id: int = shard.id) -> None:
+                while not fermo.wait(DISTRIBUITO_HEARTBEAT_S):
+                    if not coda.rinnova(shard_id, worker):
+                        return
+
+            battito = threading.Thread(target=heartbeat, name='heartbeat', daemon=True)
+            battito.start()
+            inizio = time.perf_counter()
+            try:
+                deleghe, metriche = esegui_job(
+                    shard.profilo, elabora_shard, shard, os.path.join(cartella, shard.file), cache_dir,
+                    coda.indice_path if shard.parametri['duplicati'] else None
+                )
+            except Exception as e:
+                logger.error(f"Errore shard {shard.id} ({descrizione}): {e}")
+                coda.rilascia(shard.id, worker, str(e))
+                continue
+            except KeyboardInterrupt:
+                coda.rilascia(shard.id, worker, 'worker interrotto')
+                raise
+            finally:
+                fermo.set()
+                battito.join()
+
+            if coda.completa(shard.id, worker, deleghe, metriche):
+                completati += 1
+                logger.info(
+                    f"Shard {shard.id} ({descrizione}): {len(deleghe)} deleghe "
+                    f"in {time.perf_counter() - inizio:.1f}s"
+                )
+            else:
+                logger.warning(f"Shard {shard.id} ({descrizione}): lease perso, risultato scartato")
+    finally:
+        coda.close()
+        rilascia_risorse_thread()
+
+    return completati
+
+
+def lavora_coda(
+    coda_lavori: str,
+    cache_dir: Optional[str] = OCR_CACHE_DIR,
+    workers: int = 1,
+    fine_lotto: bool = False
+) -> int:
+    """
+    Elabora gli shard di una coda di lavoro condivisa (worker, --lavora).
+
+    I parametri di estrazione sono quelli registrati dal coordinatore; la
+    cache OCR è quella di questo host. Senza `fine_lotto` il worker resta
+    in attesa dei lotti successivi finché non viene interrotto (Ctrl+C):
+    si può avviare una volta per host, anche prima del coordinatore.
+
+    Args:
+        coda_lavori: Database della coda, sulla cartella condivisa
+        cache_dir: Cartella della cache OCR (None = cache disattivata)
+        workers: Processi worker su questo host
+        fine_lotto: Termina quando il lotto in corso è concluso
+
+    Returns:
+        Numero di shard completati
+    """
+    if workers == 1:
+        return _lavora_coda_processo(coda_lavori, cache_dir, fine_lotto)
+    with crea_pool_ocr(workers) as pool:
+        futures = [
+            pool.submit(_lavora_coda_processo, coda_lavori, cache_dir, fine_lotto) for _ in range(workers)
+        ]
+        return sum(future.result() for future in futures)
+
+
+def estrai_deleghe_distribuito(
+    pdf_paths: List[str],
+    coda_lavori: str,
+    workers: int = 1,
+    dpi: int = 200,
+    cache_dir: Optional[str] = None,
+    dpi_rapido: Optional[int] = None,
+    roi: Optional[str] = None,
+    al_completamento: Optional[Callable[[int, List[DelegaF24]], None]] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    duplicati: bool = True,
+    prefiltro: bool = True
+) -> List[List[DelegaF24]]:
+    """
+    Estrae le deleghe da più PDF con la coda di lavoro condivisa (coordinatore).
+
+    I PDF vengono divisi in shard di DISTRIBUITO_PAGINE_SHARD pagine nella
+    coda (vedi CodaLavori). Il coordinatore elabora shard con `workers`
+    processi locali insieme ai worker degli altri host (lavora_coda), poi
+    attende che tutti gli shard siano conclusi e ricompone le deleghe di
+    ogni file dagli shard, unendo anche le metriche raccolte dai worker.
+    Se i worker locali si fermano prima della fine del lotto il
+    coordinatore lavora la coda direttamente: riprende gli shard con il
+    lease scaduto, che altrimenti nessuno riprenderebbe.
+
+    Args:
+        pdf_paths: Percorsi dei PDF, sulla stessa cartella condivisa della coda
+        coda_lavori: Database della coda
+        workers: Processi worker locali
+        dpi: Risoluzione per la conversione (default: 200)
+        cache_dir: Cartella della cache OCR locale (None = cache disattivata)
+        dpi_rapido: Risoluzione del primo passaggio adattivo (opzionale)
+        roi: Layout F24 per l'OCR a riquadri (opzionale)
+        al_completamento: Chiamata con (indice del file, deleghe) per ogni
+            file con tutti gli shard completati
+        preelabora: Passi di preelaborazione delle immagini (opzionale)
+        duplicati: Riconosce le pagine duplicate con un indice condiviso dai worker
+        prefiltro: Scarta le pagine bianche e i separatori prima dell'OCR
+
+    Returns:
+        Lista, nello stesso ordine di pdf_paths, delle deleghe di ciascun file
+
+    Raises:
+        RuntimeError: Se un PDF non può essere registrato nella coda
+            (illeggibile): le sue deleghe mancherebbero dal confronto
+    """
+    import pdfplumber
+
+    cartella = os.path.dirname(os.path.abspath(coda_lavori))
+    relativi = [os.path.relpath(os.path.abspath(p), cartella) for p in pdf_paths]
+
+    voci = []
+    non_preparati = []
+    for pdf_path, relativo in zip(pdf_paths, relativi):
+        try:
+            # Pagine contate con pdfplumber: il coordinatore non ha bisogno di poppler
+            with pdfplumber.open(pdf_path) as pdf:
+                n_pagine = len(pdf.pages)
+            voci.append((relativo, calcola_hash_file(pdf_path), os.path.getsize(pdf_path), n_pagine))
+        except Exception as e:
+            logger.error(f"Errore preparazione {os.path.basename(pdf_path)}: {e}")
+            non_preparati.append(os.path.basename(pdf_path))
+    if non_preparati:
+        raise RuntimeError(f"PDF non registrati nella coda di lavoro: {', '.join(non_preparati)}")
+
+    parametri = {
+        'dpi': dpi, 'dpi_rapido': dpi_rapido, 'roi': roi,
+        'preelabora': list(preelabora) if preelabora else None, 'duplicati': duplicati,
+        'prefiltro': prefiltro
+    }
+    coda = CodaLavori(coda_lavori)
+    try:
+        da_elaborare = coda.prepara(parametri, METRICHE.attive, voci)
+    finally:
+        # I worker locali sono processi figli: la connessione non va condivisa
+        coda.close()
+    logger.info(f"Coda di lavoro {coda_lavori}: {da_elaborare} shard da elaborare")
+
+    if da_elaborare:
+        # Anche con un solo worker locale si usa un processo figlio: le metriche
+        # degli shard arrivano dalla coda e non si sommano a quelle del coordinatore
+        with crea_pool_ocr(workers) as pool:
+            futures = [
+                pool.submit(_lavora_coda_processo, coda_lavori, cache_dir, True) for _ in range(workers)
+            ]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Errore worker locale: {e}")
+
+    coda = CodaLavori(coda_lavori)
+    try:
+        if not coda.concluso():
+            # Worker locali fermati per errore: solo prendi() riprende gli shard con il
+            # lease scaduto, quindi il coordinatore lavora la coda fino alla fine del lotto
+            # (attendendo gli shard in elaborazione sugli altri host). Le metriche degli
+            # shard arrivano dalla coda: quelle del coordinatore vengono ripristinate
+            logger.warning("Worker locali terminati prima della fine del lotto: il coordinatore lavora la coda")
+            attive, misure = METRICHE.attive, METRICHE.esporta()
+            try:
+                _lavora_coda_processo(coda_lavori, cache_dir, True)
+            finally:
+                METRICHE.attive = attive
+                METRICHE.azzera()
+                METRICHE.unisci(misure)
+        righe = coda.risultati()
+    finally:
+        coda.close()
+
+    per_file: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    incompleti = set()
+    for file, inizio, fine, stato, deleghe, metriche, errore in righe:
+        if stato != 'completato':
+            logger.error(f"Shard {file} pag. {inizio}-{fine} non elaborato: {errore}")
+            incompleti.add(file)
+            continue
+        per_file[file].extend(json.loads(deleghe))
+        METRICHE.unisci(json.loads(metriche))
+
+    risultati: List[List[DelegaF24]] = []
+    for idx, relativo in enumerate(relativi):
+        if relativo in incompleti:
+            # Come nell'elaborazione locale: il file incompleto resta fuori dal manifest
+            logger.error(f"   {os.path.basename(relativo)}: pagine non elaborate, file escluso")
+            risultati.append([])
+            continue
+        deleghe = [DelegaF24(**d) for d in per_file.get(relativo, [])]
+        risultati.append(deleghe)
+        if al_completamento is not None:
+            al_completamento(idx, deleghe)
+    return risultati
+
+
+def regex_da_trie(parole: List[str]) -> str:
+    """
+    Costruisce una regex equivalente all'alternanza delle parole, ma
+    fattorizzata per prefissi comuni (trie).
+
+    Con centinaia di filiali un'alternanza semplice prova ogni nome a ogni
+    posizione del testo; la versione a trie scende carattere per carattere
+    e scarta subito i rami che non corrispondono. A parità di posizione
+    vince la parola più lunga.
+
+    Args:
+        parole: Parole da cercare
+
+    Returns:
+        Pattern regex (stringa)
+    """
+    trie: Dict[str, Any] = {}
+    for parola in parole:
+        nodo = trie
+        for ch in parola:
+            nodo = nodo.setdefault(ch, {})
+        nodo[''] = {}
+
+    def costruisci(nodo: Dict[str, Any]) -> str:
+        rami = [re.escape(ch) + costruisci(figlio) for ch, figlio in sorted(nodo.items()) if ch]
+        if not rami:
+            return ''
+        corpo = rami[0] if len(rami) == 1 else '(?:' + '|'.join(rami) + ')'
+        if '' in nodo:
+            # Fine parola intermedia: il resto è opzionale (greedy = più lungo)
+            return corpo + '?' if len(rami) == 1 and len(corpo) == 1 else '(?:' + corpo + ')?'
+        return corpo
+
+    return costruisci(trie)
+
+
+class EstrattoreF24:
+    """
+    Estrattore dei campi F24 con pattern precompilati.
+
+    I pattern vengono compilati una sola volta dalle liste di config.py.
+    Per ogni pagina il testo viene scandito una volta con un'unica regex
+    delle parole chiave (CODICE, EURO, SALDO, 08749, CAB, ...): i pattern
+    la cui parola chiave iniziale non compare nel testo vengono saltati
+    senza eseguirli. I pattern rimanenti sono applicati nello stesso ordine
+    di priorità delle liste, quindi il risultato non cambia rispetto
+    all'applicazione di tutti i pattern.
+
+    La filiale è cercata con un'unica regex a trie su tutti i nomi (vedi
+    regex_da_trie): viene restituita quella che compare per prima nel testo.
+    """
+
+    def __init__(
+        self,
+        cf_patterns: List[str] = CF_PATTERNS,
+        euro_patterns: List[str] = EURO_PATTERNS,
+        cab_patterns: List[str] = CAB_PATTERNS,
+        data_patterns: List[str] = DATA_PATTERNS,
+        filiali: Dict[str, str] = FILIALE_TO_CAB,
+        saldo_pattern: str = SALDO_PATTERN
+    ):
+        # I pattern CF (scritti in maiuscolo) sono applicati al testo già
+        # convertito in maiuscolo: più veloce di IGNORECASE, stesso risultato
+        self.cf_patterns = self._compila(cf_patterns, 0)
+        self.euro_patterns = self._compila(euro_patterns, re.MULTILINE | re.IGNORECASE)
+        self.saldo_patterns = self._compila([saldo_pattern], 0)
+        self.cab_patterns = self._compila(cab_patterns, 0)
+        self.data_patterns = self._compila(data_patterns, re.IGNORECASE)
+        # Ricerca filiali: una sola regex a trie sui nomi in minuscolo
+        self.filiali = {nome.lower(): (nome, cab) for nome, cab in filiali.items()}
+        self.filiali_re = re.compile(regex_da_trie(list(self.filiali))) if self.filiali else None
+
+        self.parole = sorted({
+            parola
+            for gruppo in (
+                self.cf_patterns, self.euro_patterns, self.saldo_patterns, self.cab_patterns, self.data_patterns
+            )
+            for _, parola in gruppo if parola
+        })
+        # Scansione sovrapposta (lookahead): a ogni posizione la parola più lunga,
+        # così 'CABI' non nasconde 'ABI' e 'CODICE' non viene spezzato in 'COD'
+        self.parole_chiave = re.compile(
+            '(?=(' + '|'.join(re.escape(p) for p in sorted(self.parole, key=len, reverse=True)) + '))'
+        ) if self.parole else None
+
+    @staticmethod
+    def _compila(patterns: List[str], flags: int) -> List[Tuple[Any, Optional[str]]]:
+        """Compila i pattern ricavando la parola chiave letterale iniziale, se presente."""
+        compilati = []
+        for pattern in patterns:
+            match = re.match(r'[A-Z0-9]{3,}', pattern)
+            compilati.append((re.compile(pattern, flags), match.group(0) if match else None))
+        return compilati
+
+    def _parole_presenti(self, text_upper: str) -> set:
+        """Parole chiave presenti nel testo (in maiuscolo), con una sola scansione."""
+        if self.parole_chiave is None:
+            return set()
+        trovate = set(self.parole_chiave.findall(text_upper))
+        # Le parole più corte che iniziano nella stessa posizione sono prefissi
+        # di quella trovata: una parola lunga implica quelle che contiene (CODICE -> COD)
+        return {parola for parola in self.parole if any(parola in t for t in trovate)}
+
+    @staticmethod
+    def _attivi(patterns: List[Tuple[Any, Optional[str]]], presenti: set) -> Iterator[Any]:
+        """Pattern applicabili: senza parola chiave o con parola chiave presente."""
+        for pattern, parola in patterns:
+            if parola is None or parola in presenti:
+                yield pattern
+
+    def estrai(self, text: str, page_num: int, pdf_path: str) -> DelegaF24:
+        """
+        Estrae i dati F24 dal testo di una pagina.
+
+        Args:
+            text: Testo estratto
+            page_num: Numero pagina
+            pdf_path: Percorso del PDF
+
+        Returns:
+            DelegaF24 con i dati estratti
+        """
+        text_upper = text.upper()
+        presenti = self._parole_presenti(text_upper)
+
+        # Codice Fiscale
+        cf = None
+        for pattern in self._attivi(self.cf_patterns, presenti):
+            match = pattern.search(text_upper)
+            if match:
+                cf = pulisci_codice_fiscale(match.group(1))
+                if cf:
+                    logger.debug(f"CF trovato: {cf}")
+                    break
+
+        # Importo EURO (ultima occorrenza valida del primo pattern che ne trova una)
+        importo = None
+        for pattern in self._attivi(self.euro_patterns, presenti):
+            for m in reversed(pattern.findall(text)):
+                val = parse_importo(m)
+                if val:
+                    importo = val
+                    logger.debug(f"Importo trovato: €{importo / 100:,.2f}")
+                    break
+            if importo:
+                break
+
+        # Fallback: primo SALDO (A-B), con le maiuscole del modello
+        if not importo:
+            for pattern in self._attivi(self.saldo_patterns, presenti):
+                match = pattern.search(text)
+                if match:
+                    importo = parse_importo(match.group(1))
+                    if importo:
+                        logger.debug(f"Importo da SALDO: €{importo / 100:,.2f}")
+
+        # CAB
+        cab = None
+        for pattern in self._attivi(self.cab_patterns, presenti):
+            match = pattern.search(text)
+            if match:
+                potential_cab = match.group(1)
+                # Valida che il CAB inizi con prefissi comuni
+                if potential_cab[:2] in CAB_VALID_PREFIXES:
+                    cab = potential_cab
+                    logger.debug(f"CAB trovato: {cab}")
+                    break
+
+        # Filiale (dal timbro o intestazione): prima occorrenza nel testo
+        filiale = None
+        match = self.filiali_re.search(text.lower()) if self.filiali_re else None
+        if match:
+            filiale, f_cab = self.filiali[match.group(0)]
+            if not cab:
+                cab = f_cab
+                logger.debug(f"CAB derivato da filiale {filiale}: {cab}")
+
+        # Data pagamento
+        data_pag = None
+        for pattern in self._attivi(self.data_patterns, presenti):
+            match = pattern.search(text)
+            if match:
+                data_pag = match.group(0)
+                logger.debug(f"Data pagamento trovata: {data_pag}")
+                break
+
+        return DelegaF24(
+            file=os.path.basename(pdf_path),
+            pagina=page_num,
+            codice_fiscale=cf,
+            importo_cent=importo,
+            cab=cab,
+            filiale=filiale,
+            data_pagamento=data_pag
+        )
+
+
+ESTRATTORE_F24 = EstrattoreF24()
+
+
+def extract_data_from_text(text: str, page_num: int, pdf_path: str) -> DelegaF24:
+    """
+    Estrae i dati F24 dal testo (sia OCR che nativo).
+
+    Args:
+        text: Testo estratto
+        page_num: Numero pagina
+        pdf_path: Percorso del PDF
+
+    Returns:
+        DelegaF24 con i dati estratti
+    """
+    with METRICHE.fase('estrazione_campi', file=pdf_path):
+        return ESTRATTORE_F24.estrai(text, page_num, pdf_path)
+
+
+def estrai_deleghe_da_pdf(
+    pdf_path: str,
+    cache: Optional[CacheOCR] = None,
+    dpi: int = 200,
+    dpi_rapido: Optional[int] = None,
+    roi: Optional[str] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    indice: Optional[IndiceDuplicati] = None,
+    prefiltro: bool = True
+) -> List[DelegaF24]:
+    """
+    Estrae le deleghe da un PDF, scegliendo il metodo pagina per pagina.
+
+    Le pagine con testo nativo vengono lette direttamente; solo quelle
+    senza testo vengono rasterizzate e passate all'OCR.
+
+    Args:
+        pdf_path: Percorso del PDF
+        cache: Cache OCR per i PDF scansionati (opzionale)
+        dpi: Risoluzione per l'OCR (default: 200)
+        dpi_rapido: Risoluzione del primo passaggio adattivo (opzionale)
+        roi: Layout F24 per l'OCR a riquadri dei PDF scansionati (opzionale)
+        preelabora: Passi di preelaborazione delle immagini scansionate (opzionale)
+        indice: Indice dei duplicati per le pagine scansionate (opzionale)
+        prefiltro: Scarta le pagine scansionate bianche e i separatori prima dell'OCR
+
+    Returns:
+        Lista di deleghe estratte
+    """
+    logger.info(f"Elaborazione PDF: {os.path.basename(pdf_path)}")
+
+    deleghe, da_ocr = extract_from_native_pdf(pdf_path)
+
+    if da_ocr:
+        logger.debug(f"Usando OCR per {len(da_ocr)} pagine scansionate")
+        deleghe += extract_from_scanned_pdf(
+            pdf_path, dpi=dpi, cache=cache, dpi_rapido=dpi_rapido, roi=roi, pagine=da_ocr,
+            preelabora=preelabora, indice=indice, prefiltro=prefiltro
+        )
+        deleghe.sort(key=lambda d: d.pagina)
+
+    return deleghe
+
+
+@dataclass
+class AbbinamentoDeleghe:
+    """Esito dell'abbinamento delega per delega tra PDF e tabulato."""
+    abbinate: List[Tuple[RigaTabulato, DelegaF24, str]]
+    non_abbinate_txt: List[RigaTabulato]
+    non_abbinate_pdf: List[DelegaF24]
+
+    def per_cab(self, cab: str) -> Tuple[List[RigaTabulato], List[DelegaF24]]:
+        """Righe del tabulato e deleghe PDF non abbinate di un CAB."""
+        return (
+            [r for r in self.non_abbinate_txt if (r.cab or 'SCONOSCIUTO') == cab],
+            [d for d in self.non_abbinate_pdf if (d.cab or 'SCONOSCIUTO') == cab]
+        )
+
+    def non_esatte(self, cab: Optional[str] = None) -> List[Tuple[RigaTabulato, DelegaF24, str]]:
+        """Coppie abbinate con un criterio diverso da 'esatto' (di un CAB, se indicato)."""
+        return [
+            (r, d, criterio) for r, d, criterio in self.abbinate
+            if criterio != 'esatto' and (cab is None or cab in ((r.cab or 'SCONOSCIUTO'), (d.cab or 'SCONOSCIUTO')))
+        ]
+
+
+def differenza_una_cifra(a: int, b: int) -> bool:
+    """True se due importi in centesimi differiscono per una sola cifra (errore OCR tipico)."""
+    sa, sb = str(a), str(b)
+    return len(sa) == len(sb) and sum(x != y for x, y in zip(sa, sb)) == 1
+
+
+def distanza_cf(a: Optional[str], b: Optional[str]) -> int:
+    """Numero di caratteri diversi tra due codici fiscali della stessa lunghezza."""
+    if not a or not b or len(a) != len(b):
+        return len(a or b or '')
+    return sum(x != y for x, y in zip(a, b))
+
+
+def abbina_deleghe(
+    righe: List[RigaTabulato],
+    deleghe: List[DelegaF24],
+    tolleranza_cent: int = ABBINAMENTO_TOLLERANZA_CENT,
+    max_diff_cf: int = ABBINAMENTO_MAX_DIFF_CF
+) -> AbbinamentoDeleghe:
+    """
+    Abbina ogni delega estratta dai PDF alla sua riga nel tabulato.
+
+    Passaggi successivi, ciascuno su un indice hash delle sole righe ancora
+    libere (costo quasi lineare nel numero di deleghe):
+
+    1. ``esatto``: stessi CAB, CF e importo al centesimo
+    2. ``cab``: stessi CF e importo, CAB diverso o non letto
+    3. ``importo``: stesso CF (e stesso CAB, se letto), importo entro la
+       tolleranza o diverso per una sola cifra; le coppie sono assegnate
+       dalla più vicina
+    4. ``codice_fiscale``: stessi CAB e importo, CF non letto o diverso
+       per al massimo max_diff_cf caratteri
+
+    Args:
+        righe: Righe di dettaglio del tabulato
+        deleghe: Deleghe estratte dai PDF
+        tolleranza_cent: Scarto massimo di importo nel passaggio 3 (centesimi)
+        max_diff_cf: Caratteri diversi ammessi nel CF nel passaggio 4
+
+    Returns:
+        AbbinamentoDeleghe con le coppie e gli elementi non abbinati dei due lati
+    """
+    # Un LottoDeleghe crea un oggetto a ogni accesso: meglio materializzarlo una volta
+    deleghe = list(deleghe)
+    libere_txt = set(range(len(righe)))
+    libere_pdf = set(range(len(deleghe)))
+    abbinate: List[Tuple[RigaTabulato, DelegaF24, str]] = []
+
+    cent_txt = [r.importo_cent for r in righe]
+    cent_pdf = [d.importo_cent for d in deleghe]
+
+    def passaggio_esatto(chiave_txt, chiave_pdf, criterio: str) -> None:
+        indice: Dict[Any, List[int]] = defaultdict(list)
+        for i in sorted(libere_txt, reverse=True):
+            k = chiave_txt(i)
+            if k is not None:
+                indice[k].append(i)
+        for j in sorted(libere_pdf):
+            k = chiave_pdf(j)
+            candidati = indice.get(k) if k is not None else None
+            if candidati:
+                i = candidati.pop()
+                libere_txt.discard(i)
+                libere_pdf.discard(j)
+                abbinate.append((righe[i], deleghe[j], criterio))
+
+    def passaggio_vicino(chiave_txt, chiave_pdf, costo, criterio: str) -> None:
+        # Gruppi piccoli (stessa chiave): coppie ammesse ordinate per costo, assegnazione greedy
+        gruppi_txt: Dict[Any, List[int]] = defaultdict(list)
+        for i in libere_txt:
+            k = chiave_txt(i)
+            if k is not None:
+                gruppi_txt[k].append(i)
+        coppie = []
+        for j in libere_pdf:
+            k = chiave_pdf(j)
+            for i in gruppi_txt.get(k, ()) if k is not None else ():
+                c = costo(i, j)
+                if c is not None:
+                    coppie.append((c, i, j))
+        for _, i, j in sorted(coppie):
+            if i in libere_txt and j in libere_pdf:
+                libere_txt.discard(i)
+                libere_pdf.discard(j)
+                abbinate.append((righe[i], deleghe[j], criterio))
+
+    def cf_txt(i: int) -> str:
+        return righe[i].codice_fiscale
+
+    def cf_pdf(j: int) -> Optional[str]:
+        return deleghe[j].codice_fiscale
+
+    # 1. CAB + CF + importo
+    passaggio_esatto(
+        lambda i: (righe[i].cab, cf_txt(i), cent_txt[i]) if righe[i].cab else None,
+        lambda j: (deleghe[j].cab, cf_pdf(j), cent_pdf[j]) if cf_pdf(j) and cent_pdf[j] else None,
+        'esatto'
+    )
+    # 2. CF + importo (CAB letto male o assente)
+    passaggio_esatto(
+        lambda i: (cf_txt(i), cent_txt[i]),
+        lambda j: (cf_pdf(j), cent_pdf[j]) if cf_pdf(j) and cent_pdf[j] else None,
+        'cab'
+    )
+
+    # 3. CF (+ CAB se letto), importo vicino
+    def costo_importo(i: int, j: int) -> Optional[int]:
+        if not cent_pdf[j]:
+            return None
+        if righe[i].cab and deleghe[j].cab and righe[i].cab != deleghe[j].cab:
+            return None
+        scarto = abs(cent_txt[i] - cent_pdf[j])
+        if scarto <= tolleranza_cent or differenza_una_cifra(cent_txt[i], cent_pdf[j]):
+            return scarto
+        return None
+
+    passaggio_vicino(
+        cf_txt,
+        cf_pdf,
+        costo_importo,
+        'importo'
+    )
+
+    # 4. CAB + importo, CF vicino
+    def costo_cf(i: int, j: int) -> Optional[int]:
+        if not cf_pdf(j):
+            return max_diff_cf + 1
+        diff = distanza_cf(cf_txt(i), cf_pdf(j))
+        return diff if diff <= max_diff_cf else None
+
+    passaggio_vicino(
+        lambda i: (righe[i].cab, cent_txt[i]) if righe[i].cab else None,
+        lambda j: (deleghe[j].cab, cent_pdf[j]) if cent_pdf[j] else None,
+        costo_cf,
+        'codice_fiscale'
+    )
+
+    esito = AbbinamentoDeleghe(
+        abbinate=abbinate,
+        non_abbinate_txt=[righe[i] for i in sorted(libere_txt)],
+        non_abbinate_pdf=[deleghe[j] for j in sorted(libere_pdf)]
+    )
+    logger.info(
+        f"Abbinamento deleghe: {len(abbinate)} abbinate, "
+        f"{len(esito.non_abbinate_txt)} solo nel tabulato, {len(esito.non_abbinate_pdf)} solo nei PDF"
+    )
+    return esito
+
+
+@dataclass(slots=True)
+class VoceSpiegazione:
+    """Possibile causa elementare di una discrepanza di CAB."""
+    tipo: str  # 'abbinata', 'in_piu', 'duplicata', 'importo_ocr', 'mancante'
+    effetto_cent: int  # Quanto la causa sposta il totale PDF rispetto al tabulato
+    effetto_n: int  # Quanto la causa sposta il numero di deleghe PDF
+    delega: Optional[DelegaF24] = None
+    riga: Optional[RigaTabulato] = None
+    importo_corretto_cent: Optional[int] = None
+    criterio: Optional[str] = None  # Solo 'abbinata': criterio della coppia non esatta
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte in dizionario per l'export."""
+        voce: Dict[str, Any] = {'tipo': self.tipo}
+        if self.criterio is not None:
+            voce['criterio'] = self.criterio
+        if self.delega is not None:
+            voce.update(file=self.delega.file, pagina=self.delega.pagina,
+                        codice_fiscale=self.delega.codice_fiscale, importo_cent=self.delega.importo_cent)
+        if self.riga is not None and self.delega is not None:
+            # Coppia abbinata: i dati del tabulato accanto a quelli letti dal PDF
+            voce.update(riga=self.riga.riga, codice_fiscale_tabulato=self.riga.codice_fiscale,
+                        importo_tabulato_cent=self.riga.importo_cent, cab_tabulato=self.riga.cab,
+                        cab=self.delega.cab)
+        elif self.riga is not None:
+            voce.update(riga=self.riga.riga, codice_fiscale=self.riga.codice_fiscale,
+                        importo_cent=self.riga.importo_cent)
+        if self.importo_corretto_cent is not None:
+            voce['importo_corretto_cent'] = self.importo_corretto_cent
+        return voce
+
+
+def varianti_una_cifra(cent: int) -> Iterator[int]:
+    """Importi (in centesimi) ottenuti cambiando una sola cifra, come in una lettura OCR errata."""
+    cifre = str(cent)
+    for pos, originale in enumerate(cifre):
+        for c in '0123456789':
+            if c == originale or (pos == 0 and c == '0' and len(cifre) > 1):
+                continue
+            yield int(cifre[:pos] + c + cifre[pos + 1:])
+
+
+def voci_candidate(
+    deleghe: List[DelegaF24],
+    righe_mancanti: List[RigaTabulato],
+    varianti_ocr: bool = True,
+    abbinate: Iterable[DelegaF24] = ()
+) -> List[Tuple[int, int, int, str, Optional[int]]]:
+    """
+    Elenca le cause elementari con cui spiegare una discrepanza.
+
+    Args:
+        deleghe: Deleghe PDF del CAB
+        righe_mancanti: Righe del tabulato del CAB senza delega PDF
+        varianti_ocr: Includere gli importi letti male (una cifra diversa)
+        abbinate: Deleghe già abbinate al tabulato: non sono cause, ma una
+            delega uguale a una di esse è una duplicata
+
+    Returns:
+        Lista di tuple (elemento, effetto in centesimi, effetto sul numero
+        di deleghe, tipo, importo corretto in centesimi): elemento è
+        l'indice della delega (o len(deleghe) + indice della riga) e cause
+        dello stesso elemento si escludono a vicenda
+    """
+    voci: List[Tuple[int, int, int, str, Optional[int]]] = []
+    viste = {(d.codice_fiscale, d.importo_cent) for d in abbinate}
+    for idx, d in enumerate(deleghe):
+        cent = d.importo_cent
+        if not cent:
+            continue
+        chiave = (d.codice_fiscale, cent)
+        tipo = 'duplicata' if d.codice_fiscale and chiave in viste else 'in_piu'
+        viste.add(chiave)
+        voci.append((idx, cent, 1, tipo, None))
+        if varianti_ocr:
+            voci.extend((idx, cent - v, 0, 'importo_ocr', v) for v in varianti_una_cifra(cent))
+    for idx, r in enumerate(righe_mancanti, len(deleghe)):
+        voci.append((idx, -r.importo_cent, -1, 'mancante', None))
+    return voci
+
+
+def spiega_discrepanza(
+    deleghe: List[DelegaF24],
+    differenza_cent: int,
+    differenza_n: int,
+    righe_mancanti: Optional[List[RigaTabulato]] = None,
+    max_voci: int = SPIEGAZIONE_MAX_VOCI,
+    budget_s: float = SPIEGAZIONE_BUDGET_S,
+    abbinate: Iterable[DelegaF24] = ()
+) -> Tuple[List[VoceSpiegazione], int]:
+    """
+    Cerca il più piccolo insieme di cause che spiega esattamente la differenza di un CAB.
+
+    Le cause sono deleghe PDF in più o duplicate, importi letti con una
+    cifra sbagliata e (se il tabulato ha il dettaglio) righe senza delega
+    PDF. La ricerca procede per numero crescente di cause con un
+    meet-in-the-middle sugli importi in centesimi: per k cause si indicizzano
+    le somme delle combinazioni da k - k//2 elementi e si cercano i
+    complementi tra quelle da k//2. Per k >= 3 le varianti OCR sono escluse
+    (sarebbero troppe combinazioni). A parità di numero di cause vince la
+    combinazione coerente anche con la differenza nel numero di deleghe.
+
+    Args:
+        deleghe: Deleghe PDF del CAB
+        differenza_cent: Totale PDF meno totale tabulato, in centesimi
+        differenza_n: Numero deleghe PDF meno numero tabulato
+        righe_mancanti: Righe del tabulato del CAB non abbinate
+        max_voci: Numero massimo di cause in una spiegazione
+        budget_s: Tempo massimo di ricerca in secondi
+        abbinate: Deleghe del CAB già abbinate (escluse da deleghe), per
+            riconoscere le duplicate
+
+    Returns:
+        Tuple (cause della spiegazione migliore, numero di spiegazioni
+        alternative della stessa dimensione); lista vuota se non trovata
+    """
+    if differenza_cent == 0:
+        return [], 0
+
+    scadenza = time.monotonic() + budget_s
+    righe_mancanti = righe_mancanti or []
+    tutte = voci_candidate(deleghe, righe_mancanti, varianti_ocr=True, abbinate=abbinate)
+    # Senza varianti OCR ogni elemento compare una sola volta
+    semplici = [v for v in tutte if v[3] != 'importo_ocr']
+
+    def scaduto(n: int) -> bool:
+        return n % 4096 == 0 and time.monotonic() > scadenza
+
+    for k in range(1, max_voci + 1):
+        voci = tutte if k <= 2 else semplici
+        if len(voci) < k:
+            break
+        effetti = [v[1] for v in voci]
+        destra, sinistra = k - k // 2, k // 2
+
+        # Somme delle combinazioni della metà destra (poche per somma, per limitare la memoria)
+        indice: Dict[int, List[Tuple[int, ...]]] = defaultdict(list)
+        for n, combo in enumerate(combinations(range(len(voci)), destra)):
+            if scaduto(n):
+                return [], 0
+            candidati = indice[sum(map(effetti.__getitem__, combo))]
+            if len(candidati) < 16:
+                candidati.append(combo)
+
+        soluzioni: List[Tuple[int, ...]] = []
+        viste = set()
+        for n, combo in enumerate(combinations(range(len(voci)), sinistra)):
+            if scaduto(n) or len(soluzioni) >= 64:
+                break
+            for altra in indice.get(differenza_cent - sum(map(effetti.__getitem__, combo)), ()):
+                unione = tuple(sorted(combo + altra))
+                if unione in viste or len({voci[i][0] for i in unione}) < k:
+                    continue
+                viste.add(unione)
+                soluzioni.append(unione)
+
+        if soluzioni:
+            migliore = min(
+                soluzioni,
+                key=lambda s: (sum(voci[i][2] for i in s) != differenza_n,
+                               sum(voci[i][3] == 'importo_ocr' for i in s),
+                               -sum(voci[i][3] == 'duplicata' for i in s))
+            )
+            spiegazione = []
+            for i in migliore:
+                elemento, effetto_cent, effetto_n, tipo, corretto = voci[i]
+                spiegazione.append(VoceSpiegazione(
+                    tipo, effetto_cent, effetto_n,
+                    delega=deleghe[elemento] if elemento < len(deleghe) else None,
+                    riga=righe_mancanti[elemento - len(deleghe)] if elemento >= len(deleghe) else None,
+                    importo_corretto_cent=corretto
+                ))
+            return spiegazione, len(soluzioni) - 1
+
+    return [], 0
+
+
+def descrivi_voce(voce: VoceSpiegazione) -> str:
+    """Descrizione leggibile di una causa di discrepanza per il report console."""
+    if voce.tipo == 'abbinata':
+        r, d = voce.riga, voce.delega
+        dove = f"{d.codice_fiscale or 'CF N/D'}, {Path(d.file).name} pag. {d.pagina}"
+        if voce.criterio == 'cab':
+            return (f"delega letta con CAB {d.cab or 'N/D'} ({dove}), "
+                    f"nel tabulato CAB {r.cab} (riga {r.riga})")
+        return (f"importo letto €{(d.importo_cent or 0) / 100:,.2f} ({dove}), "
+                f"nel tabulato €{r.importo_cent / 100:,.2f} ({r.codice_fiscale}, riga {r.riga})")
+    if voce.riga is not None:
+        return (f"delega mancante nei PDF: {voce.riga.codice_fiscale} "
+                f"€{voce.riga.importo_cent / 100:,.2f} (riga {voce.riga.riga} del tabulato)")
+    d = voce.delega
+    dove = f"{Path(d.file).name} pag. {d.pagina}"
+    if voce.tipo == 'importo_ocr':
+        return (f"importo letto €{d.importo_cent / 100:,.2f}, "
+                f"probabilmente €{voce.importo_corretto_cent / 100:,.2f} "
+                f"({d.codice_fiscale or 'CF N/D'}, {dove})")
+    etichetta = 'delega duplicata' if voce.tipo == 'duplicata' else 'delega in più'
+    return f"{etichetta}: {d.codice_fiscale or 'CF N/D'} €{d.importo_cent / 100:,.2f} ({dove})"
+
+
+def descrivi_coppia(riga: RigaTabulato, d: DelegaF24, criterio: str) -> str:
+    """Descrizione leggibile di una coppia abbinata non esatta: i due lati affiancati."""
+    return (f"{criterio:<15} tabulato {riga.codice_fiscale:<18} €{riga.importo_cent / 100:>10,.2f} "
+            f"(riga {riga.riga})  ⇄  PDF {d.codice_fiscale or 'CF N/D':<18} "
+            f"€{(d.importo_cent or 0) / 100:>10,.2f} ({Path(d.file).name} pag. {d.pagina})")
+
+
+def spiega_discrepanze(
+    discrepanze: List[Dict],
+    abbinamento: Optional[AbbinamentoDeleghe] = None
+) -> None:
+    """
+    Aggiunge a ogni discrepanza la spiegazione trovata da spiega_discrepanza.
+
+    Con l'abbinamento le prime cause sono le coppie non esatte del CAB
+    (importo o CAB diversi tra tabulato e PDF); la ricerca di
+    spiega_discrepanza spiega solo la differenza che resta, con le deleghe
+    e le righe non abbinate.
+
+    Args:
+        discrepanze: Discrepanze di confronta_per_cab (modificate sul posto,
+            chiavi 'spiegazione' e 'spiegazioni_alternative')
+        abbinamento: Abbinamento delega per delega, se disponibile
+    """
+    for disc in discrepanze:
+        cab = disc['cab']
+        differenza_cent = disc['pdf']['totale_cent'] - disc['txt']['totale_cent']
+        differenza_n = disc['pdf']['n_deleghe'] - disc['txt']['n_deleghe']
+        if abbinamento is None:
+            voci, alternative = spiega_discrepanza(disc['pdf']['dettaglio'], differenza_cent, differenza_n)
+        else:
+            voci = []
+            for riga, d, criterio in abbinamento.non_esatte(cab):
+                nel_cab_pdf = (d.cab or 'SCONOSCIUTO') == cab
+                nel_cab_txt = (riga.cab or 'SCONOSCIUTO') == cab
+                effetto_cent = (d.importo_cent or 0) * nel_cab_pdf - riga.importo_cent * nel_cab_txt
+                effetto_n = int(nel_cab_pdf) - int(nel_cab_txt)
+                if effetto_cent or effetto_n:
+                    voci.append(VoceSpiegazione(
+                        'abbinata', effetto_cent, effetto_n, delega=d, riga=riga,
+                        importo_corretto_cent=riga.importo_cent, criterio=criterio
+                    ))
+            solo_txt, solo_pdf = abbinamento.per_cab(cab)
+            resto, alternative = spiega_discrepanza(
+                solo_pdf,
+                differenza_cent - sum(v.effetto_cent for v in voci),
+                differenza_n - sum(v.effetto_n for v in voci),
+                solo_txt,
+                abbinate=[d for _, d, _ in abbinamento.abbinate if (d.cab or 'SCONOSCIUTO') == cab]
+            )
+            voci.extend(resto)
+        disc['spiegazione'] = voci
+        disc['spiegazioni_alternative'] = alternative
+        if voci:
+            logger.debug(f"CAB {disc['cab']}: spiegazione con {len(voci)} cause ({alternative} alternative)")
+
+
+def genera_report_console(
+    tabulato: RisultatoTabulato,
+    tutte_deleghe: LottoDeleghe,
+    discrepanze: List[Dict],
+    ok_count: int,
+    per_cab_pdf: Dict,
+    abbinamento: Optional[AbbinamentoDeleghe] = None,
+    prefiltro: Optional[Dict[str, Any]] = None
+) -> None:
+    """Genera il report su console."""
+
+    print("\n" + "=" * 70)
+    print("RICONCILIAZIONE F24 CARTACEE")
+    print("=" * 70)
+    print(f"Eseguito: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+    print(f"Data tabulato: {tabulato.data}")
+
+    if tabulato.totale:
+        print(f"Totale atteso: {tabulato.totale.n_deleghe} deleghe, "
+              f"€{tabulato.totale.totale_cent / 100:,.2f}")
+
+    duplicati = tutte_deleghe.duplicati()
+    print(f"Totale estratto: {len(tutte_deleghe) - len(duplicati)} deleghe"
+          + (f" (più {len(duplicati)} duplicate, escluse dal confronto)" if duplicati else ""))
+
+    # Confronto per CAB
+    print("\n" + "=" * 70)
+    print("CONFRONTO PER CAB")
+    print("=" * 70)
+
+    print(f"\n{'CAB':<8} {'TXT N.':<8} {'TXT €':>12} {'PDF N.':<8} {'PDF €':>12} {'ESITO':<8}")
+    print("-" * 70)
+
+    tutti_cab = set(tabulato.per_cab.keys()) | set(per_cab_pdf.keys())
+
+    for cab in sorted(tutti_cab):
+        txt_data = tabulato.per_cab.get(cab, DatiCAB(n_deleghe=0, totale_cent=0))
+        pdf_data = per_cab_pdf.get(cab, {'n_deleghe': 0, 'totale_cent': 0})
+
+        n_txt = txt_data.n_deleghe
+        tot_txt = txt_data.totale_cent
+        n_pdf = pdf_data['n_deleghe']
+        tot_pdf = pdf_data['totale_cent']
+
+        if n_txt == 0 and n_pdf == 0:
+            continue
+
+        esito = "✅ OK" if (n_txt == n_pdf and tot_txt == tot_pdf) else "❌ DIFF"
+
+        print(f"{cab:<8} {n_txt:<8} {tot_txt / 100:>12,.2f} {n_pdf:<8} {tot_pdf / 100:>12,.2f} {esito:<8}")
+
+    # Totali
+    tot_n_pdf = len(tutte_deleghe) - len(duplicati)
+    tot_importo_pdf = tutte_deleghe.totale_cent()
+
+    print("-" * 70)
+    if tabulato.totale:
+        print(f"{'TOTALE':<8} {tabulato.totale.n_deleghe:<8} "
+              f"{tabulato.totale.totale_cent / 100:>12,.2f} "
+              f"{tot_n_pdf:<8} {tot_importo_pdf / 100:>12,.2f}")
+
+    # Riepilogo
+    print("\n" + "=" * 70)
     print("RIEPILOGO")
     print("=" * 70)
     print(f"   CAB corrispondenti:    {ok_count}")
     print(f"   CAB con discrepanze:   {len(discrepanze)}")
+    if abbinamento:
+        print(f"   Deleghe abbinate:      {len(abbinamento.abbinate)}")
+        print(f"   Solo nel tabulato:     {len(abbinamento.non_abbinate_txt)}")
+        print(f"   Solo nei PDF:          {len(abbinamento.non_abbinate_pdf)}")
+        print(f"   Abbinate non esatte:   {len(abbinamento.non_esatte())}")
+    if duplicati:
+        print(f"   Deleghe duplicate:     {len(duplicati)}")
+    if prefiltro:
+        evitati = prefiltro['secondi_ocr_evitati']
+        print(f"   Pagine senza OCR:      {prefiltro['pagine_bianche'] + prefiltro['pagine_separatori']} "
+              f"({prefiltro['pagine_bianche']} bianche, {prefiltro['pagine_separatori']} separatori"
+              + (f", circa {evitati:.1f} s di OCR evitati" if evitati is not None else "")
+              + f", prefiltro {prefiltro['secondi_prefiltro']:.1f} s)")
+
+    # Copie della stessa delega (stesso file o stessa scansione inviati più volte)
+    if duplicati:
+        print("\n" + "=" * 70)
+        print("DELEGHE DUPLICATE (escluse da totali e abbinamento)")
+        print("=" * 70)
+        for i in duplicati[:10]:
+            d = tutte_deleghe[i]
+            print(f"   {Path(d.file).name} pag. {d.pagina}  =  {d.duplicato_di}  "
+                  f"{d.codice_fiscale or 'CF N/D':<18} €{(d.importo_cent or 0) / 100:>10,.2f}")
+        if len(duplicati) > 10:
+            print(f"   ... e altre {len(duplicati) - 10} deleghe")
+
+    # Coppie abbinate con importo, CAB o codice fiscale diversi tra tabulato e PDF
+    non_esatte = abbinamento.non_esatte() if abbinamento else []
+    if non_esatte:
+        print("\n" + "=" * 70)
+        print("ABBINAMENTI NON ESATTI (tabulato ⇄ PDF)")
+        print("=" * 70)
+        for riga, d, criterio in non_esatte:
+            print(f"   {descrivi_coppia(riga, d, criterio)}")
 
     # Dettaglio discrepanze
     if discrepanze:
@@ -554,81 +4154,543 @@ def genera_report_console(
 
         for disc in discrepanze:
             diff_n = disc['pdf']['n_deleghe'] - disc['txt']['n_deleghe']
-            diff_tot = disc['pdf']['totale'] - disc['txt']['totale']
+            diff_tot = (disc['pdf']['totale_cent'] - disc['txt']['totale_cent']) / 100
 
             print(f"\n🔍 CAB {disc['cab']}:")
-            print(f"   Tabulato: {disc['txt']['n_deleghe']} deleghe, €{disc['txt']['totale']:,.2f}")
-            print(f"   PDF:      {disc['pdf']['n_deleghe']} deleghe, €{disc['pdf']['totale']:,.2f}")
+            print(f"   Tabulato: {disc['txt']['n_deleghe']} deleghe, €{disc['txt']['totale_cent'] / 100:,.2f}")
+            print(f"   PDF:      {disc['pdf']['n_deleghe']} deleghe, €{disc['pdf']['totale_cent'] / 100:,.2f}")
             print(f"   Diff:     {diff_n:+d} deleghe, €{diff_tot:+,.2f}")
 
-            if disc['pdf']['dettaglio']:
-                print("   Deleghe PDF:")
-                for d in disc['pdf']['dettaglio'][:10]:  # Limita a 10
-                    print(f"      • {d.codice_fiscale or 'CF N/D':<18} "
-                          f"€{d.importo or 0:>10,.2f}  {d.data_pagamento or ''}")
+            if disc.get('spiegazione'):
+                alternative = disc.get('spiegazioni_alternative', 0)
+                print("   Possibile causa" + (f" ({alternative} alternative):" if alternative else ":"))
+                for voce in disc['spiegazione']:
+                    print(f"      ⇒ {descrivi_voce(voce)}")
+
+            if abbinamento:
+                solo_txt, solo_pdf = abbinamento.per_cab(disc['cab'])
+                coppie = abbinamento.non_esatte(disc['cab'])
+                for riga, d, criterio in coppie[:10]:
+                    print(f"      ≈ {descrivi_coppia(riga, d, criterio)}")
+                for riga in solo_txt[:10]:
+                    print(f"      − {riga.codice_fiscale:<18} €{riga.importo_cent / 100:>10,.2f}  "
+                          f"solo nel tabulato (riga {riga.riga})")
+                for d in solo_pdf[:10]:
+                    print(f"      + {d.codice_fiscale or 'CF N/D':<18} €{(d.importo_cent or 0) / 100:>10,.2f}  "
+                          f"solo nei PDF ({Path(d.file).name} pag. {d.pagina})")
+                if not solo_txt and not solo_pdf:
+                    print("   Tutte le deleghe abbinate: differenza dovuta alle coppie non esatte (≈)")
+            elif disc['pdf']['dettaglio']:
+                print("   Deleghe PDF:")
+                for d in disc['pdf']['dettaglio'][:10]:  # Limita a 10
+                    print(f"      • {d.codice_fiscale or 'CF N/D':<18} "
+                          f"€{(d.importo_cent or 0) / 100:>10,.2f}  {d.data_pagamento or ''}")
+
+                if len(disc['pdf']['dettaglio']) > 10:
+                    print(f"      ... e altre {len(disc['pdf']['dettaglio']) - 10} deleghe")
+
+
+def esporta_csv(deleghe: Iterable[DelegaF24], output_file: str) -> None:
+    """
+    Esporta le deleghe in formato CSV.
+
+    Args:
+        deleghe: Lista di deleghe da esportare
+        output_file: Percorso file di output
+    """
+    try:
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=[
+                'cab', 'codice_fiscale', 'importo', 'data_pagamento',
+                'filiale', 'file', 'pagina', 'duplicato_di'
+            ])
+            writer.writeheader()
+
+            righe = deleghe.righe() if isinstance(deleghe, LottoDeleghe) else (d.to_dict() for d in deleghe)
+            for riga in righe:
+                cent = riga.pop('importo_cent')
+                riga['importo'] = formatta_importo(cent) if cent is not None else ''
+                writer.writerow(riga)
+
+        logger.info(f"Export CSV completato: {output_file}")
+    except Exception as e:
+        logger.error(f"Errore export CSV: {e}")
+
+
+def esporta_json(risultati: Dict[str, Any], output_file: str) -> None:
+    """
+    Esporta i risultati completi in formato JSON.
+
+    Args:
+        risultati: Dizionario con tutti i risultati
+        output_file: Percorso file di output
+    """
+    try:
+        # Converti oggetti non serializzabili
+        def convert_to_serializable(obj):
+            if isinstance(obj, LottoDeleghe):
+                return list(obj.righe())
+            if isinstance(obj, (DelegaF24, DatiCAB, RigaTabulato, VoceSpiegazione)):
+                return obj.to_dict() if hasattr(obj, 'to_dict') else asdict(obj)
+            elif isinstance(obj, RisultatoTabulato):
+                return {
+                    'data': obj.data,
+                    'per_cab': {k: asdict(v) for k, v in obj.per_cab.items()},
+                    'totale': asdict(obj.totale) if obj.totale else None,
+                    'n_righe_dettaglio': len(obj.righe)
+                }
+            return obj
+
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(risultati, f, indent=2, ensure_ascii=False, default=convert_to_serializable)
+
+        logger.info(f"Export JSON completato: {output_file}")
+    except Exception as e:
+        logger.error(f"Errore export JSON: {e}")
+
+
+# Formati di export scritti in streaming durante l'estrazione
+FORMATI_STREAMING = ('jsonl', 'parquet')
+
+
+class EsportazioneStreaming:
+    """Export scritto file per file durante l'estrazione."""
+
+    def scrivi(self, deleghe: List[DelegaF24]) -> None:
+        """Scrive le deleghe di un file."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Completa e chiude l'export."""
+        raise NotImplementedError
+
+    def __enter__(self) -> 'EsportazioneStreaming':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class EsportazioneJSONL(EsportazioneStreaming):
+    """
+    Export in streaming in formato JSON Lines: una delega per riga.
+
+    Le deleghe di ogni file vengono scritte e rese persistenti appena
+    estratte, quindi il file è leggibile durante l'elaborazione e dopo
+    un'interruzione contiene tutti i file completati.
+    """
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.n_deleghe = 0
+        self._f = open(output_file, 'w', encoding='utf-8')
+
+    def scrivi(self, deleghe: List[DelegaF24]) -> None:
+        """Scrive le deleghe di un file."""
+        with METRICHE.fase('export', n=len(deleghe)):
+            for d in deleghe:
+                self._f.write(json.dumps(d.to_dict(), ensure_ascii=False))
+                self._f.write('\n')
+                self.n_deleghe += 1
+            self._f.flush()
+
+    def close(self) -> None:
+        """Chiude il file."""
+        if not self._f.closed:
+            self._f.close()
+            logger.info(f"Export JSON Lines completato: {self.output_file} ({self.n_deleghe} deleghe)")
+
+
+class EsportazioneParquet(EsportazioneStreaming):
+    """
+    Export in streaming in formato Parquet (richiede pyarrow).
+
+    Le deleghe sono accumulate in colonne e scritte a gruppi di righe; il
+    file viene scritto con un nome temporaneo e rinominato alla chiusura,
+    perché un Parquet senza footer non è leggibile.
+    """
+
+    RIGHE_PER_GRUPPO = 50000
+
+    def __init__(self, output_file: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Export Parquet non disponibile: installare pyarrow (pip install pyarrow)")
+
+        self.pa = pyarrow
+        self.output_file = output_file
+        self.n_deleghe = 0
+        self.schema = pyarrow.schema([
+            ('file', pyarrow.string()),
+            ('pagina', pyarrow.int32()),
+            ('codice_fiscale', pyarrow.string()),
+            ('importo_cent', pyarrow.int64()),
+            ('cab', pyarrow.string()),
+            ('filiale', pyarrow.string()),
+            ('data_pagamento', pyarrow.string()),
+            ('duplicato_di', pyarrow.string()),
+        ])
+        self._tmp = output_file + '.tmp'
+        self._writer = pyarrow.parquet.ParquetWriter(self._tmp, self.schema)
+        self._colonne: Dict[str, List[Any]] = {nome: [] for nome in self.schema.names}
+
+    def _scarica(self) -> None:
+        if self._colonne['file']:
+            self._writer.write_table(self.pa.Table.from_pydict(self._colonne, schema=self.schema))
+            for colonna in self._colonne.values():
+                colonna.clear()
+
+    def scrivi(self, deleghe: List[DelegaF24]) -> None:
+        """Accoda le deleghe di un file; scrive un gruppo di righe quando è pieno."""
+        with METRICHE.fase('export', n=len(deleghe)):
+            for d in deleghe:
+                for nome, valore in d.to_dict().items():
+                    self._colonne[nome].append(valore)
+                self.n_deleghe += 1
+            if len(self._colonne['file']) >= self.RIGHE_PER_GRUPPO:
+                self._scarica()
+
+    def close(self) -> None:
+        """Scrive le righe rimaste, chiude il file e lo rinomina."""
+        if self._writer is None:
+            return
+        self._scarica()
+        self._writer.close()
+        self._writer = None
+        os.replace(self._tmp, self.output_file)
+        logger.info(f"Export Parquet completato: {self.output_file} ({self.n_deleghe} deleghe)")
+
+
+def apri_esportazione(output_file: str, output_format: str) -> EsportazioneStreaming:
+    """
+    Apre un export in streaming.
+
+    Args:
+        output_file: Percorso file di output
+        output_format: 'jsonl' o 'parquet'
+
+    Returns:
+        Esportazione su cui chiamare scrivi() per ogni file e close() alla fine
+    """
+    if output_format == 'parquet':
+        return EsportazioneParquet(output_file)
+    return EsportazioneJSONL(output_file)
+
+
+def confronta_per_cab(
+    tabulato: RisultatoTabulato,
+    tutte_deleghe: LottoDeleghe
+) -> Tuple[Dict[str, Dict[str, Any]], List[Dict], int, set]:
+    """
+    Raggruppa le deleghe per CAB e le confronta con il tabulato.
+
+    Args:
+        tabulato: Tabulato parsato
+        tutte_deleghe: Deleghe estratte dai PDF
+
+    Returns:
+        Tuple (numero, totale e indici delle deleghe per CAB, discrepanze,
+        numero CAB OK, tutti i CAB)
+    """
+    # Raggruppa per CAB sulle colonne del lotto (importi in centesimi: somme esatte)
+    per_cab_pdf = {
+        cab: {'n_deleghe': len(indici), 'totale_cent': totale, 'indici': indici}
+        for cab, (indici, totale) in tutte_deleghe.per_cab().items()
+    }
+
+    # Confronto
+    discrepanze = []
+    ok_count = 0
+
+    tutti_cab = set(tabulato.per_cab.keys()) | set(per_cab_pdf.keys())
+
+    for cab in tutti_cab:
+        txt_data = tabulato.per_cab.get(cab, DatiCAB(n_deleghe=0, totale_cent=0))
+        pdf_data = per_cab_pdf.get(cab, {'n_deleghe': 0, 'totale_cent': 0, 'indici': []})
+
+        n_txt = txt_data.n_deleghe
+        tot_txt = txt_data.totale_cent
+        n_pdf = pdf_data['n_deleghe']
+        tot_pdf = pdf_data['totale_cent']
+
+        if n_txt == 0 and n_pdf == 0:
+            continue
+
+        if n_txt == n_pdf and tot_txt == tot_pdf:
+            ok_count += 1
+        else:
+            discrepanze.append({
+                'cab': cab,
+                'txt': {'n_deleghe': n_txt, 'totale_cent': tot_txt},
+                'pdf': {
+                    'n_deleghe': n_pdf,
+                    'totale_cent': tot_pdf,
+                    'dettaglio': [tutte_deleghe[i] for i in pdf_data['indici']]
+                }
+            })
+
+    return per_cab_pdf, discrepanze, ok_count, tutti_cab
+
+
+def riepilogo_prefiltro() -> Optional[Dict[str, Any]]:
+    """
+    Riassume le pagine scartate dal prefiltro prima dell'OCR (contatori di METRICHE).
+
+    Returns:
+        Pagine bianche e separatori scartati, tempo del prefiltro e stima
+        dei secondi di OCR evitati (tempo medio di OCR per pagina della
+        riconciliazione); None se nessuna pagina è stata scartata
+    """
+    contatori = METRICHE.contatori
+    bianche = int(contatori.get('scartate_bianca', 0))
+    separatori = int(contatori.get('scartate_separatore', 0))
+    if not bianche and not separatori:
+        return None
+    pagine_ocr = contatori.get('pagine_ocr', 0)
+    return {
+        'pagine_bianche': bianche,
+        'pagine_separatori': separatori,
+        'secondi_prefiltro': contatori.get('secondi_prefiltro', 0.0),
+        'secondi_ocr_evitati': (
+            (bianche + separatori) * contatori['secondi_ocr'] / pagine_ocr if pagine_ocr else None
+        )
+    }
+
+
+def componi_risultati(
+    tabulato: RisultatoTabulato,
+    tutte_deleghe: LottoDeleghe,
+    discrepanze: List[Dict],
+    ok_count: int,
+    tutti_cab: set,
+    n_pdf: int,
+    abbinamento: Optional[AbbinamentoDeleghe] = None,
+    prefiltro: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Compone il dizionario dei risultati della riconciliazione (report ed export)."""
+    risultati = {
+        'timestamp': datetime.now().isoformat(),
+        'tabulato': tabulato,
+        'deleghe_pdf': tutte_deleghe,
+        'discrepanze': discrepanze,
+        'ok_count': ok_count,
+        'statistiche': {
+            'n_cab_analizzati': len(tutti_cab),
+            'n_pdf_elaborati': n_pdf,
+            'n_deleghe_estratte': len(tutte_deleghe),
+            'n_deleghe_duplicate': len(tutte_deleghe.duplicati()),
+            'importo_totale_pdf_cent': tutte_deleghe.totale_cent(),
+            'importo_totale_txt_cent': tabulato.totale.totale_cent if tabulato.totale else 0
+        }
+    }
+    if prefiltro:
+        risultati['statistiche']['prefiltro'] = prefiltro
+    if abbinamento:
+        per_criterio: Dict[str, int] = defaultdict(int)
+        for _, _, criterio in abbinamento.abbinate:
+            per_criterio[criterio] += 1
+        risultati['abbinamento'] = {
+            'n_abbinate': len(abbinamento.abbinate),
+            'per_criterio': dict(per_criterio),
+            'non_esatte': [
+                {'criterio': criterio, 'tabulato': riga, 'pdf': d}
+                for riga, d, criterio in abbinamento.non_esatte()
+            ],
+            'non_abbinate_txt': abbinamento.non_abbinate_txt,
+            'non_abbinate_pdf': abbinamento.non_abbinate_pdf
+        }
+    return risultati
+
+
+def ordina_duplicati(per_file: Dict[str, List[DelegaF24]]) -> int:
+    """
+    Sceglie in modo deterministico l'originale di ogni gruppo di pagine uguali.
 
-                if len(disc['pdf']['dettaglio']) > 10:
-                    print(f"      ... e altre {len(disc['pdf']['dettaglio']) - 10} deleghe")
+    Durante l'estrazione l'originale è la prima pagina registrata
+    nell'indice, che con più processi dipende da quale job arriva prima.
+    Le pagine collegate da duplicato_di formano un gruppo; l'originale
+    diventa la pagina presente più bassa in ordine di (file, pagina), come
+    nell'elaborazione sequenziale, e le altre ne sono copie. Una pagina il
+    cui originale non è più presente (file eliminato) torna così a contare.
+    Le copie hanno lo stesso testo, quindi le deleghe non cambiano.
 
+    Args:
+        per_file: Deleghe per file (modificate sul posto)
 
-def esporta_csv(deleghe: List[DelegaF24], output_file: str) -> None:
+    Returns:
+        Numero di deleghe il cui duplicato_di è cambiato
     """
-    Esporta le deleghe in formato CSV.
+    padre: Dict[str, str] = {}
+
+    def radice(origine: str) -> str:
+        while padre.setdefault(origine, origine) != origine:
+            padre[origine] = padre[padre[origine]]
+            origine = padre[origine]
+        return origine
+
+    posizione: Dict[str, Tuple[str, int]] = {}
+    deleghe = [d for lista in per_file.values() for d in lista]
+    for d in deleghe:
+        origine = f"{os.path.basename(d.file)} pag. {d.pagina}"
+        posizione[origine] = (os.path.basename(d.file), d.pagina)
+        if d.duplicato_di:
+            padre[radice(origine)] = radice(d.duplicato_di)
+
+    # Originale di ogni gruppo: la pagina presente più bassa
+    originali: Dict[str, str] = {}
+    for origine in sorted(posizione, key=posizione.__getitem__):
+        originali.setdefault(radice(origine), origine)
+
+    cambiate = 0
+    for d in deleghe:
+        origine = f"{os.path.basename(d.file)} pag. {d.pagina}"
+        originale = originali[radice(origine)]
+        duplicato_di = None if originale == origine else originale
+        if d.duplicato_di != duplicato_di:
+            d.duplicato_di = duplicato_di
+            cambiate += 1
+    return cambiate
+
+
+def separa_copie_orfane(per_file: Dict[str, List[DelegaF24]]) -> List[str]:
+    """
+    Toglie dai PDF invariati quelli con pagine copia di un file che non lo è.
+
+    Il duplicato_di registrato nel manifest vale solo finché l'originale
+    resta invariato: se è stato eliminato o modificato la copia va
+    rielaborata (come in --watch alla rimozione di un file), così torna a
+    contare o si ricollega alla nuova versione tramite l'indice.
 
     Args:
-        deleghe: Lista di deleghe da esportare
-        output_file: Percorso file di output
-    """
-    try:
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=[
-                'cab', 'codice_fiscale', 'importo', 'data_pagamento',
-                'filiale', 'file', 'pagina'
-            ])
-            writer.writeheader()
+        per_file: Deleghe dei PDF invariati per file (modificato sul posto)
 
-            for d in deleghe:
-                writer.writerow(d.to_dict())
+    Returns:
+        PDF tolti da per_file, da rielaborare
+    """
+    orfane: List[str] = []
+    while True:
+        invariati = {os.path.basename(p) for p in per_file}
+        nuove = [
+            p for p, deleghe in per_file.items()
+            if any(d.duplicato_di and d.duplicato_di.rsplit(' pag. ', 1)[0] not in invariati for d in deleghe)
+        ]
+        if not nuove:
+            return orfane
+        for p in nuove:
+            del per_file[p]
+        orfane.extend(nuove)
+
+
+def semina_indice_duplicati(
+    indice: IndiceDuplicati,
+    cache: CacheOCR,
+    manifest: ManifestPDF,
+    invariati: Dict[str, List[DelegaF24]],
+    risoluzioni: Iterable[int],
+    variante: str
+) -> int:
+    """
+    Registra nell'indice dei duplicati le pagine dei PDF invariati.
 
-        logger.info(f"Export CSV completato: {output_file}")
-    except Exception as e:
-        logger.error(f"Errore export CSV: {e}")
+    In modalità incrementale i PDF invariati non passano dall'OCR e le
+    loro pagine non entrerebbero nell'indice: una loro pagina riscansionata
+    in un file nuovo risulterebbe originale e verrebbe contata due volte.
+    Si registrano le pagine con deleghe (non duplicate) di cui la cache OCR
+    ha la firma, con il testo in cache se presente.
 
+    Args:
+        indice: Indice dei duplicati della riconciliazione
+        cache: Cache OCR con le firme delle pagine
+        manifest: Manifest della modalità incrementale
+        invariati: Deleghe registrate dei PDF invariati, per file
+        risoluzioni: DPI a cui le pagine possono essere state riconosciute
+            (con OCR adattivo sia dpi_rapido sia dpi)
+        variante: Variante OCR (vedi variante_ocr)
 
-def esporta_json(risultati: Dict[str, Any], output_file: str) -> None:
+    Returns:
+        Numero di pagine registrate
     """
-    Esporta i risultati completi in formato JSON.
+    registrate = 0
+    for pdf_path, deleghe in invariati.items():
+        file_hash = manifest.sha256(pdf_path)
+        if not file_hash:
+            continue
+        nome = os.path.basename(pdf_path)
+        for page_num in sorted({d.pagina for d in deleghe if d.duplicato_di is None}):
+            for dpi in risoluzioni:
+                firma = cache.get_firma(CacheOCR.chiave_firma(file_hash, page_num, dpi))
+                if firma is None:
+                    continue
+                testo = cache.get(CacheOCR.chiave(file_hash, page_num, dpi, variante=variante))
+                indice.registra(f"{dpi}:{variante}", firma, f"{nome} pag. {page_num}", testo)
+                registrate += 1
+    return registrate
+
+
+def separa_pdf_duplicati(
+    pdf_files: List[Path],
+    da_elaborare: List[Path],
+    manifest: Optional[ManifestPDF] = None
+) -> Tuple[List[Path], Dict[str, str]]:
+    """
+    Trova i PDF identici byte per byte ad altri (stesso file inviato due volte).
+
+    I file invariati del manifest contano come originali (il loro hash è
+    già registrato); tra i file da elaborare l'originale è il primo in
+    ordine di nome.
 
     Args:
-        risultati: Dizionario con tutti i risultati
-        output_file: Percorso file di output
-    """
-    try:
-        # Converti oggetti non serializzabili
-        def convert_to_serializable(obj):
-            if isinstance(obj, (DelegaF24, DatiCAB)):
-                return obj.to_dict() if hasattr(obj, 'to_dict') else asdict(obj)
-            elif isinstance(obj, RisultatoTabulato):
-                return {
-                    'data': obj.data,
-                    'per_cab': {k: asdict(v) for k, v in obj.per_cab.items()},
-                    'totale': asdict(obj.totale) if obj.totale else None
-                }
-            return obj
+        pdf_files: Tutti i PDF della cartella
+        da_elaborare: PDF da elaborare, in ordine
+        manifest: Manifest della modalità incrementale (opzionale)
 
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(risultati, f, indent=2, ensure_ascii=False, default=convert_to_serializable)
+    Returns:
+        Tuple (PDF da elaborare senza le copie, copia -> PDF originale)
+    """
+    originali: Dict[str, str] = {}
+    if manifest is not None:
+        nuovi = set(da_elaborare)
+        for pdf_file in pdf_files:
+            file_hash = manifest.sha256(str(pdf_file)) if pdf_file not in nuovi else None
+            if file_hash:
+                originali.setdefault(file_hash, str(pdf_file))
+
+    copie: Dict[str, str] = {}
+    for pdf_file in da_elaborare:
+        try:
+            file_hash = calcola_hash_file(str(pdf_file))
+        except OSError as e:
+            logger.warning(f"Hash non calcolabile per {pdf_file.name}: {e}")
+            continue
+        originale = originali.setdefault(file_hash, str(pdf_file))
+        if originale != str(pdf_file):
+            copie[str(pdf_file)] = originale
 
-        logger.info(f"Export JSON completato: {output_file}")
-    except Exception as e:
-        logger.error(f"Errore export JSON: {e}")
+    return [p for p in da_elaborare if str(p) not in copie], copie
 
 
 def riconcilia(
     tabulato_path: str,
     pdf_folder: str,
     output_file: Optional[str] = None,
-    output_format: str = 'console'
+    output_format: str = 'console',
+    workers: int = 1,
+    cache_dir: Optional[str] = OCR_CACHE_DIR,
+    dpi: int = OCR_DPI,
+    dpi_rapido: Optional[int] = None,
+    roi: Optional[str] = None,
+    manifest_path: Optional[str] = None,
+    tabulato: Optional[RisultatoTabulato] = None,
+    profilo: bool = False,
+    metriche_file: Optional[str] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    duplicati: bool = True,
+    prefiltro: bool = True,
+    coda_pagine: int = PIPELINE_CODA_PAGINE,
+    pool: Optional[ProcessPoolExecutor] = None,
+    coda_lavori: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Esegue la riconciliazione completa.
@@ -637,113 +4699,850 @@ def riconcilia(
         tabulato_path: Percorso file tabulato TXT
         pdf_folder: Cartella contenente i PDF
         output_file: File di output (opzionale)
-        output_format: Formato output (console, json, csv)
+        output_format: Formato output (console, json, csv, jsonl, parquet);
+            jsonl e parquet vengono scritti file per file durante l'estrazione
+        workers: Numero di processi per l'OCR parallelo (1 = un solo processo,
+            con rasterizzazione, OCR ed estrazione sovrapposti)
+        cache_dir: Cartella della cache OCR (None = cache disattivata)
+        dpi: Risoluzione per l'OCR
+        dpi_rapido: Risoluzione del primo passaggio OCR adattivo (None = disattivato)
+        roi: Layout F24 per l'OCR a riquadri (None = OCR a pagina intera)
+        manifest_path: Manifest per la modalità incrementale: vengono
+            elaborati solo i PDF nuovi o modificati (None = tutti)
+        tabulato: Sezione del tabulato già letta (None = parsa tabulato_path)
+        profilo: Misura i tempi per fase e stampa il profilo alla fine
+        metriche_file: File JSON in cui salvare le metriche del profilo
+        preelabora: Passi di preelaborazione delle scansioni prima dell'OCR
+            (None = immagini passate a Tesseract così come rasterizzate)
+        duplicati: Riconosce i PDF e le pagine scansionate duplicati: i PDF
+            identici non vengono rielaborati, le pagine copia saltano l'OCR;
+            le loro deleghe sono segnalate ed escluse dal confronto
+        prefiltro: Scarta prima dell'OCR le pagine scansionate bianche e i
+            separatori; pagine e secondi risparmiati sono nel riepilogo
+        coda_pagine: Con workers = 1, pagine rasterizzate in attesa di OCR
+            nella pipeline (vedi PipelineEstrazione)
+        pool: Con workers > 1, pool di processi già avviato da riusare
+            (vedi Riconciliatore); se assente ne viene avviato uno
+        coda_lavori: Coda di lavoro SQLite su una cartella condivisa: i PDF
+            sono divisi in shard elaborati da `workers` processi locali e
+            dai worker di altri host (vedi estrai_deleghe_distribuito)
 
     Returns:
-        Dizionario con i risultati della riconciliazione
+        Dizionario con i risultati della riconciliazione (con profilo attivo,
+        le metriche sono nella chiave 'metriche')
     """
 
     logger.info("Inizio riconciliazione F24 cartacee")
+    inizio = time.perf_counter()
+    METRICHE.attive = profilo
+    METRICHE.azzera()
 
     # 1. Parsa tabulato
-    try:
-        tabulato = parse_tabulato_txt(tabulato_path)
-    except Exception as e:
-        logger.error(f"Errore parsing tabulato: {e}")
-        raise
+    if tabulato is None:
+        try:
+            tabulato = parse_tabulato_txt(tabulato_path)
+        except Exception as e:
+            logger.error(f"Errore parsing tabulato: {e}")
+            raise
 
     # 2. Scansiona PDF
     pdf_folder_path = Path(pdf_folder)
     if not pdf_folder_path.exists():
         raise FileNotFoundError(f"Cartella PDF non trovata: {pdf_folder}")
 
-    pdf_files = list(pdf_folder_path.glob("*.pdf")) + list(pdf_folder_path.glob("*.PDF"))
+    pdf_files = sorted(list(pdf_folder_path.glob("*.pdf")) + list(pdf_folder_path.glob("*.PDF")))
     logger.info(f"Trovati {len(pdf_files)} file PDF")
 
-    tutte_deleghe: List[DelegaF24] = []
+    tutte_deleghe = LottoDeleghe()
+
+    # Deleghe per file, nell'ordine di pdf_files
+    per_file: Dict[str, List[DelegaF24]] = {}
+    da_elaborare = pdf_files
+
+    manifest = None
+    if manifest_path:
+        manifest = ManifestPDF(
+            manifest_path,
+            {'dpi': dpi, 'dpi_rapido': dpi_rapido, 'roi': roi,
+             'preelabora': list(preelabora) if preelabora else None, 'duplicati': duplicati,
+             'prefiltro': prefiltro}
+        )
+        rimossi = manifest.rimuovi_assenti([str(p) for p in pdf_files])
+        da_elaborare = []
+        for pdf_file in pdf_files:
+            registrate = manifest.get(str(pdf_file))
+            if registrate is None:
+                da_elaborare.append(pdf_file)
+            else:
+                per_file[str(pdf_file)] = registrate
+        orfane = separa_copie_orfane(per_file)
+        if orfane:
+            logger.info(f"{len(orfane)} PDF invariati con pagine copia di file modificati o rimossi: rielaborati")
+            da_elaborare = [p for p in pdf_files if str(p) not in per_file]
+        logger.info(
+            f"Modalità incrementale: {len(da_elaborare)} PDF nuovi o modificati, "
+            f"{len(per_file)} invariati, {rimossi} rimossi dal manifest"
+        )
+
+    if cache_dir:
+        logger.info(f"Cache OCR: {cache_dir}")
+    if dpi_rapido:
+        logger.info(f"OCR adattivo: {dpi_rapido} DPI, poi {dpi} DPI sulle pagine incomplete")
+    else:
+        logger.info(f"OCR a {dpi} DPI")
+    if roi:
+        logger.info(f"OCR a riquadri, layout F24 {roi}")
+    if preelabora:
+        logger.info(f"Preelaborazione scansioni: {', '.join(preelabora)}")
+
+    # PDF identici ad altri: le deleghe si copiano dall'originale senza rielaborarli
+    copie: Dict[str, str] = {}
+    indice_path = None
+    if duplicati and da_elaborare:
+        da_elaborare, copie = separa_pdf_duplicati(pdf_files, da_elaborare, manifest)
+        if copie:
+            logger.info(f"{len(copie)} PDF identici ad altri file: non rielaborati")
+        # Con la coda di lavoro l'indice delle pagine sta sulla cartella condivisa
+        if not coda_lavori:
+            indice_path = crea_indice_duplicati()
+            if manifest is not None and per_file and cache_dir:
+                seminate = semina_indice_duplicati(
+                    apri_indice_duplicati(indice_path), apri_cache_ocr(cache_dir), manifest, per_file,
+                    sorted({dpi, dpi_rapido or dpi}), variante_ocr(roi, preelabora)
+                )
+                logger.debug(f"Indice duplicati: {seminate} pagine dei PDF invariati")
+
+    nuovi: Dict[str, List[DelegaF24]] = {}
+
+    esportazione = None
+    if output_file and output_format in FORMATI_STREAMING:
+        esportazione = apri_esportazione(output_file, output_format)
+        for deleghe in per_file.values():
+            esportazione.scrivi(deleghe)
 
-    for i, pdf_file in enumerate(pdf_files, 1):
-        logger.info(f"[{i}/{len(pdf_files)}] Elaborazione {pdf_file.name}")
+    try:
+        completati = 0
+
+        def file_completato(idx: int, deleghe: List[DelegaF24]) -> None:
+            nonlocal completati
+            completati += 1
+            pdf_file = da_elaborare[idx]
+            logger.info(f"[{completati}/{len(da_elaborare)}] {pdf_file.name}: estratte {len(deleghe)} deleghe")
+            nuovi[str(pdf_file)] = deleghe
+            if esportazione is not None:
+                esportazione.scrivi(deleghe)
+
+        if coda_lavori and da_elaborare:
+            logger.info(f"Elaborazione distribuita con {workers} processi locali")
+            estrai_deleghe_distribuito(
+                [str(p) for p in da_elaborare], coda_lavori, workers,
+                dpi=dpi, cache_dir=cache_dir, dpi_rapido=dpi_rapido, roi=roi,
+                al_completamento=file_completato, preelabora=preelabora, duplicati=duplicati,
+                prefiltro=prefiltro
+            )
+        elif workers > 1 and da_elaborare:
+            logger.info(f"OCR parallelo con {workers} processi")
+            estrai_deleghe_parallelo(
+                [str(p) for p in da_elaborare], workers,
+                dpi=dpi, cache_dir=cache_dir, dpi_rapido=dpi_rapido, roi=roi,
+                al_completamento=file_completato, preelabora=preelabora, indice_path=indice_path,
+                prefiltro=prefiltro, pool=pool
+            )
+        elif da_elaborare:
+            estrai_deleghe_pipeline(
+                [str(p) for p in da_elaborare],
+                dpi=dpi, cache_dir=cache_dir, dpi_rapido=dpi_rapido, roi=roi,
+                al_completamento=file_completato, preelabora=preelabora, indice_path=indice_path,
+                prefiltro=prefiltro, coda_pagine=coda_pagine
+            )
+
+        # Le copie non entrano nel manifest: a ogni giro si riconoscono dall'hash
+        for copia, originale in copie.items():
+            deleghe = [
+                replace(d, file=copia, duplicato_di=f"{Path(originale).name} pag. {d.pagina}")
+                for d in nuovi.get(originale, per_file.get(originale, []))
+            ]
+            per_file[copia] = deleghe
+            if esportazione is not None:
+                esportazione.scrivi(deleghe)
+
+        if duplicati:
+            cambiate = ordina_duplicati({**per_file, **nuovi})
+            if cambiate:
+                logger.debug(f"Duplicati: originale riassegnato per {cambiate} deleghe")
+    finally:
+        if esportazione is not None:
+            esportazione.close()
+        if indice_path:
+            elimina_indice_duplicati(indice_path)
+
+    if cache_dir:
+        apri_cache_ocr(cache_dir).evict()
+
+    if manifest is not None:
+        # I file in errore non vengono registrati e saranno ritentati al prossimo giro
+        for path, deleghe in nuovi.items():
+            manifest.aggiorna(path, deleghe)
         try:
-            deleghe = estrai_deleghe_da_pdf(str(pdf_file))
-            logger.info(f"   Estratte {len(deleghe)} deleghe")
-            tutte_deleghe.extend(deleghe)
+            manifest.salva()
         except Exception as e:
-            logger.error(f"   Errore elaborazione {pdf_file.name}: {e}")
+            logger.error(f"Errore salvataggio manifest {manifest_path}: {e}")
+
+    # Le liste per file vengono svuotate man mano che passano nel lotto colonnare
+    per_file.update(nuovi)
+    nuovi.clear()
+    for pdf_file in pdf_files:
+        tutte_deleghe.estendi(per_file.pop(str(pdf_file), []))
 
     logger.info(f"Totale deleghe estratte: {len(tutte_deleghe)}")
+    n_duplicate = len(tutte_deleghe.duplicati())
+    if n_duplicate:
+        logger.info(f"Deleghe duplicate escluse dal confronto: {n_duplicate}")
+    pagine_scartate = riepilogo_prefiltro()
+
+    # 3. Raggruppa per CAB e confronta con il tabulato
+    with METRICHE.fase('aggregazione', n=len(tutte_deleghe)):
+        per_cab_pdf, discrepanze, ok_count, tutti_cab = confronta_per_cab(tabulato, tutte_deleghe)
+
+        # Abbinamento delega per delega, se il tabulato ha le righe di dettaglio
+        abbinamento = (
+            abbina_deleghe(tabulato.righe, tutte_deleghe.senza_duplicati()) if tabulato.righe else None
+        )
+        spiega_discrepanze(discrepanze, abbinamento)
 
-    # 3. Raggruppa per CAB
-    per_cab_pdf = defaultdict(lambda: {'deleghe': [], 'totale': 0.0})
+    # 4. Output
+    risultati = componi_risultati(
+        tabulato, tutte_deleghe, discrepanze, ok_count, tutti_cab, len(pdf_files), abbinamento,
+        pagine_scartate
+    )
 
-    for d in tutte_deleghe:
-        cab = d.cab or 'SCONOSCIUTO'
-        per_cab_pdf[cab]['deleghe'].append(d)
-        if d.importo:
-            per_cab_pdf[cab]['totale'] += d.importo
+    # Genera output
+    genera_report_console(
+        tabulato, tutte_deleghe, discrepanze, ok_count, per_cab_pdf, abbinamento, pagine_scartate
+    )
 
-    # 4. Confronto
-    discrepanze = []
-    ok_count = 0
+    if output_file and output_format in ('json', 'csv'):
+        with METRICHE.fase('export', n=len(tutte_deleghe)):
+            if output_format == 'json':
+                esporta_json(risultati, output_file)
+            else:
+                esporta_csv(tutte_deleghe, output_file)
 
-    tutti_cab = set(tabulato.per_cab.keys()) | set(per_cab_pdf.keys())
+    logger.info("Riconciliazione completata")
 
-    for cab in tutti_cab:
-        txt_data = tabulato.per_cab.get(cab, DatiCAB(n_deleghe=0, totale=0.0))
-        pdf_data = per_cab_pdf.get(cab, {'deleghe': [], 'totale': 0.0})
+    if profilo:
+        risultati['metriche'] = report_metriche(time.perf_counter() - inizio, metriche_file)
+        METRICHE.attive = False
 
-        n_txt = txt_data.n_deleghe
-        tot_txt = txt_data.totale
-        n_pdf = len(pdf_data['deleghe'])
-        tot_pdf = pdf_data['totale']
+    return risultati
 
-        if n_txt == 0 and n_pdf == 0:
-            continue
 
-        n_ok = n_txt == n_pdf
-        tot_ok = abs(tot_txt - tot_pdf) < 0.01
+def cartella_giorno(pdf_root: str, data: str) -> Optional[Path]:
+    """
+    Trova la sottocartella dei PDF per una data del tabulato.
+
+    Sono riconosciuti i nomi AAAA-MM-GG, AAAAMMGG, GG-MM-AAAA, GG_MM_AAAA
+    e GGMMAAAA.
 
-        if n_ok and tot_ok:
-            ok_count += 1
+    Args:
+        pdf_root: Cartella che contiene una sottocartella per giorno
+        data: Data del tabulato nel formato GG/MM/AAAA
+
+    Returns:
+        Percorso della sottocartella o None se non esiste
+    """
+    try:
+        giorno, mese, anno = data.split('/')
+    except ValueError:
+        return None
+
+    for nome in (f"{anno}-{mese}-{giorno}", f"{anno}{mese}{giorno}",
+                 f"{giorno}-{mese}-{anno}", f"{giorno}_{mese}_{anno}",
+                 f"{giorno}{mese}{anno}"):
+        candidata = Path(pdf_root) / nome
+        if candidata.is_dir():
+            return candidata
+    return None
+
+
+def percorso_per_giorno(path: Optional[str], data: str) -> Optional[str]:
+    """
+    Aggiunge la data (AAAA-MM-GG) al nome di un file di output o manifest.
+
+    Args:
+        path: Percorso originale (None = nessun file)
+        data: Data del tabulato nel formato GG/MM/AAAA
+
+    Returns:
+        Percorso con suffisso, es. report.json -> report_2024-01-15.json
+    """
+    if not path:
+        return path
+    suffisso = '-'.join(reversed(data.split('/')))
+    p = Path(path)
+    return str(p.with_name(f"{p.stem}_{suffisso}{p.suffix}"))
+
+
+def riconcilia_giorni(
+    tabulato_path: str,
+    pdf_root: str,
+    output_file: Optional[str] = None,
+    output_format: str = 'console',
+    manifest_path: Optional[str] = None,
+    metriche_file: Optional[str] = None,
+    **kwargs: Any
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Riconcilia un tabulato con più date, ciascuna con la propria cartella PDF.
+
+    Il tabulato viene letto in streaming con iter_tabulati_txt: in memoria
+    c'è una sola giornata alla volta. Per ogni data i PDF sono cercati in
+    una sottocartella di pdf_root (vedi cartella_giorno); le date senza
+    cartella vengono segnalate e saltate.
+
+    Args:
+        tabulato_path: Percorso file tabulato TXT
+        pdf_root: Cartella con una sottocartella PDF per giorno
+        output_file: File di output; a ogni giorno viene aggiunta la data al nome
+        output_format: Formato output (console, json, csv)
+        manifest_path: Manifest incrementale ('' = uno per cartella giorno,
+            altro valore = data aggiunta al nome, None = disattivato)
+        metriche_file: File metriche del profilo; a ogni giorno viene aggiunta la data al nome
+        **kwargs: Altri parametri passati a riconcilia()
+
+    Returns:
+        Dizionario data -> risultati della riconciliazione di quel giorno
+    """
+    if not os.path.isdir(pdf_root):
+        raise FileNotFoundError(f"Cartella PDF non trovata: {pdf_root}")
+
+    esiti: Dict[str, Dict[str, Any]] = {}
+    for tabulato in iter_tabulati_txt(tabulato_path):
+        cartella = cartella_giorno(pdf_root, tabulato.data)
+        if cartella is None:
+            logger.warning(f"Nessuna cartella PDF per il giorno {tabulato.data} in {pdf_root}: giorno saltato")
+            continue
+
+        if manifest_path == '':
+            manifest_giorno = str(cartella / MANIFEST_FILENAME)
         else:
-            discrepanze.append({
-                'cab': cab,
-                'txt': {'n_deleghe': n_txt, 'totale': tot_txt},
-                'pdf': {
-                    'n_deleghe': n_pdf,
-                    'totale': tot_pdf,
-                    'dettaglio': pdf_data['deleghe']
-                }
-            })
+            manifest_giorno = percorso_per_giorno(manifest_path, tabulato.data)
+
+        logger.info(f"Giorno {tabulato.data}: PDF in {cartella}")
+        esiti[tabulato.data] = riconcilia(
+            tabulato_path,
+            str(cartella),
+            percorso_per_giorno(output_file, tabulato.data),
+            output_format,
+            manifest_path=manifest_giorno,
+            tabulato=tabulato,
+            metriche_file=percorso_per_giorno(metriche_file, tabulato.data),
+            **kwargs
+        )
 
-    # 5. Output
-    risultati = {
-        'timestamp': datetime.now().isoformat(),
-        'tabulato': tabulato,
-        'deleghe_pdf': tutte_deleghe,
-        'discrepanze': discrepanze,
-        'ok_count': ok_count,
-        'statistiche': {
-            'n_cab_analizzati': len(tutti_cab),
-            'n_pdf_elaborati': len(pdf_files),
-            'n_deleghe_estratte': len(tutte_deleghe),
-            'importo_totale_pdf': sum(d.importo or 0 for d in tutte_deleghe),
-            'importo_totale_txt': tabulato.totale.totale if tabulato.totale else 0
+    logger.info(f"Riconciliati {len(esiti)} giorni")
+    return esiti
+
+
+def iter_deleghe(
+    pdf_paths: Iterable[str],
+    workers: int = 1,
+    cache_dir: Optional[str] = OCR_CACHE_DIR,
+    dpi: int = OCR_DPI,
+    dpi_rapido: Optional[int] = None,
+    roi: Optional[str] = None,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    duplicati: bool = True,
+    prefiltro: bool = True,
+    coda_pagine: int = PIPELINE_CODA_PAGINE,
+    pool: Optional[ProcessPoolExecutor] = None
+) -> Iterator[DelegaF24]:
+    """
+    Estrae le deleghe da un elenco di PDF, senza tabulato né report.
+
+    Le deleghe di ogni file sono restituite appena il file è completo (in
+    ordine di pagina; i file nell'ordine in cui terminano), così il
+    chiamante può usarle mentre l'OCR prosegue sugli altri. Interrompere
+    l'iterazione ferma l'elaborazione. Con `duplicati` i PDF identici ad
+    altri non vengono rielaborati: le loro deleghe, come quelle delle
+    pagine copia, hanno duplicato_di impostato.
+
+    Args:
+        pdf_paths: Percorsi dei PDF
+        workers: Numero di processi per l'OCR parallelo (1 = pipeline in un processo)
+        cache_dir: Cartella della cache OCR (None = cache disattivata)
+        dpi: Risoluzione per l'OCR
+        dpi_rapido: Risoluzione del primo passaggio OCR adattivo (None = disattivato)
+        roi: Layout F24 per l'OCR a riquadri (None = OCR a pagina intera)
+        preelabora: Passi di preelaborazione delle scansioni (None = immagini non elaborate)
+        duplicati: Riconosce i PDF e le pagine scansionate duplicati
+        prefiltro: Scarta le pagine scansionate bianche e i separatori prima dell'OCR
+        coda_pagine: Con workers = 1, pagine rasterizzate in attesa di OCR
+        pool: Con workers > 1, pool di processi già avviato da riusare (opzionale)
+
+    Yields:
+        Deleghe estratte
+    """
+    pdf_files = [Path(p) for p in pdf_paths]
+
+    copie_di: Dict[str, List[str]] = defaultdict(list)  # originale -> copie
+    indice_path = None
+    if duplicati and pdf_files:
+        pdf_files, copie = separa_pdf_duplicati(pdf_files, pdf_files)
+        for copia, originale in copie.items():
+            copie_di[originale].append(copia)
+        indice_path = crea_indice_duplicati()
+    da_elaborare = [str(p) for p in pdf_files]
+
+    if workers > 1:
+        completati = iter_deleghe_parallelo(
+            da_elaborare, workers, dpi, cache_dir, dpi_rapido, roi, preelabora, indice_path,
+            prefiltro, pool
+        )
+    else:
+        completati = PipelineEstrazione(
+            da_elaborare, dpi=dpi, cache_dir=cache_dir, dpi_rapido=dpi_rapido, roi=roi,
+            preelabora=preelabora, indice_path=indice_path, prefiltro=prefiltro, coda_pagine=coda_pagine
+        ).file_completati()
+
+    try:
+        for idx, deleghe in completati:
+            yield from deleghe
+            originale = da_elaborare[idx]
+            for copia in copie_di.get(originale, []):
+                for d in deleghe:
+                    yield replace(d, file=copia, duplicato_di=f"{Path(originale).name} pag. {d.pagina}")
+    finally:
+        # Prima si fermano gli stadi, poi si elimina l'indice che usano
+        completati.close()
+        if indice_path:
+            elimina_indice_duplicati(indice_path)
+
+
+class Riconciliatore:
+    """
+    Riconciliazione riutilizzabile da un processo di lunga durata.
+
+    Le opzioni di estrazione sono fissate alla creazione e valgono per
+    ogni chiamata. Tra una chiamata e l'altra restano pronti il pool di
+    processi (con workers > 1, avviato alla prima chiamata) e i motori
+    OCR con il modello già caricato: un servizio o uno scheduler può
+    riconciliare un lotto dopo l'altro senza reimportare il modulo né
+    ripagarne l'avvio.
+
+    Esempio:
+        with Riconciliatore(workers=4, dpi_rapido=150) as r:
+            for tabulato, cartella in lotti:
+                risultati = r.riconcilia(tabulato, cartella)
+                ...
+            deleghe = list(r.deleghe(['delega_001.pdf', 'delega_002.pdf']))
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        cache_dir: Optional[str] = OCR_CACHE_DIR,
+        dpi: int = OCR_DPI,
+        dpi_rapido: Optional[int] = None,
+        roi: Optional[str] = None,
+        preelabora: Optional[Tuple[str, ...]] = None,
+        duplicati: bool = True,
+        prefiltro: bool = True,
+        coda_pagine: int = PIPELINE_CODA_PAGINE,
+        motore: Optional[str] = None
+    ):
+        if motore is not None:
+            imposta_motore_ocr(motore)
+        self.workers = max(1, workers)
+        self.opzioni: Dict[str, Any] = {
+            'cache_dir': cache_dir, 'dpi': dpi, 'dpi_rapido': dpi_rapido, 'roi': roi,
+            'preelabora': preelabora, 'duplicati': duplicati, 'prefiltro': prefiltro,
+            'coda_pagine': coda_pagine
         }
-    }
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _pool_ocr(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers > 1 and self._pool is None:
+            self._pool = crea_pool_ocr(self.workers)
+        return self._pool
+
+    def deleghe(self, pdf_paths: Iterable[str]) -> Iterator[DelegaF24]:
+        """Estrae le deleghe da un elenco di PDF (vedi iter_deleghe)."""
+        return iter_deleghe(pdf_paths, workers=self.workers, pool=self._pool_ocr(), **self.opzioni)
+
+    def riconcilia(
+        self,
+        tabulato_path: str,
+        pdf_folder: str,
+        output_file: Optional[str] = None,
+        output_format: str = 'console',
+        manifest_path: Optional[str] = None,
+        tabulato: Optional[RisultatoTabulato] = None,
+        profilo: bool = False,
+        metriche_file: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Riconcilia un tabulato con una cartella PDF (vedi riconcilia())."""
+        return riconcilia(
+            tabulato_path, pdf_folder, output_file, output_format,
+            workers=self.workers, manifest_path=manifest_path, tabulato=tabulato,
+            profilo=profilo, metriche_file=metriche_file, pool=self._pool_ocr(), **self.opzioni
+        )
 
-    # Genera output
-    genera_report_console(tabulato, tutte_deleghe, discrepanze, ok_count, per_cab_pdf)
+    def close(self) -> None:
+        """Ferma il pool di processi e chiude le connessioni alla cache OCR."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        rilascia_risorse_thread()
 
-    if output_file:
-        if output_format == 'json':
-            esporta_json(risultati, output_file)
-        elif output_format == 'csv':
-            esporta_csv(tutte_deleghe, output_file)
+    def __enter__(self) -> 'Riconciliatore':
+        return self
 
-    logger.info("Riconciliazione completata")
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
 
-    return risultati
+
+class SorveglianzaCartella:
+    """
+    Riconciliazione continua di una cartella PDF (modalità --watch).
+
+    Un thread osserva la cartella (inotify se il modulo inotify_simple è
+    installato, altrimenti polling) e mette i PDF nuovi o modificati in
+    una coda limitata; se la coda è piena l'osservatore attende
+    (backpressure). Un gruppo di thread worker estrae le deleghe: l'OCR
+    gira in processi tesseract/pdftoppm esterni, quindi i thread lavorano
+    in parallelo. Dopo ogni file i totali per CAB vengono aggiornati in
+    modo incrementale (solo con le deleghe del file) e, se almeno un CAB
+    passa da OK a DIFF o viceversa, viene ricostruito il confronto completo
+    ed emesso un nuovo report. Con il controllo dei duplicati attivo le pagine scansionate
+    già viste durante la sorveglianza non passano di nuovo dall'OCR.
+    """
+
+    def __init__(
+        self,
+        tabulato: RisultatoTabulato,
+        pdf_folder: str,
+        workers: int = 1,
+        intervallo: float = WATCH_INTERVALLO,
+        dimensione_coda: int = WATCH_DIMENSIONE_CODA,
+        output_file: Optional[str] = None,
+        output_format: str = 'console',
+        estrai_kwargs: Optional[Dict[str, Any]] = None,
+        duplicati: bool = True
+    ):
+        self.tabulato = tabulato
+        self.pdf_folder = pdf_folder
+        self.workers = max(1, workers)
+        self.intervallo = intervallo
+        self.coda: 'queue.Queue[Optional[str]]' = queue.Queue(maxsize=dimensione_coda)
+        self.output_file = output_file
+        self.output_format = output_format
+        self.estrai_kwargs = dict(estrai_kwargs or {})
+        self.cache_dir = self.estrai_kwargs.pop('cache_dir', None)
+        self.duplicati = duplicati
+        self.indice_path: Optional[str] = None
+
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.per_file: Dict[str, List[DelegaF24]] = {}
+        self.firme: Dict[str, Tuple[int, float]] = {}  # path -> (size, mtime) elaborati o in coda
+        self.esiti: Dict[str, bool] = {}               # CAB -> OK
+        self.totali: Dict[str, List[int]] = {}         # CAB -> [n deleghe, totale in centesimi]
+        # jsonl/parquet: ogni file elaborato viene aggiunto all'export (anche se rielaborato)
+        self.esportazione: Optional[EsportazioneStreaming] = None
+
+    @staticmethod
+    def _is_pdf(nome: str) -> bool:
+        return nome.lower().endswith('.pdf')
+
+    def _firma(self, path: str) -> Optional[Tuple[int, float]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def _accoda(self, path: str) -> None:
+        """Accoda un PDF se nuovo o modificato (bloccante se la coda è piena)."""
+        firma = self._firma(path)
+        if firma is None:
+            return
+        with self.lock:
+            if self.firme.get(path) == firma:
+                return
+            self.firme[path] = firma
+        logger.info(f"In coda: {os.path.basename(path)} (coda: {self.coda.qsize()})")
+        while not self.stop.is_set():
+            try:
+                self.coda.put(path, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def _rimuovi(self, path: str) -> None:
+        """
+        Toglie dal confronto le deleghe di un PDF eliminato dalla cartella e
+        le sue pagine dall'indice dei duplicati; i file con pagine copia di
+        quelle del PDF eliminato vengono rielaborati (ora sono originali).
+        """
+        nome = os.path.basename(path)
+        if self.indice_path:
+            apri_indice_duplicati(self.indice_path).rimuovi(nome)
+        copie = []
+        with self.lock:
+            self.firme.pop(path, None)
+            deleghe = self.per_file.pop(path, None)
+            if deleghe is not None:
+                logger.info(f"Rimosso: {nome}")
+                self._applica_totali(deleghe, -1)
+                self._aggiorna_esiti()
+                prefisso = f"{nome} pag. "
+                copie = [
+                    p for p, altre in self.per_file.items()
+                    if any(d.duplicato_di and d.duplicato_di.startswith(prefisso) for d in altre)
+                ]
+                for p in copie:
+                    self.firme.pop(p, None)
+        for p in copie:
+            self._accoda(p)
+
+    def _elenca_pdf(self) -> List[str]:
+        return sorted(
+            os.path.join(self.pdf_folder, n)
+            for n in os.listdir(self.pdf_folder) if self._is_pdf(n)
+        )
+
+    def _osserva_polling(self) -> None:
+        """Polling: un file è accodato quando la sua firma resta stabile per un intervallo."""
+        precedenti: Dict[str, Tuple[int, float]] = {}
+        while not self.stop.is_set():
+            correnti = {}
+            for path in self._elenca_pdf():
+                firma = self._firma(path)
+                if firma is None:
+                    continue
+                correnti[path] = firma
+                if precedenti.get(path) == firma:
+                    self._accoda(path)
+            for path in set(precedenti) - set(correnti):
+                self._rimuovi(path)
+            precedenti = correnti
+            self.stop.wait(self.intervallo)
+
+    def _osserva_inotify(self, inotify_simple: Any) -> None:
+        """inotify: accoda alla chiusura in scrittura o all'arrivo nella cartella, rimuove all'uscita."""
+        flags = inotify_simple.flags
+        with inotify_simple.INotify() as inotify:
+            inotify.add_watch(
+                self.pdf_folder,
+                flags.CLOSE_WRITE | flags.MOVED_TO | flags.DELETE | flags.MOVED_FROM
+            )
+            while not self.stop.is_set():
+                for evento in inotify.read(timeout=int(self.intervallo * 1000)):
+                    if not self._is_pdf(evento.name):
+                        continue
+                    path = os.path.join(self.pdf_folder, evento.name)
+                    if evento.mask & (flags.DELETE | flags.MOVED_FROM):
+                        self._rimuovi(path)
+                    else:
+                        self._accoda(path)
+
+    def _osserva(self) -> None:
+        for path in self._elenca_pdf():
+            self._accoda(path)
+
+        try:
+            import inotify_simple
+        except ImportError:
+            inotify_simple = None
+
+        if inotify_simple is not None:
+            logger.info("Sorveglianza cartella con inotify")
+            try:
+                self._osserva_inotify(inotify_simple)
+                return
+            except OSError as e:
+                logger.warning(f"inotify non disponibile ({e}), uso polling")
+
+        logger.info(f"Sorveglianza cartella con polling ogni {self.intervallo:g}s")
+        self._osserva_polling()
+
+    def _lavora(self) -> None:
+        # Ogni thread usa la propria connessione alla cache OCR e all'indice dei duplicati
+        cache = apri_cache_ocr(self.cache_dir) if self.cache_dir else None
+        indice = apri_indice_duplicati(self.indice_path) if self.indice_path else None
+        while True:
+            path = self.coda.get()
+            try:
+                if path is None:
+                    rilascia_risorse_thread()
+                    return
+                with self.lock:
+                    rielaborato = path in self.per_file
+                if indice is not None and rielaborato:
+                    # Le pagine della versione precedente non sono originali della nuova
+                    indice.rimuovi(os.path.basename(path))
+                try:
+                    deleghe = estrai_deleghe_da_pdf(path, cache=cache, indice=indice, **self.estrai_kwargs)
+                except Exception as e:
+                    logger.error(f"Errore elaborazione {os.path.basename(path)}: {e}")
+                    # Senza firma il file viene riaccodato al prossimo evento o polling
+                    with self.lock:
+                        self.firme.pop(path, None)
+                    continue
+                logger.info(f"   {os.path.basename(path)}: estratte {len(deleghe)} deleghe")
+                with self.lock:
+                    precedenti = self.per_file.get(path)
+                    if precedenti is not None:
+                        self._applica_totali(precedenti, -1)
+                    self.per_file[path] = deleghe
+                    self._applica_totali(deleghe, 1)
+                    if self.esportazione is not None:
+                        self.esportazione.scrivi(deleghe)
+                    self._aggiorna_esiti()
+            finally:
+                self.coda.task_done()
+
+    def _applica_totali(self, deleghe: List[DelegaF24], segno: int) -> None:
+        """Aggiunge (segno 1) o toglie (segno -1) le deleghe di un file dai totali per CAB."""
+        for cab, (indici, totale) in LottoDeleghe(deleghe).per_cab().items():
+            voce = self.totali.setdefault(cab, [0, 0])
+            voce[0] += segno * len(indici)
+            voce[1] += segno * totale
+            if voce == [0, 0]:
+                del self.totali[cab]
+
+    def _aggiorna_esiti(self) -> None:
+        """
+        Confronta i totali incrementali con il tabulato; se un esito cambia
+        ricostruisce il confronto completo ed emette il report.
+        """
+        esiti = {}
+        for cab in set(self.tabulato.per_cab) | set(self.totali):
+            txt_data = self.tabulato.per_cab.get(cab, DatiCAB(n_deleghe=0, totale_cent=0))
+            n_pdf, tot_pdf = self.totali.get(cab, (0, 0))
+            if txt_data.n_deleghe == 0 and n_pdf == 0:
+                continue
+            esiti[cab] = txt_data.n_deleghe == n_pdf and txt_data.totale_cent == tot_pdf
+        cambiati = [cab for cab in sorted(esiti) if self.esiti.get(cab) != esiti[cab]]
+        self.esiti = esiti
+
+        if not cambiati:
+            return
+
+        for cab in cambiati:
+            logger.info(f"CAB {cab}: {'OK' if esiti[cab] else 'DIFF'}")
+
+        tutte_deleghe = LottoDeleghe(d for path in sorted(self.per_file) for d in self.per_file[path])
+        per_cab_pdf, discrepanze, ok_count, tutti_cab = confronta_per_cab(self.tabulato, tutte_deleghe)
+        abbinamento = (
+            abbina_deleghe(self.tabulato.righe, tutte_deleghe.senza_duplicati())
+            if self.tabulato.righe else None
+        )
+        spiega_discrepanze(discrepanze, abbinamento)
+        genera_report_console(self.tabulato, tutte_deleghe, discrepanze, ok_count, per_cab_pdf, abbinamento)
+        if self.output_file:
+            if self.output_format == 'json':
+                esporta_json(
+                    componi_risultati(self.tabulato, tutte_deleghe, discrepanze, ok_count,
+                                      tutti_cab, len(self.per_file), abbinamento),
+                    self.output_file
+                )
+            elif self.output_format == 'csv':
+                esporta_csv(tutte_deleghe, self.output_file)
+
+    def esegui(self) -> None:
+        """Avvia osservatore e worker; termina con Ctrl+C."""
+        if self.output_file and self.output_format in FORMATI_STREAMING:
+            self.esportazione = apri_esportazione(self.output_file, self.output_format)
+        if self.duplicati:
+            self.indice_path = crea_indice_duplicati()
+
+        worker_threads = [
+            threading.Thread(target=self._lavora, name=f'ocr-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in worker_threads:
+            t.start()
+        osservatore = threading.Thread(target=self._osserva, name='watch', daemon=True)
+        osservatore.start()
+
+        logger.info(f"Sorveglianza di {self.pdf_folder} avviata (Ctrl+C per terminare)")
+        try:
+            while osservatore.is_alive():
+                osservatore.join(timeout=1)
+        except KeyboardInterrupt:
+            logger.info("Arresto sorveglianza in corso...")
+        finally:
+            self.stop.set()
+            # I file ancora in coda non vengono elaborati: si attende solo quelli in corso
+            while True:
+                try:
+                    self.coda.get_nowait()
+                    self.coda.task_done()
+                except queue.Empty:
+                    break
+            for _ in worker_threads:
+                self.coda.put(None)
+            for t in worker_threads:
+                t.join()
+            if self.esportazione is not None:
+                self.esportazione.close()
+            if self.indice_path:
+                elimina_indice_duplicati(self.indice_path)
+
+
+def sorveglia_cartella(
+    tabulato_path: str,
+    pdf_folder: str,
+    output_file: Optional[str] = None,
+    output_format: str = 'console',
+    workers: int = 1,
+    cache_dir: Optional[str] = OCR_CACHE_DIR,
+    dpi: int = OCR_DPI,
+    dpi_rapido: Optional[int] = None,
+    roi: Optional[str] = None,
+    intervallo: float = WATCH_INTERVALLO,
+    preelabora: Optional[Tuple[str, ...]] = None,
+    duplicati: bool = True,
+    prefiltro: bool = True
+) -> None:
+    """
+    Esegue la riconciliazione continua di una cartella PDF.
+
+    Args:
+        tabulato_path: Percorso file tabulato TXT
+        pdf_folder: Cartella da sorvegliare
+        output_file: File di output riscritto a ogni cambio di esito (opzionale)
+        output_format: Formato output (console, json, csv)
+        workers: Numero di thread worker per l'OCR
+        cache_dir: Cartella della cache OCR (None = cache disattivata)
+        dpi: Risoluzione per l'OCR
+        dpi_rapido: Risoluzione del primo passaggio OCR adattivo (None = disattivato)
+        roi: Layout F24 per l'OCR a riquadri (None = OCR a pagina intera)
+        intervallo: Secondi tra due controlli della cartella
+        preelabora: Passi di preelaborazione delle scansioni (None = immagini non elaborate)
+        duplicati: Riconosce le pagine scansionate duplicate e ne salta l'OCR
+        prefiltro: Scarta le pagine scansionate bianche e i separatori prima dell'OCR
+    """
+    tabulato = parse_tabulato_txt(tabulato_path)
+
+    if not os.path.isdir(pdf_folder):
+        raise FileNotFoundError(f"Cartella PDF non trovata: {pdf_folder}")
+
+    SorveglianzaCartella(
+        tabulato,
+        pdf_folder,
+        workers=workers,
+        intervallo=intervallo,
+        output_file=output_file,
+        output_format=output_format,
+        estrai_kwargs={
+            'cache_dir': cache_dir, 'dpi': dpi, 'dpi_rapido': dpi_rapido, 'roi': roi,
+            'preelabora': preelabora, 'prefiltro': prefiltro
+        },
+        duplicati=duplicati
+    ).esegui()
 
 
 def main():
@@ -756,17 +5555,20 @@ Esempi:
   %(prog)s --tabulato dati.txt --pdf-folder ./deleghe/
   %(prog)s -t dati.txt -p ./deleghe/ --output report.json --format json
   %(prog)s -t dati.txt -p ./deleghe/ --output deleghe.csv --format csv --verbose
+  %(prog)s -t dati.txt -p ./deleghe/ --watch --workers 4
+  %(prog)s -t trimestre.txt -p ./archivio/ --multi-giorno --output report.json --format json
+  %(prog)s -t dati.txt -p ./deleghe/ --workers 4 --profile metriche.json
+  %(prog)s -t trimestre.txt -p /mnt/archivio/q4/ --coordina /mnt/archivio/q4/coda.sqlite -w 8
+  %(prog)s --lavora /mnt/archivio/q4/coda.sqlite -w 8
         """
     )
 
     parser.add_argument(
         '--tabulato', '-t',
-        required=True,
         help='File TXT del tabulato dalla procedura'
     )
     parser.add_argument(
         '--pdf-folder', '-p',
-        required=True,
         help='Cartella contenente i PDF delle deleghe'
     )
     parser.add_argument(
@@ -775,9 +5577,10 @@ Esempi:
     )
     parser.add_argument(
         '--format', '-f',
-        choices=['console', 'json', 'csv'],
+        choices=['console', 'json', 'csv'] + list(FORMATI_STREAMING),
         default='console',
-        help='Formato output (default: console)'
+        help='Formato output (default: console); jsonl e parquet scrivono una riga per delega '
+             'durante l\'estrazione'
     )
     parser.add_argument(
         '--verbose', '-v',
@@ -787,36 +5590,303 @@ Esempi:
     parser.add_argument(
         '--dpi',
         type=int,
-        default=200,
-        help='Risoluzione DPI per OCR (default: 200)'
+        default=OCR_DPI,
+        help=f'Risoluzione DPI per OCR (default: {OCR_DPI})'
+    )
+    parser.add_argument(
+        '--dpi-rapido',
+        type=int,
+        nargs='?',
+        const=OCR_DPI_RAPIDO,
+        default=None,
+        help='OCR adattivo: primo passaggio a questa risoluzione, nuovo OCR a --dpi '
+             f'solo sulle pagine senza CF o importo (senza valore: {OCR_DPI_RAPIDO})'
+    )
+    parser.add_argument(
+        '--roi',
+        choices=sorted(F24_ROI_LAYOUT),
+        help='OCR dei soli riquadri CF/importo/ABI-CAB/data per il layout F24 indicato '
+             '(pagina intera solo se mancano CF o importo)'
+    )
+    parser.add_argument(
+        '--motore-ocr',
+        choices=MOTORI_OCR,
+        default=OCR_MOTORE,
+        help='Backend OCR: tesserocr (Tesseract residente in ogni worker), pytesseract '
+             f'(un processo per pagina) o auto (default: {OCR_MOTORE})'
+    )
+    parser.add_argument(
+        '--preelabora',
+        metavar='PASSI',
+        nargs='?',
+        const=','.join(PREELABORAZIONE_PASSI),
+        default=None,
+        help='Preelabora le pagine scansionate prima dell\'OCR; passi separati da virgola tra '
+             f'{", ".join(PREELABORAZIONE_PASSI)} (senza valore: tutti)'
+    )
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=1,
+        help='Numero di processi per OCR parallelo su pagine e file (default: 1)'
+    )
+    parser.add_argument(
+        '--coda-pagine',
+        type=int,
+        default=PIPELINE_CODA_PAGINE,
+        help='Con --workers 1: pagine rasterizzate in attesa di OCR nella pipeline '
+             f'(default: {PIPELINE_CODA_PAGINE})'
+    )
+    parser.add_argument(
+        '--incrementale', '-i',
+        metavar='MANIFEST',
+        nargs='?',
+        const='',
+        default=None,
+        help='Elabora solo i PDF nuovi o modificati rispetto al manifest indicato '
+             '(senza valore: .riconcilia_manifest.json nella cartella PDF)'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Sorveglia la cartella PDF e aggiorna il report quando un CAB cambia esito (Ctrl+C per uscire)'
+    )
+    parser.add_argument(
+        '--intervallo',
+        type=float,
+        default=WATCH_INTERVALLO,
+        help=f'Secondi tra due controlli della cartella in modalità --watch (default: {WATCH_INTERVALLO:.0f})'
+    )
+    parser.add_argument(
+        '--multi-giorno',
+        action='store_true',
+        help='Riconcilia ogni data del tabulato con la sottocartella del giorno '
+             '(es. 2024-01-15/) dentro --pdf-folder'
+    )
+    parser.add_argument(
+        '--coordina',
+        metavar='CODA',
+        help='Elaborazione distribuita: divide i PDF in shard nella coda SQLite CODA (sulla '
+             'cartella condivisa dei PDF), li elabora con --workers processi insieme ai worker '
+             'avviati con --lavora su altri host e unisce i risultati nel report'
+    )
+    parser.add_argument(
+        '--lavora',
+        metavar='CODA',
+        help='Worker dell\'elaborazione distribuita: elabora con --workers processi gli shard della '
+             'coda CODA (Ctrl+C per uscire); non richiede --tabulato e --pdf-folder'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=OCR_CACHE_DIR,
+        help=f'Cartella della cache OCR persistente (default: {OCR_CACHE_DIR})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Disattiva la cache OCR e riesegue l\'OCR di tutte le pagine'
+    )
+    parser.add_argument(
+        '--no-duplicati',
+        action='store_true',
+        help='Disattiva il riconoscimento di PDF e pagine duplicati (ogni copia viene elaborata '
+             'e conteggiata)'
+    )
+    parser.add_argument(
+        '--no-prefiltro',
+        action='store_true',
+        help='Passa all\'OCR anche le pagine scansionate bianche e i fogli separatori'
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='METRICHE',
+        nargs='?',
+        const='',
+        default=None,
+        help='Misura i tempi per fase (rasterizzazione, OCR, testo nativo, estrazione, '
+             'aggregazione, export) e stampa il riepilogo; con un file scrive anche le metriche JSON'
+    )
+    parser.add_argument(
+        '--cprofile',
+        metavar='FILE',
+        help='Salva il profilo cProfile del processo principale (leggibile con pstats o snakeviz)'
     )
 
     args = parser.parse_args()
 
+    if args.lavora is None and not (args.tabulato and args.pdf_folder):
+        parser.error('gli argomenti --tabulato e --pdf-folder sono obbligatori (tranne con --lavora)')
+
     # Configura logging
+    configura_logging()
     if args.verbose:
         logger.setLevel(logging.DEBUG)
 
-    # Validazione input
-    if not os.path.exists(args.tabulato):
+    check_dependencies()
+
+    # Validazione input (un worker --lavora riceve i PDF e i parametri dalla coda)
+    if args.lavora is None and not os.path.exists(args.tabulato):
         logger.error(f"File tabulato non trovato: {args.tabulato}")
         sys.exit(1)
 
-    if not os.path.isdir(args.pdf_folder):
+    if args.lavora is None and not os.path.isdir(args.pdf_folder):
         logger.error(f"Cartella PDF non trovata: {args.pdf_folder}")
         sys.exit(1)
 
+    if args.lavora and not os.path.isdir(os.path.dirname(os.path.abspath(args.lavora))):
+        logger.error(f"Cartella della coda di lavoro non trovata: {args.lavora}")
+        sys.exit(1)
+
+    if args.dpi_rapido and args.dpi_rapido >= args.dpi:
+        logger.error(f"--dpi-rapido ({args.dpi_rapido}) deve essere inferiore a --dpi ({args.dpi})")
+        sys.exit(1)
+
+    if args.workers < 1:
+        logger.error(f"Numero di workers non valido: {args.workers}")
+        sys.exit(1)
+
+    if args.coda_pagine < 1:
+        logger.error(f"Dimensione della coda pagine non valida: {args.coda_pagine}")
+        sys.exit(1)
+
+    imposta_motore_ocr(args.motore_ocr)
+    try:
+        logger.info(f"Motore OCR: {motore_ocr().nome}")
+    except RuntimeError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    if args.lavora:
+        try:
+            lavora_coda(args.lavora, cache_dir=None if args.no_cache else args.cache_dir, workers=args.workers)
+        except KeyboardInterrupt:
+            logger.info("Worker interrotto")
+        except Exception as e:
+            logger.error(f"Errore del worker: {e}", exc_info=args.verbose)
+            sys.exit(1)
+        return
+
+    preelabora = None
+    if args.preelabora is not None:
+        preelabora = tuple(p.strip() for p in args.preelabora.split(',') if p.strip())
+        sconosciuti = [p for p in preelabora if p not in PREELABORAZIONE_PASSI]
+        if sconosciuti or not preelabora:
+            logger.error(
+                f"Passi di preelaborazione non validi: {', '.join(sconosciuti) or args.preelabora} "
+                f"(disponibili: {', '.join(PREELABORAZIONE_PASSI)})"
+            )
+            sys.exit(1)
+
+    if args.format in FORMATI_STREAMING and not args.output:
+        logger.error(f"--format {args.format} richiede --output")
+        sys.exit(1)
+
+    if args.multi_giorno and args.watch:
+        logger.error("--multi-giorno non è compatibile con --watch")
+        sys.exit(1)
+
+    if args.coordina and args.watch:
+        logger.error("--coordina non è compatibile con --watch")
+        sys.exit(1)
+
+    if args.watch and (args.profile is not None or args.cprofile):
+        logger.warning("--profile e --cprofile sono ignorati in modalità --watch")
+    if args.watch and args.incrementale is not None:
+        logger.warning("--incrementale è ignorato in modalità --watch (i file già visti sono tenuti in memoria)")
+    if args.watch and args.coda_pagine != PIPELINE_CODA_PAGINE:
+        logger.warning("--coda-pagine è ignorato in modalità --watch (ogni worker elabora un file alla volta)")
+
+    profilo = args.profile is not None
+    metriche_file = args.profile or None
+
+    if args.multi_giorno:
+        try:
+            riconcilia_giorni(
+                args.tabulato,
+                args.pdf_folder,
+                args.output,
+                args.format,
+                manifest_path=args.incrementale,
+                workers=args.workers,
+                cache_dir=None if args.no_cache else args.cache_dir,
+                dpi=args.dpi,
+                dpi_rapido=args.dpi_rapido,
+                roi=args.roi,
+                preelabora=preelabora,
+                duplicati=not args.no_duplicati,
+                prefiltro=not args.no_prefiltro,
+                coda_pagine=args.coda_pagine,
+                coda_lavori=args.coordina,
+                profilo=profilo,
+                metriche_file=metriche_file
+            )
+        except Exception as e:
+            logger.error(f"Errore durante la riconciliazione: {e}", exc_info=args.verbose)
+            sys.exit(1)
+        return
+
+    manifest_path = args.incrementale
+    if manifest_path == '':
+        manifest_path = os.path.join(args.pdf_folder, MANIFEST_FILENAME)
+
+    if args.watch:
+        try:
+            sorveglia_cartella(
+                args.tabulato,
+                args.pdf_folder,
+                args.output,
+                args.format,
+                workers=args.workers,
+                cache_dir=None if args.no_cache else args.cache_dir,
+                dpi=args.dpi,
+                dpi_rapido=args.dpi_rapido,
+                roi=args.roi,
+                intervallo=args.intervallo,
+                preelabora=preelabora,
+                duplicati=not args.no_duplicati,
+                prefiltro=not args.no_prefiltro
+            )
+        except Exception as e:
+            logger.error(f"Errore durante la sorveglianza: {e}", exc_info=args.verbose)
+            sys.exit(1)
+        return
+
     # Esegui riconciliazione
+    profiler = cProfile.Profile() if args.cprofile else None
     try:
-        riconcilia(
+        esecuzione = partial(
+            riconcilia,
             args.tabulato,
             args.pdf_folder,
             args.output,
-            args.format
+            args.format,
+            workers=args.workers,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            dpi=args.dpi,
+            dpi_rapido=args.dpi_rapido,
+            roi=args.roi,
+            preelabora=preelabora,
+            duplicati=not args.no_duplicati,
+            prefiltro=not args.no_prefiltro,
+            coda_pagine=args.coda_pagine,
+            coda_lavori=args.coordina,
+            manifest_path=manifest_path,
+            profilo=profilo,
+            metriche_file=metriche_file
         )
+        if profiler:
+            profiler.runcall(esecuzione)
+        else:
+            esecuzione()
     except Exception as e:
         logger.error(f"Errore durante la riconciliazione: {e}", exc_info=args.verbose)
         sys.exit(1)
+    finally:
+        if profiler:
+            # Contiene solo il thread principale: l'OCR gira nei processi figli (--workers > 1)
+            # o nei thread della pipeline e non compare nel profilo
+            profiler.dump_stats(args.cprofile)
+            logger.info(f"Profilo cProfile salvato in: {args.cprofile}")
 
 
 if __name__ == "__main__":
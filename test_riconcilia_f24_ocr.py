@@ -0,0 +1,872 @@
+"""
+Test di riconcilia_f24_ocr (pytest).
+
+Uso:
+    python -m pytest -q
+"""
+
+import os
+import random
+
+import pytest
+
+import riconcilia_f24_ocr as ric
+
+
+# ---------------------------------------------------------------------------
+# EstrattoreF24: il filtro per parole chiave non cambia il risultato
+# ---------------------------------------------------------------------------
+
+FRAMMENTI = [
+    'CODICE FISCALE', 'COD FISC', 'CODICE', 'COD', 'CAB', 'ABI', 'CABI', 'SPORTELLO', 'CAB/SPORTELLO',
+    '08749', 'EURO', 'TOTALE', 'SALDO (A-B)', 'DATA PAGAMENTO', 'DATA', 'Tratto', 'RSSMRA80A01H501Z',
+    'BNCGNN70B02L736K', '36280', '36320', '1.835,35', '9.702,28', '15/11/2024', '15 NOV 2024', ':', ' ',
+    '\n', '|', '+', '/', 'O', '0',
+]
+
+TESTI = [
+    'CABI:08749 / CAB: 36280',
+    'ABI: 08749 CAB: 36320 CODICE FISCALE RSSMRA80A01H501Z EURO 1.835,35',
+    'CODICEFISCALE RSSMRA80A01H501Z\nSALDO (A-B) 9.702,28\nDATA PAGAMENTO 15/11/2024',
+    '08749 O 36280 Tratto\nTOTALE EURO 123,45',
+]
+
+
+def genera_testi(n: int = 400, seme: int = 7):
+    caso = random.Random(seme)
+    for _ in range(n):
+        yield ''.join(caso.choice(FRAMMENTI) for _ in range(caso.randint(3, 14)))
+
+
+@pytest.mark.parametrize('testo', TESTI + list(genera_testi()))
+def test_estrattore_equivale_a_tutti_i_pattern(testo, monkeypatch):
+    atteso_filtrato = ric.ESTRATTORE_F24.estrai(testo, 1, 'x.pdf')
+
+    # Riferimento: tutte le parole chiave presenti, quindi tutti i pattern applicati
+    tutti = ric.EstrattoreF24()
+    monkeypatch.setattr(tutti, '_parole_presenti', lambda text_upper: set(tutti.parole))
+    assert atteso_filtrato == tutti.estrai(testo, 1, 'x.pdf')
+
+
+def test_parole_chiave_sovrapposte():
+    # 'CAB' dentro 'CABI' non deve nascondere 'ABI'
+    assert ric.extract_data_from_text('CABI:08749 / CAB: 36280', 1, 'x.pdf').cab == '36280'
+
+
+@pytest.mark.parametrize('testo, atteso', [
+    # Nessun importo a fine riga: vale il primo SALDO (A-B), non quello della riga SALDO FINALE
+    ('SALDO (A-B) 1.835,35 *\nSALDO FINALE SALDO (A-B) 9.702,28 *', 183535),
+    # Il SALDO è cercato con le maiuscole del modello
+    ('saldo (a-b) 1.835,35 *', None),
+    # Gli EURO_PATTERNS hanno la precedenza
+    ('SALDO (A-B) 1.835,35 *\nSALDO FINALE 9.702,28', 970228),
+])
+def test_importo_da_saldo(testo, atteso):
+    assert ric.extract_data_from_text(testo, 1, 'x.pdf').importo_cent == atteso
+
+
+# ---------------------------------------------------------------------------
+# Importi: centesimi esatti, arrotondamento e limiti del range
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize('testo, atteso', [
+    # Separatori italiani: punto per le migliaia, virgola per i decimali
+    ('1.234,56', 123456),
+    ('1234,56', 123456),
+    ('123.456,7', 12345670),
+    ('1.234', 123400),
+    (' 15,00 ', 1500),
+    # Oltre i centesimi si arrotonda a metà per eccesso
+    ('1.234,565', 123457),
+    ('1.234,564', 123456),
+    ('1.234,999', 123500),
+    # Limiti del range, dopo l'arrotondamento
+    ('10,00', ric.IMPORTO_MIN_CENT),
+    ('9,995', ric.IMPORTO_MIN_CENT),
+    ('9,99', None),
+    ('1.000.000,00', ric.IMPORTO_MAX_CENT),
+    ('1.000.000,01', None),
+    # Non numerici
+    ('', None),
+    (',', None),
+    ('12a,00', None),
+    ('-15,00', None),
+])
+def test_parse_importo(testo, atteso):
+    assert ric.parse_importo(testo) == atteso
+
+
+# ---------------------------------------------------------------------------
+# Tabulato: lettura in streaming, una sezione per data
+# ---------------------------------------------------------------------------
+
+TABULATO_MULTI_GIORNO = """\
+RIEPILOGO DELEGHE F24 PER SPORTELLO
+DATA: 15 11 2024
+36320    5      1.234,56      10     5.678,90      2      1.434,56
+36270    3      987,65        7      3.456,78      3      174,00
+TOT.:    45     12.345,67     89     45.678,90     5      1.609,56
+DATA: 15 11 2024
+36320  RSSMRA80A01H501Z  15/11/2024  1.234,56
+DATA: 18 11 2024
+36280    1      100,00        2      200,00        4      2.500,00
+TOT.:    1      100,00        2      200,00        4      2.500,00
+TOT.:    9      900,00        9      900,00        9      9.000,00
+DATA: 19 11 2024
+36280    0      0,00          0      0,00          1      50,00
+VRDLGU75C03F205X  19/11/2024  300,00
+"""
+
+
+def test_tabulato_sezioni_in_streaming(tmp_path):
+    path = tmp_path / 'tabulato.txt'
+    path.write_text(TABULATO_MULTI_GIORNO, encoding='utf-8')
+
+    sezioni = list(ric.iter_tabulati_txt(str(path)))
+    assert sezioni == [
+        # L'intestazione ripetuta con la stessa data non apre una nuova sezione
+        ric.RisultatoTabulato(
+            data='15/11/2024',
+            per_cab={'36320': ric.DatiCAB(2, 143456), '36270': ric.DatiCAB(3, 17400)},
+            totale=ric.DatiCAB(5, 160956),
+            righe=[ric.RigaTabulato(7, 'RSSMRA80A01H501Z', 123456, '36320')]
+        ),
+        # Conta solo il primo TOT. della sezione
+        ric.RisultatoTabulato(
+            data='18/11/2024', per_cab={'36280': ric.DatiCAB(4, 250000)}, totale=ric.DatiCAB(4, 250000)
+        ),
+        # Ultima sezione senza totali, chiusa a fine file
+        ric.RisultatoTabulato(
+            data='19/11/2024', per_cab={'36280': ric.DatiCAB(1, 5000)}, totale=None,
+            righe=[ric.RigaTabulato(14, 'VRDLGU75C03F205X', 30000, None)]
+        ),
+    ]
+    # La lettura di un solo giorno è la prima sezione
+    assert ric.parse_tabulato_txt(str(path)) == sezioni[0]
+
+
+def test_tabulato_righe_prima_della_data(tmp_path):
+    path = tmp_path / 'tabulato.txt'
+    path.write_text('36280    1      100,00        2      200,00        4      2.500,00\n', encoding='utf-8')
+    [sezione] = ric.iter_tabulati_txt(str(path))
+    assert (sezione.data, sezione.per_cab, sezione.totale) == ('N/D', {'36280': ric.DatiCAB(4, 250000)}, None)
+
+
+# ---------------------------------------------------------------------------
+# Rasterizzazione a finestre di pagine consecutive
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def conversioni(monkeypatch):
+    """Sostituisce pdf2image.convert_from_path e registra le finestre richieste."""
+    import pdf2image
+
+    chiamate = []
+
+    def convert_from_path(pdf_path, dpi, first_page, last_page, grayscale):
+        chiamate.append((first_page, last_page))
+        return [f'immagine {p}' for p in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(pdf2image, 'convert_from_path', convert_from_path)
+    return chiamate
+
+
+@pytest.mark.parametrize('finestra, finestre', [
+    (1, [(1, 1), (2, 2), (7, 7), (8, 8), (20, 20)]),
+    # Una finestra non scavalca le pagine saltate
+    (2, [(1, 2), (7, 8), (20, 20)]),
+    (8, [(1, 2), (7, 8), (20, 20)]),
+])
+def test_rasterizza_pagine_con_salti(conversioni, finestra, finestre):
+    pagine = list(ric.rasterizza_pagine('a.pdf', finestra=finestra, pagine=[1, 2, 7, 8, 20]))
+    assert conversioni == finestre
+    assert pagine == [(p, f'immagine {p}') for p in [1, 2, 7, 8, 20]]
+
+
+def test_rasterizza_pagine_una_finestra_alla_volta(conversioni, monkeypatch):
+    monkeypatch.setattr(ric, 'conta_pagine_pdf', lambda pdf_path: 5)
+    pagine = ric.rasterizza_pagine('a.pdf', finestra=2)
+    assert next(pagine) == (1, 'immagine 1')
+    # La finestra successiva si converte solo quando servono le sue pagine
+    assert conversioni == [(1, 2)]
+    assert list(pagine) == [(p, f'immagine {p}') for p in range(2, 6)]
+    assert conversioni == [(1, 2), (3, 4), (5, 5)]
+
+
+# ---------------------------------------------------------------------------
+# Scansioni sintetiche: preelaborazione e prefiltro prima di Tesseract
+# ---------------------------------------------------------------------------
+
+A4_200_DPI = (1654, 2339)
+
+
+def _scansione(*fasce, sfondo=255, modo='RGB'):
+    """Pagina A4 a 200 DPI con righe di "parole" (rettangoli scuri) tra le y di ogni fascia."""
+    from PIL import Image, ImageDraw
+
+    pagina = Image.new('L', A4_200_DPI, sfondo)
+    disegno = ImageDraw.Draw(pagina)
+    caso = random.Random(1)
+    for y0, y1 in fasce:
+        for y in range(y0, y1, 40):
+            x = 150
+            while x < pagina.width - 300:
+                larghezza = caso.randint(10, 40)
+                disegno.rectangle((x, y, x + larghezza, y + 18), fill=20)
+                x += larghezza + caso.randint(8, 20)
+    return pagina.convert(modo)
+
+
+@pytest.mark.parametrize('passo', ric.PREELABORAZIONE_PASSI)
+def test_preelabora_passo_mantiene_dimensioni_e_modo(passo):
+    # A 200 DPI e senza bande scure nessun passo ritaglia o riduce la pagina
+    pagina = _scansione((200, 2200))
+    out = ric.preelabora_immagine(pagina, (passo,), 200)
+    assert (out.size, out.mode) == (A4_200_DPI, 'L')
+
+
+def test_preelabora_binarizza_e_raddrizza():
+    from PIL import Image
+
+    storta = _scansione((200, 2200), modo='L').rotate(2, resample=Image.BILINEAR, fillcolor=255)
+    assert ric.stima_inclinazione(storta) == -2.0
+    out = ric.preelabora_immagine(storta.convert('RGB'), ('raddrizza', 'binarizza'), 200)
+    assert (out.size, out.mode) == (A4_200_DPI, 'L')
+    assert {valore for _, valore in out.getcolors()} == {0, 255}
+
+
+def test_preelabora_riduzione_e_ritaglio():
+    pagina = _scansione((200, 2200))
+    # Rasterizzata a 600 DPI viene riportata a PREELABORAZIONE_DPI_MAX
+    out = ric.preelabora_immagine(pagina, ('riduci',), 600)
+    assert out.size == (round(pagina.width / 2), round(pagina.height / 2)) and out.mode == 'L'
+
+    # Banda nera a sinistra (fuori dal foglio): ritagliata, ma non con l'OCR a riquadri
+    pagina.paste((0, 0, 0), (0, 0, 120, pagina.height))
+    assert ric.preelabora_immagine(pagina, ('bordi',), 200).size == (pagina.width - 120, pagina.height)
+    tutti = ric.preelabora_immagine(pagina, ric.PREELABORAZIONE_PASSI, 200, ritaglio=False)
+    assert (tutti.size, tutti.mode) == (A4_200_DPI, 'L')
+
+
+@pytest.mark.parametrize('pagina, atteso', [
+    (lambda: _scansione(), 'bianca'),
+    # Retro con la trasparenza del fronte: troppo chiara per essere inchiostro
+    (lambda: _scansione(sfondo=235).point(lambda v: 200 if v < 128 else v), 'bianca'),
+    (lambda: _scansione(sfondo=60), 'separatore'),
+    # Copertina: testo solo nel terzo centrale
+    (lambda: _scansione((1000, 1200)), 'separatore'),
+    # Poco testo, ma in alto (codice fiscale) e in basso (saldo): va all'OCR
+    (lambda: _scansione((300, 340), (2000, 2040)), None),
+    (lambda: _scansione((200, 2200), sfondo=200, modo='L'), None),
+])
+def test_prefiltro_classifica_pagina(pagina, atteso):
+    assert ric.classifica_pagina(pagina(), 200) == atteso
+
+
+def test_prefiltro_scarta_prima_dell_ocr(monkeypatch):
+    motore = MotoreFinto()
+    monkeypatch.setattr(ric, 'motore_ocr', lambda: motore)
+
+    assert ric.ocr_immagine_pagina(_scansione(), 'a.pdf', 1, 200) is None
+    assert ric.ocr_immagine_pagina(_scansione(sfondo=60), 'a.pdf', 2, 200) is None
+    assert motore.chiamate == 0
+    assert ric.ocr_immagine_pagina(_scansione((300, 340), (2000, 2040)), 'a.pdf', 3, 200) == ('testo 1', None)
+
+
+# ---------------------------------------------------------------------------
+# Sorveglianza: totali per CAB incrementali e file in errore riaccodati
+# ---------------------------------------------------------------------------
+
+def _tabulato(*righe):
+    per_cab = {}
+    for cf, importo, cab in righe:
+        dati = per_cab.setdefault(cab, ric.DatiCAB(n_deleghe=0, totale_cent=0))
+        dati.n_deleghe += 1
+        dati.totale_cent += importo
+    return ric.RisultatoTabulato(
+        data='15/11/2024', per_cab=per_cab, totale=None,
+        righe=[ric.RigaTabulato(riga=i, codice_fiscale=cf, importo_cent=importo, cab=cab)
+               for i, (cf, importo, cab) in enumerate(righe, 1)]
+    )
+
+
+def _elabora(sorveglianza, path):
+    # Un worker che elabora un solo file e termina
+    sorveglianza.coda.put(path)
+    sorveglianza.coda.put(None)
+    sorveglianza._lavora()
+
+
+def test_sorveglianza_esiti_incrementali(monkeypatch, tmp_path):
+    tabulato = _tabulato(('RSSMRA80A01H501Z', 10000, '36280'), ('BNCGNN70B02L736K', 5000, '36320'))
+    estratte = {
+        'a.pdf': [ric.DelegaF24('a.pdf', 1, 'RSSMRA80A01H501Z', 10000, '36280')],
+        'b.pdf': [ric.DelegaF24('b.pdf', 1, 'BNCGNN70B02L736K', 5000, '36320')],
+    }
+    monkeypatch.setattr(ric, 'estrai_deleghe_da_pdf', lambda path, **kwargs: estratte[path])
+    report = []
+    monkeypatch.setattr(ric, 'genera_report_console', lambda *args: report.append(args))
+    sorveglianza = ric.SorveglianzaCartella(tabulato, str(tmp_path), estrai_kwargs={})
+
+    _elabora(sorveglianza, 'a.pdf')
+    assert sorveglianza.esiti == {'36280': True, '36320': False}
+    _elabora(sorveglianza, 'b.pdf')
+    assert sorveglianza.esiti == {'36280': True, '36320': True}
+    assert len(report) == 2
+
+    # Rielaborazione con lo stesso risultato: nessun esito cambia, nessun report
+    _elabora(sorveglianza, 'b.pdf')
+    assert sorveglianza.totali == {'36280': [1, 10000], '36320': [1, 5000]}
+    assert len(report) == 2
+
+    sorveglianza._rimuovi('a.pdf')
+    assert sorveglianza.esiti == {'36280': False, '36320': True}
+    assert sorveglianza.totali == {'36320': [1, 5000]}
+
+
+def test_sorveglianza_errore_riaccoda(monkeypatch, tmp_path):
+    def fallisce(path, **kwargs):
+        raise OSError('file troncato')
+
+    monkeypatch.setattr(ric, 'estrai_deleghe_da_pdf', fallisce)
+    sorveglianza = ric.SorveglianzaCartella(_tabulato(), str(tmp_path), estrai_kwargs={})
+    sorveglianza.firme['a.pdf'] = (100, 1.0)
+    _elabora(sorveglianza, 'a.pdf')
+    assert 'a.pdf' not in sorveglianza.firme
+
+
+# ---------------------------------------------------------------------------
+# Abbinamento: le coppie non esatte sono elencate con i due lati
+# ---------------------------------------------------------------------------
+
+def test_abbinamenti_non_esatti_nel_report(capsys):
+    tabulato = _tabulato(
+        ('RSSMRA80A01H501Z', 183595, '36280'),
+        ('BNCGNN70B02L736K', 10000, '36280'),
+        ('VRDLGU75C03F205X', 5000, '36280'),
+    )
+    deleghe = ric.LottoDeleghe([
+        ric.DelegaF24('a.pdf', 1, 'RSSMRA80A01H501Z', 183535, '36280'),
+        ric.DelegaF24('a.pdf', 2, 'BNCGNN70B02L73GK', 10000, '36280'),
+        ric.DelegaF24('a.pdf', 3, 'VRDLGU75C03F205X', 5000, '36280'),
+    ])
+    abbinamento = ric.abbina_deleghe(tabulato.righe, deleghe)
+    assert sorted((r.riga, d.pagina, c) for r, d, c in abbinamento.non_esatte('36280')) == [
+        (1, 1, 'importo'), (2, 2, 'codice_fiscale')
+    ]
+    assert abbinamento.non_esatte('36320') == []
+
+    per_cab_pdf, discrepanze, ok_count, tutti_cab = ric.confronta_per_cab(tabulato, deleghe)
+    risultati = ric.componi_risultati(tabulato, deleghe, discrepanze, ok_count, tutti_cab, 1, abbinamento)
+    non_esatte = risultati['abbinamento']['non_esatte']
+    assert {v['criterio']: (v['tabulato'].importo_cent, v['pdf'].importo_cent) for v in non_esatte} == {
+        'importo': (183595, 183535), 'codice_fiscale': (10000, 10000)
+    }
+
+    ric.genera_report_console(tabulato, deleghe, discrepanze, ok_count, per_cab_pdf, abbinamento)
+    report = capsys.readouterr().out
+    assert 'ABBINAMENTI NON ESATTI' in report
+    assert 'BNCGNN70B02L736K' in report and 'BNCGNN70B02L73GK' in report
+
+
+# ---------------------------------------------------------------------------
+# Spiegazione delle discrepanze: prima le coppie abbinate non esatte
+# ---------------------------------------------------------------------------
+
+def test_spiegazione_usa_le_coppie_abbinate(capsys):
+    # EYQYCT66M67W313I è letto 1.835,35 invece di 1.835,95: anche 9.702,28 -> 9.702,88
+    # di ZSUZAI69A54M647M spiegherebbe i 60 centesimi con una sola cifra, ma è abbinata esatta
+    righe = [
+        ('ZSUZAI69A54M647M', 970228, '36280'),
+        ('EYQYCT66M67W313I', 183595, '36280'),
+        ('RSSMRA80A01H501Z', 123456, '36280'),
+        ('MRORSS80A01H502U', 5000, '36280'),
+    ]
+    tabulato = _tabulato(*righe)
+    deleghe = ric.LottoDeleghe(
+        ric.DelegaF24('a.pdf', pagina, cf, 183535 if cf == 'EYQYCT66M67W313I' else importo, cab)
+        for pagina, (cf, importo, cab) in enumerate(righe, 1)
+    )
+    per_cab_pdf, discrepanze, ok_count, _ = ric.confronta_per_cab(tabulato, deleghe)
+    abbinamento = ric.abbina_deleghe(tabulato.righe, deleghe.senza_duplicati())
+    ric.spiega_discrepanze(discrepanze, abbinamento)
+
+    [disc] = discrepanze
+    [voce] = disc['spiegazione']
+    assert (voce.tipo, voce.criterio, voce.effetto_cent) == ('abbinata', 'importo', -60)
+    assert voce.delega.codice_fiscale == 'EYQYCT66M67W313I' and voce.riga.importo_cent == 183595
+    assert voce.to_dict()['importo_tabulato_cent'] == 183595
+
+    ric.genera_report_console(tabulato, deleghe, discrepanze, ok_count, per_cab_pdf, abbinamento)
+    report = capsys.readouterr().out
+    assert 'importo letto €1,835.35 (EYQYCT66M67W313I' in report
+    assert '9,702.88' not in report
+
+
+def test_spiegazione_del_resto_con_deleghe_non_abbinate():
+    # Una coppia non esatta (-60 centesimi) più una delega in più: la ricerca spiega solo il resto
+    righe = [('EYQYCT66M67W313I', 183595, '36280'), ('RSSMRA80A01H501Z', 123456, '36280')]
+    tabulato = _tabulato(*righe)
+    deleghe = ric.LottoDeleghe([
+        ric.DelegaF24('a.pdf', 1, 'EYQYCT66M67W313I', 183535, '36280'),
+        ric.DelegaF24('a.pdf', 2, 'RSSMRA80A01H501Z', 123456, '36280'),
+        ric.DelegaF24('b.pdf', 1, 'RSSMRA80A01H501Z', 123456, '36280'),
+    ])
+    _, discrepanze, _, _ = ric.confronta_per_cab(tabulato, deleghe)
+    ric.spiega_discrepanze(discrepanze, ric.abbina_deleghe(tabulato.righe, deleghe))
+
+    [disc] = discrepanze
+    assert [(v.tipo, v.effetto_cent) for v in disc['spiegazione']] == [('abbinata', -60), ('duplicata', 123456)]
+
+
+def _deleghe_cab(*importi):
+    return [ric.DelegaF24('a.pdf', pagina, f'CF{pagina}', cent, '36280') for pagina, cent in enumerate(importi, 1)]
+
+
+def test_spiega_discrepanza_sottoinsieme_sulle_due_meta():
+    # Quattro deleghe in più: due cause dalla metà destra e due dalla sinistra
+    deleghe = _deleghe_cab(150000, 270000, 31000, 4400, 5550, 66600)
+    spiegazione, alternative = ric.spiega_discrepanza(deleghe, 150000 + 270000 + 4400 + 66600, 4)
+    assert [(v.tipo, v.delega.pagina) for v in spiegazione] == [
+        ('in_piu', 1), ('in_piu', 2), ('in_piu', 4), ('in_piu', 6)
+    ]
+    assert alternative == 0
+
+
+def test_spiega_discrepanza_importo_letto_con_una_cifra_diversa():
+    # 1.284,56 letto 1.234,56; 99,99 non ha varianti che spostino il totale di -50€
+    spiegazione, alternative = ric.spiega_discrepanza(_deleghe_cab(123456, 9999), -5000, 0)
+    [voce] = spiegazione
+    assert (voce.tipo, voce.delega.pagina, voce.importo_corretto_cent) == ('importo_ocr', 1, 128456)
+    assert alternative == 0
+
+
+def test_spiega_discrepanza_senza_soluzione():
+    # Nessuna cifra di 1.000,00 si può abbassare di 7 centesimi
+    assert ric.spiega_discrepanza(_deleghe_cab(100000), 7, 0) == ([], 0)
+
+
+def test_spiega_discrepanza_budget_scaduto():
+    import time
+
+    # Importi multipli di 10€: nessuna combinazione spiega 1 centesimo e la ricerca arriva al budget
+    deleghe = _deleghe_cab(*(1000 * (100 + i) for i in range(300)))
+    inizio = time.monotonic()
+    assert ric.spiega_discrepanza(deleghe, 1, 0, budget_s=0.1) == ([], 0)
+    assert time.monotonic() - inizio < 5
+
+
+class OrologioFinto:
+    """Orologio fermo che scade dalla lettura indicata in poi."""
+
+    def __init__(self, scade):
+        self.letture = 0
+        self.scade = scade
+
+    def monotonic(self):
+        self.letture += 1
+        return 0.0 if self.letture < self.scade else 1e9
+
+
+def test_spiega_discrepanza_budget_scaduto_soluzione_parziale(monkeypatch):
+    # Pagine 79 e 80 uguali alle pagine 1 e 2: la differenza ha 4 spiegazioni da due deleghe
+    caso = random.Random(5)
+    importi = [caso.randrange(100000, 999999, 100) for _ in range(78)]
+    deleghe = _deleghe_cab(*importi, importi[0], importi[1])
+    differenza = importi[0] + importi[1]
+    assert ric.spiega_discrepanza(deleghe, differenza, 2)[1] == 3
+
+    # Con ~4300 voci l'orologio è letto all'avvio e ogni 4096 combinazioni: k=1 lo legge
+    # tre volte, k=2 due per l'indice; l'ottava lettura interrompe k=2 a metà, prima
+    # delle voci delle pagine 79 e 80
+    monkeypatch.setattr(ric, 'time', OrologioFinto(scade=8))
+    spiegazione, alternative = ric.spiega_discrepanza(deleghe, differenza, 2)
+    assert [(v.tipo, v.delega.pagina) for v in spiegazione] == [('in_piu', 1), ('in_piu', 2)]
+    assert alternative == 2
+
+
+# ---------------------------------------------------------------------------
+# Cache OCR: LRU unica su testi e firme
+# ---------------------------------------------------------------------------
+
+def _firma(colore: int):
+    from PIL import Image, ImageDraw
+
+    firma = Image.new('L', (32, 45), 255)
+    ImageDraw.Draw(firma).rectangle((4, 4, 28, 12), fill=colore)
+    return firma
+
+
+def _accesso(cache, tabella, chiave, istante):
+    cache.conn.execute(f'UPDATE {tabella} SET ultimo_accesso = ? WHERE chiave = ?', (istante, chiave))
+    cache.conn.commit()
+
+
+def test_cache_evict_lru_su_testi_e_firme(tmp_path):
+    cache = ric.CacheOCR(str(tmp_path))
+    for i, (tabella, chiave) in enumerate([('firme', 'f1'), ('ocr', 't1'), ('firme', 'f2'), ('ocr', 't2')]):
+        if tabella == 'ocr':
+            cache.put(chiave, 'x' * 1000)
+        else:
+            cache.put_firma(chiave, _firma(i * 40))
+        _accesso(cache, tabella, chiave, 1000.0 + i)
+    dimensione_firma = cache.conn.execute("SELECT LENGTH(firma) FROM firme WHERE chiave = 'f2'").fetchone()[0]
+
+    # Basta togliere le due voci più vecchie (una firma e un testo)
+    cache.max_bytes = 1000 + dimensione_firma
+    assert cache.evict() == 2
+    assert cache.conn.execute('SELECT chiave FROM ocr').fetchall() == [('t2',)]
+    assert cache.conn.execute('SELECT chiave FROM firme').fetchall() == [('f2',)]
+    cache.close()
+
+
+def test_cache_evict_solo_firme(tmp_path):
+    # Senza testi in cache le firme non vengono eliminate tutte
+    cache = ric.CacheOCR(str(tmp_path))
+    for i in range(3):
+        cache.put_firma(f'f{i}', _firma(i * 40))
+        _accesso(cache, 'firme', f'f{i}', 1000.0 + i)
+    totale = cache.conn.execute('SELECT SUM(LENGTH(firma)) FROM firme').fetchone()[0]
+    cache.max_bytes = totale - 1
+    assert cache.evict() == 1
+    assert [c for c, in cache.conn.execute('SELECT chiave FROM firme ORDER BY chiave')] == ['f1', 'f2']
+    cache.close()
+
+
+# ---------------------------------------------------------------------------
+# Indice dei duplicati: file rimossi e PDF invariati dell'incrementale
+# ---------------------------------------------------------------------------
+
+def test_indice_rimuovi_file(tmp_path):
+    indice = ric.IndiceDuplicati(str(tmp_path / 'indice.sqlite'))
+    assert indice.registra('200:', _firma(0), 'a.pdf pag. 1') == (None, None)
+    indice.registra('200:', _firma(120), 'a.pdf pag. 12')
+    indice.registra('200:', _firma(200), 'aa.pdf pag. 1')
+    assert indice.rimuovi('a.pdf') == 2
+    # Dopo mv a.pdf b.pdf le pagine di b sono originali
+    assert indice.registra('200:', _firma(0), 'b.pdf pag. 1') == (None, None)
+    indice.close()
+
+
+def test_sorveglianza_rimozione_rielabora_le_copie(tmp_path):
+    indice_path = str(tmp_path / 'indice.sqlite')
+    sorveglianza = ric.SorveglianzaCartella(_tabulato(), str(tmp_path), estrai_kwargs={})
+    sorveglianza.indice_path = indice_path
+    ric.apri_indice_duplicati(indice_path).registra('200:', _firma(0), 'a.pdf pag. 1', 'testo')
+
+    a, b = str(tmp_path / 'a.pdf'), str(tmp_path / 'b.pdf')
+    (tmp_path / 'b.pdf').write_bytes(b'%PDF')
+    sorveglianza.per_file = {
+        a: [ric.DelegaF24(a, 1, 'RSSMRA80A01H501Z', 10000, '36280')],
+        b: [ric.DelegaF24(b, 1, 'RSSMRA80A01H501Z', 10000, '36280', duplicato_di='a.pdf pag. 1')],
+    }
+    sorveglianza.firme = {a: (1, 1.0), b: (4, 1.0)}
+    for deleghe in sorveglianza.per_file.values():
+        sorveglianza._applica_totali(deleghe, 1)
+
+    sorveglianza._rimuovi(a)
+    assert sorveglianza.coda.get_nowait() == b
+    assert sorveglianza.totali == {}
+    assert ric.apri_indice_duplicati(indice_path).registra('200:', _firma(0), 'b.pdf pag. 1') == (None, None)
+    ric.elimina_indice_duplicati(indice_path)
+
+
+def test_semina_indice_da_pdf_invariati(tmp_path):
+    cache = ric.CacheOCR(str(tmp_path / 'cache'))
+    cache.put_firma(ric.CacheOCR.chiave_firma('h1', 2, 200), _firma(0))
+    cache.put(ric.CacheOCR.chiave('h1', 2, 200), 'testo pagina 2')
+    manifest = ric.ManifestPDF(str(tmp_path / 'manifest.json'), {})
+    a = str(tmp_path / 'a.pdf')
+    manifest.file[a] = {'size': 1, 'mtime': 1.0, 'sha256': 'h1', 'deleghe': []}
+
+    indice = ric.IndiceDuplicati(str(tmp_path / 'indice.sqlite'))
+    invariati = {a: [ric.DelegaF24(a, 2, 'RSSMRA80A01H501Z', 10000, '36280')]}
+    assert ric.semina_indice_duplicati(indice, cache, manifest, invariati, [200], '') == 1
+    # La riscansione in un file nuovo è una copia, con il testo della cache
+    assert indice.registra('200:', _firma(0), 'nuovo.pdf pag. 1') == ('a.pdf pag. 2', 'testo pagina 2')
+    indice.close()
+    cache.close()
+
+
+def test_copie_orfane_dei_pdf_invariati():
+    def delega(file, pagina, duplicato_di=None):
+        return ric.DelegaF24(file, pagina, 'RSSMRA80A01H501Z', 100, '36280', duplicato_di=duplicato_di)
+
+    # a.pdf modificato e x.pdf eliminato non sono tra gli invariati
+    per_file = {
+        '/pdf/b.pdf': [delega('/pdf/b.pdf', 1, 'a.pdf pag. 1')],
+        '/pdf/c.pdf': [delega('/pdf/c.pdf', 1), delega('/pdf/c.pdf', 2, 'x.pdf pag. 3')],
+        '/pdf/d.pdf': [delega('/pdf/d.pdf', 1, 'b.pdf pag. 1')],
+        '/pdf/e.pdf': [delega('/pdf/e.pdf', 1, 'f.pdf pag. 1')],
+        '/pdf/f.pdf': [delega('/pdf/f.pdf', 1)],
+    }
+    # d.pdf copia di b.pdf, che a sua volta viene rielaborato
+    assert ric.separa_copie_orfane(per_file) == ['/pdf/b.pdf', '/pdf/c.pdf', '/pdf/d.pdf']
+    assert sorted(per_file) == ['/pdf/e.pdf', '/pdf/f.pdf']
+
+
+# ---------------------------------------------------------------------------
+# Coda di lavoro distribuita
+# ---------------------------------------------------------------------------
+
+PARAMETRI_LOTTO = {'dpi': 200, 'dpi_rapido': None, 'roi': None, 'preelabora': None,
+                   'duplicati': False, 'prefiltro': True}
+
+
+def test_coda_prepara_e_ripresa(tmp_path):
+    db = str(tmp_path / 'coda.sqlite')
+    voci = [('a.pdf', 'h1', 100, 30), ('b.pdf', 'h2', 50, 0)]
+    coda = ric.CodaLavori(db)
+    # 30 pagine in shard da 25; b.pdf senza pagine non produce shard
+    assert coda.prepara(PARAMETRI_LOTTO, False, voci, pagine_shard=25) == 2
+    shard = coda.prendi('w1')
+    assert (shard.file, shard.pagina_inizio, shard.pagina_fine, shard.sha256) == ('a.pdf', 1, 25, 'h1')
+    assert coda.completa(shard.id, 'w1', [ric.DelegaF24('a.pdf', 3, 'RSSMRA80A01H501Z', 100, '36280')], None)
+    coda.close()
+
+    # Coordinatore rilanciato con lo stesso lotto: lo shard completato resta
+    coda = ric.CodaLavori(db)
+    assert coda.prepara(PARAMETRI_LOTTO, False, voci, pagine_shard=25) == 1
+    secondo = coda.prendi('w1')
+    assert (secondo.pagina_inizio, secondo.pagina_fine) == (26, 30)
+    # Un altro lotto non può svuotare la coda mentre uno shard è in elaborazione
+    with pytest.raises(RuntimeError):
+        coda.prepara(dict(PARAMETRI_LOTTO, dpi=300), False, voci, pagine_shard=25)
+    assert [r[3] for r in coda.risultati()] == ['completato', 'in_corso']
+    coda.close()
+
+
+def test_coda_lease_scaduto(tmp_path):
+    coda = ric.CodaLavori(str(tmp_path / 'coda.sqlite'))
+    coda.prepara(PARAMETRI_LOTTO, False, [('a.pdf', 'h1', 100, 10)])
+    perso = coda.prendi('w1', lease=-1)
+
+    # prendi() riassegna lo shard con il lease scaduto; il primo worker lo ha perso
+    ripreso = coda.prendi('w2')
+    assert ripreso.id == perso.id
+    assert not coda.rinnova(perso.id, 'w1')
+    assert not coda.completa(perso.id, 'w1', [], None)
+    assert coda.completa(ripreso.id, 'w2', [], None)
+    assert coda.concluso()
+    coda.close()
+
+
+def test_coda_lease_scaduto_troppe_volte(tmp_path):
+    coda = ric.CodaLavori(str(tmp_path / 'coda.sqlite'))
+    coda.prepara(PARAMETRI_LOTTO, False, [('a.pdf', 'h1', 100, 10)])
+    for i in range(ric.DISTRIBUITO_MAX_TENTATIVI):
+        assert coda.prendi(f'w{i}', lease=-1) is not None
+    assert coda.prendi('altro') is None
+    [(_, _, _, stato, _, _, errore)] = coda.risultati()
+    assert stato == 'errore' and 'lease scaduto' in errore
+    assert coda.concluso()
+    coda.close()
+
+
+def test_elabora_shard_verifica_hash(tmp_path):
+    pdf = tmp_path / 'a.pdf'
+    pdf.write_bytes(b'%PDF-1.4 nuovo')
+    shard = ric.ShardLavoro(1, 'a.pdf', 'hash-del-vecchio-file', pdf.stat().st_size, 1, 1, PARAMETRI_LOTTO, False)
+    # Stessa dimensione, contenuto diverso
+    with pytest.raises(ValueError):
+        ric.elabora_shard(shard, str(pdf))
+
+
+def _pdf(path):
+    from PIL import Image
+
+    Image.new('RGB', (60, 80), 'white').save(str(path))
+    return str(path)
+
+
+class PoolInterrotto:
+    """Pool i cui worker terminano subito (es. processi uccisi)."""
+
+    def __init__(self, workers):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, *args):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+
+        future = Future()
+        future.set_exception(BrokenProcessPool('processo terminato'))
+        return future
+
+
+def test_distribuito_coordinatore_senza_worker_locali(tmp_path, monkeypatch):
+    a = _pdf(tmp_path / 'a.pdf')
+    monkeypatch.setattr(ric, 'crea_pool_ocr', PoolInterrotto)
+    monkeypatch.setattr(
+        ric, 'elabora_shard',
+        lambda shard, pdf_path, *args: [ric.DelegaF24(shard.file, 1, 'RSSMRA80A01H501Z', 100, '36280')]
+    )
+    monkeypatch.setattr(ric.METRICHE, 'attive', False)
+    ric.METRICHE.azzera()
+    ric.METRICHE.conta('coordinatore')
+
+    # Senza worker locali né remoti il coordinatore elabora gli shard e termina
+    [deleghe] = ric.estrai_deleghe_distribuito([a], str(tmp_path / 'coda.sqlite'), duplicati=False)
+    assert [(d.file, d.importo_cent) for d in deleghe] == [('a.pdf', 100)]
+    assert ric.METRICHE.contatori['coordinatore'] == 1
+
+
+def test_distribuito_pdf_non_preparato(tmp_path):
+    a = _pdf(tmp_path / 'a.pdf')
+    (tmp_path / 'rotto.pdf').write_bytes(b'non un pdf')
+    with pytest.raises(RuntimeError, match='rotto.pdf'):
+        ric.estrai_deleghe_distribuito([a, str(tmp_path / 'rotto.pdf')], str(tmp_path / 'coda.sqlite'))
+
+
+# ---------------------------------------------------------------------------
+# File in errore: non restituiti, quindi fuori dal manifest
+# ---------------------------------------------------------------------------
+
+class PoolSincrono:
+    """Pool che esegue ogni job nel processo corrente, alla sottomissione."""
+
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def _lettura_nativa(pdf_path):
+    nome = os.path.basename(pdf_path)
+    if nome == 'illeggibile.pdf':
+        raise RuntimeError('PDF danneggiato')
+    if nome == 'nativo.pdf':
+        return [ric.DelegaF24(nome, 1, 'RSSMRA80A01H501Z', 100, '36280')], []
+    return [], [1, 2]
+
+
+def test_parallelo_file_in_errore_esclusi(monkeypatch):
+    def ocr_pagina(pdf_path, page_num, *args):
+        if page_num == 2:
+            raise RuntimeError('tesseract terminato')
+        return ric.DelegaF24(os.path.basename(pdf_path), page_num, 'VRDLGU75B02F205X', 200, '36280')
+
+    monkeypatch.setattr(ric, 'extract_from_native_pdf', _lettura_nativa)
+    monkeypatch.setattr(ric, 'ocr_pagina_pdf', ocr_pagina)
+    completati = []
+    risultati = ric.estrai_deleghe_parallelo(
+        ['nativo.pdf', 'illeggibile.pdf', 'scansione.pdf'], 1,
+        al_completamento=lambda idx, deleghe: completati.append(idx), pool=PoolSincrono()
+    )
+    # Lettura nativa fallita o pagina senza OCR: il file non è completo
+    assert completati == [0]
+    assert [len(deleghe) for deleghe in risultati] == [1, 0, 0]
+
+
+def test_pipeline_pagina_in_errore_esclude_il_file(monkeypatch):
+    from PIL import Image
+
+    def ocr_immagine(img, pdf_path, page_num, *args):
+        if os.path.basename(pdf_path) == 'scansione.pdf' and page_num == 2:
+            raise RuntimeError('tesseract terminato')
+        return f'testo {page_num}', None
+
+    monkeypatch.setattr(ric, 'extract_from_native_pdf', _lettura_nativa)
+    monkeypatch.setattr(
+        ric, 'rasterizza_pagine',
+        lambda pdf_path, dpi, pagine, grigi: ((p, Image.new('L', (10, 10))) for p in pagine)
+    )
+    monkeypatch.setattr(ric, 'ocr_immagine_pagina', ocr_immagine)
+    monkeypatch.setattr(
+        ric, 'estrai_delega_ocr',
+        lambda testo, page_num, pdf_path, *args: ric.DelegaF24(os.path.basename(pdf_path), page_num, 'X', 1, '1')
+    )
+    completati = []
+    ric.estrai_deleghe_pipeline(
+        ['nativo.pdf', 'illeggibile.pdf', 'scansione.pdf', 'altra.pdf'],
+        al_completamento=lambda idx, deleghe: completati.append((idx, len(deleghe)))
+    )
+    assert sorted(completati) == [(0, 1), (3, 2)]
+
+
+# ---------------------------------------------------------------------------
+# Duplicati: originale solo con OCR riuscito, scelta deterministica
+# ---------------------------------------------------------------------------
+
+class MotoreFinto:
+    """Motore OCR che conta le chiamate e fallisce sulle pagine indicate."""
+
+    def __init__(self, falliscono=()):
+        self.falliscono = list(falliscono)
+        self.chiamate = 0
+
+    def riconosci(self, img):
+        self.chiamate += 1
+        if self.falliscono and self.falliscono.pop(0):
+            raise RuntimeError('tesseract terminato')
+        return f'testo {self.chiamate}'
+
+
+def test_duplicati_ocr_originale_fallito(tmp_path, monkeypatch):
+    motore = MotoreFinto(falliscono=[True, False])
+    monkeypatch.setattr(ric, 'motore_ocr', lambda: motore)
+    indice = ric.IndiceDuplicati(str(tmp_path / 'indice.sqlite'))
+    pagina = _firma(0).resize((320, 450))
+
+    def ocr(nome):
+        return ric.ocr_immagine_pagina(pagina, nome, 1, 200, indice=indice, prefiltro=False)
+
+    with pytest.raises(RuntimeError):
+        ocr('a.pdf')
+    # La copia non è scartata: diventa l'originale e fa l'OCR
+    assert ocr('b.pdf') == ('testo 2', None)
+    assert ocr('c.pdf') == ('testo 2', 'b.pdf pag. 1')
+    assert motore.chiamate == 2
+    indice.close()
+
+
+def test_duplicati_copia_attende_originale_in_ocr(tmp_path):
+    import threading
+
+    path = str(tmp_path / 'indice.sqlite')
+    originale = ric.IndiceDuplicati(path)
+    assert originale.registra('200:', _firma(0), 'a.pdf pag. 1') == (None, None)
+
+    # Originale ancora senza testo allo scadere dell'attesa: la copia non è segnata
+    copia = ric.IndiceDuplicati(path, attesa_s=0.3)
+    assert copia.registra('200:', _firma(0), 'b.pdf pag. 1') == (None, None)
+
+    # Testo disponibile durante l'attesa: la copia lo riusa
+    threading.Timer(0.2, originale.completa, ('200:', 'a.pdf pag. 1', 'testo a')).start()
+    copia.attesa_s = 5
+    assert copia.registra('200:', _firma(0), 'c.pdf pag. 1') == ('a.pdf pag. 1', 'testo a')
+    copia.close()
+    originale.close()
+
+
+def test_ordina_duplicati_copie_prima_dell_originale():
+    def delega(file, pagina, duplicato_di=None):
+        return ric.DelegaF24(file, pagina, 'RSSMRA80A01H501Z', 10000, '36280', duplicato_di=duplicato_di)
+
+    # Con più processi c.pdf è stato elaborato per primo ed è diventato l'originale
+    per_file = {
+        'c.pdf': [delega('c.pdf', 2)],
+        'a.pdf': [delega('a.pdf', 5, 'c.pdf pag. 2')],
+        'b.pdf': [delega('b.pdf', 1, 'c.pdf pag. 2'), delega('b.pdf', 2, 'x.pdf pag. 9')],
+    }
+    assert ric.ordina_duplicati(per_file) == 4
+    assert [(d.file, d.pagina, d.duplicato_di) for deleghe in per_file.values() for d in deleghe] == [
+        ('c.pdf', 2, 'a.pdf pag. 5'),
+        ('a.pdf', 5, None),
+        ('b.pdf', 1, 'a.pdf pag. 5'),
+        # Originale non più presente: la pagina conta
+        ('b.pdf', 2, None),
+    ]
+    # Idempotente
+    assert ric.ordina_duplicati(per_file) == 0